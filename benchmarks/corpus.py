@@ -0,0 +1,151 @@
+import os
+import random
+from typing import Dict, Iterator, List, Tuple
+
+# Each topic has its own vocabulary so queries have a few clearly relevant files.
+TOPICS: Dict[str, List[str]] = {
+    "neural networks": ["neuron", "activation", "backpropagation", "gradient", "layer", "weights", "bias", "perceptron",
+                        "dropout", "convolution"],
+    "case based reasoning": ["case", "retrieval", "reuse", "revision", "retention", "similarity", "adaptation",
+                             "casebase", "indexing", "solution"],
+    "decision trees": ["split", "entropy", "information gain", "pruning", "leaf", "node", "gini", "depth", "attribute",
+                       "overfitting"],
+    "clustering": ["centroid", "k-means", "cluster", "distance", "linkage", "dendrogram", "density", "silhouette",
+                   "partition", "outlier"],
+    "bayesian learning": ["prior", "posterior", "likelihood", "evidence", "naive bayes", "conditional", "probability",
+                          "independence", "smoothing", "belief"],
+    "reinforcement learning": ["agent", "reward", "policy", "state", "action", "q-learning", "exploration", "discount",
+                               "episode", "value function"],
+    "genetic algorithms": ["population", "crossover", "mutation", "fitness", "selection", "chromosome", "generation",
+                           "elitism", "gene", "encoding"],
+    "support vector machines": ["margin", "kernel", "hyperplane", "support vector", "slack", "dual", "soft margin",
+                                "feature space", "regularization", "classifier"],
+}
+
+FILLER = ["the", "a", "method", "uses", "each", "when", "model", "data", "learning", "example", "result", "step",
+          "process", "approach", "problem", "value", "training", "is", "and", "of", "to", "in", "with", "for"]
+
+TEMPLATES = [
+    "The {a} determines how the {b} is computed during {topic}.",
+    "In {topic}, a {a} is combined with the {b} to reach a result.",
+    "A common mistake is to confuse the {a} with the {b}.",
+    "When the {a} changes, the {b} must be recomputed for every example.",
+    "Textbooks describe the {a} as the central idea of {topic}.",
+    "The {a} and the {b} together define the behaviour of the learner.",
+]
+
+QUESTION_TEMPLATES = [
+    "What is the {a} in {topic}?",
+    "How does the {a} relate to the {b}?",
+    "Explain the role of the {a} in {topic}.",
+]
+
+FOLLOW_UPS = ["Can you give an example of it?", "Why does that matter?", "How is it different from the {b}?"]
+
+def _sentence(rng: random.Random, topic: str) -> str:
+    terms = TOPICS[topic]
+    a, b = rng.sample(terms, 2)
+    sentence = rng.choice(TEMPLATES).format(a=a, b=b, topic=topic)
+    filler = " ".join(rng.choice(FILLER) for _ in range(rng.randint(4, 12)))
+    return f"{sentence} {filler.capitalize()}."
+
+def generate_pages(rng: random.Random, topic: str, n_pages: int, sentences_per_page: int = 18) -> List[str]:
+    """Pages of synthetic lecture text about one topic, with some off-topic sentences mixed in."""
+    topics = list(TOPICS)
+    pages = []
+    for page in range(n_pages):
+        sentences = [f"{topic.title()} - part {page + 1}."]
+        for _ in range(sentences_per_page):
+            sentences.append(_sentence(rng, topic if rng.random() < 0.8 else rng.choice(topics)))
+        pages.append(" ".join(sentences))
+    return pages
+
+def generate_chunks(n_chunks: int, seed: int = 0, chunk_sentences: int = 3) -> Iterator[Tuple[str, str, Dict]]:
+    """(id, text, metadata) for `n_chunks` synthetic chunks spread over 50-chunk "files"."""
+    rng = random.Random(seed)
+    topics = list(TOPICS)
+    for i in range(n_chunks):
+        file_number, chunk_index = divmod(i, 50)
+        topic = topics[file_number % len(topics)]
+        source = f"synthetic_{file_number:05d}.pdf"
+        text = " ".join(_sentence(rng, topic) for _ in range(chunk_sentences))
+        yield f"{source}_{chunk_index}", text, {"source": source, "chunk_index": chunk_index, "page": chunk_index // 4 + 1}
+
+def generate_questions(n_sessions: int, turns_per_session: int, seed: int = 0) -> List[List[str]]:
+    """Question sequences per session: an opening question, then follow-ups and new questions."""
+    rng = random.Random(seed)
+    sessions = []
+    for _ in range(n_sessions):
+        topic = rng.choice(list(TOPICS))
+        questions = []
+        for turn in range(turns_per_session):
+            a, b = rng.sample(TOPICS[topic], 2)
+            if turn > 0 and rng.random() < 0.4:
+                questions.append(rng.choice(FOLLOW_UPS).format(b=b))
+            else:
+                questions.append(rng.choice(QUESTION_TEMPLATES).format(a=a, b=b, topic=topic))
+        sessions.append(questions)
+    return sessions
+
+def _pdf_string(text: str) -> str:
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+def write_pdf(path: str, pages: List[str], line_width: int = 90):
+    """Write a minimal text-only PDF (Helvetica, one content stream per page) that PyPDF2 can extract."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for text in pages:
+        words, lines, line = text.split(), [], ""
+        for word in words:
+            if line and len(line) + len(word) + 1 > line_width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        if line:
+            lines.append(line)
+        content = "BT /F1 10 Tf 40 760 Td 12 TL " + " ".join(f"{_pdf_string(line)} '" for line in lines) + " ET"
+        content = content.encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+                       f"/Contents {content_ref} 0 R >>".encode())
+        page_refs.append(len(objects))
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_refs)} >>".encode()
+    
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+def write_corpus(folder: str, n_files: int, pages_per_file: int = 8, seed: int = 0, pdf: bool = True) -> List[str]:
+    """Write a deterministic corpus of PDFs (or .txt files) and return their paths."""
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    topics = list(TOPICS)
+    paths = []
+    for i in range(n_files):
+        topic = topics[i % len(topics)]
+        pages = generate_pages(rng, topic, pages_per_file)
+        name = f"{topic.replace(' ', '_')}_{i:04d}"
+        if pdf:
+            path = os.path.join(folder, f"{name}.pdf")
+            write_pdf(path, pages)
+        else:
+            path = os.path.join(folder, f"{name}.txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("\n\n".join(pages))
+        paths.append(path)
+    return paths
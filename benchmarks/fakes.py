@@ -0,0 +1,45 @@
+import hashlib
+import re
+from typing import Any, Dict
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils.embedding_functions import register_embedding_function
+
+WORD = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+@register_embedding_function
+class HashEmbeddingFunction(EmbeddingFunction[Documents]):
+    """
+    Deterministic offline stand-in for the sentence-transformer model: a
+    unit-length vector of hashed word and word-bigram counts. Texts that
+    share terms land close together, so retrieval results are meaningful
+    enough for benchmarking without downloading a model.
+    """
+    
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+    
+    def _bucket(self, feature: str) -> int:
+        return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=4).digest(), "little") % self.dim
+    
+    def __call__(self, input: Documents) -> Embeddings:
+        embeddings = []
+        for text in input:
+            words = WORD.findall(text.lower())
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                vector[self._bucket(feature)] += 1.0
+            norm = np.linalg.norm(vector)
+            embeddings.append(vector / norm if norm > 0 else vector)
+        return embeddings
+    
+    @staticmethod
+    def name() -> str:
+        return "benchmark_hash"
+    
+    def get_config(self) -> Dict[str, Any]:
+        return {"dim": self.dim}
+    
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "HashEmbeddingFunction":
+        return HashEmbeddingFunction(dim=config.get("dim", 384))
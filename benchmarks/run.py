@@ -0,0 +1,388 @@
+"""
+Offline benchmarks for ingestion, retrieval and full question replay.
+
+Everything runs against a throwaway Chroma directory with a deterministic
+hashed embedding function and the stand-in chat model, so results are
+reproducible without Ollama or a model download. Results are written as
+JSON (with the git commit) so runs can be compared across commits:
+
+    python -m benchmarks.run all --output before.json
+    python -m benchmarks.run all --output after.json
+    python -m benchmarks.run compare before.json after.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+from benchmarks.corpus import generate_chunks, generate_questions, write_corpus
+from benchmarks.fakes import HashEmbeddingFunction
+from core.batch_writer import BatchWriter
+from core.chat_models import StandInChatModel
+from core.context_packer import ContextPacker
+from core.document_processor import DocumentProcessor
+from core.document_store import DocumentStore, register_document_store, reset_document_stores
+from core.instrumentation import HistogramExporter, JsonLinesExporter, Tracer
+from core.reranker import MMRReranker
+from core.session_manager import MEMORY_BACKENDS, create_memory
+from core.tutor_pipeline import TutorPipeline
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_VERSION = 1
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """count / mean / p50 / p95 / p99 / max of a list of latencies."""
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples, dtype=np.float64)
+    return {
+        "count": len(samples),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max())
+    }
+
+def peak_rss_mb() -> Optional[Dict[str, float]]:
+    """Peak resident set size of this process and of its finished children (extraction workers)."""
+    if resource is None:
+        return None
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # bytes on macOS, KiB on Linux
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    }
+
+def run_metadata(args: argparse.Namespace) -> Dict:
+    def git(*command):
+        try:
+            return subprocess.run(["git", *command], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10).stdout.strip()
+        except Exception:
+            return None
+    
+    return {
+        "version": RESULTS_VERSION,
+        "timestamp": datetime.now().isoformat(),
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "arguments": vars(args)
+    }
+
+@contextlib.contextmanager
+def working_directory(path: str) -> Iterator[str]:
+    """Run a benchmark in its own directory so the Chroma store and sidecar files start empty."""
+    os.makedirs(path, exist_ok=True)
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        reset_document_stores()
+        os.chdir(previous)
+
+def open_store(query_cache_size: int = 256) -> DocumentStore:
+    """Register a store on the default path that embeds with the offline hash embedding function."""
+    return register_document_store(DocumentStore(embedding_function=HashEmbeddingFunction(), query_cache_size=query_cache_size))
+
+def load_synthetic_chunks(store: DocumentStore, n_chunks: int, seed: int, batch_size: int = 512) -> float:
+    """Write `n_chunks` generated chunks straight to the collection; returns the elapsed seconds."""
+    started = time.perf_counter()
+    with BatchWriter(store.collection, batch_size=min(batch_size, store.max_batch_size())) as writer:
+        for chunk_id, text, metadata in generate_chunks(n_chunks, seed=seed):
+            writer.add(chunk_id, text, metadata)
+    return time.perf_counter() - started
+
+def benchmark_ingest(workdir: str, files: int, pages: int, workers: int, pdf: bool, seed: int) -> Dict:
+    """End-to-end ingest of a generated corpus through utils.chroma_test.ingest_documents."""
+    from utils import chroma_test
+    
+    with working_directory(workdir):
+        corpus = os.path.abspath("corpus")
+        write_corpus(corpus, files, pages_per_file=pages, seed=seed, pdf=pdf)
+        store = open_store()
+        started = time.perf_counter()
+        chroma_test.ingest_documents(corpus, workers=workers, progress_every=10 ** 9)
+        elapsed = time.perf_counter() - started
+        chunks = store.collection.count()
+        
+        started = time.perf_counter()
+        chroma_test.ingest_documents(corpus, workers=workers, progress_every=10 ** 9)
+        unchanged_elapsed = time.perf_counter() - started
+    return {
+        "files": files,
+        "pages": files * pages,
+        "format": "pdf" if pdf else "txt",
+        "workers": workers,
+        "chunks": chunks,
+        "seconds": elapsed,
+        "chunks_per_second": chunks / elapsed if elapsed > 0 else 0.0,
+        "reingest_unchanged_seconds": unchanged_elapsed,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+def benchmark_retrieval(workdir: str, sizes: List[int], n_queries: int, seed: int) -> Dict:
+    """Per-query latency of the vector search and of retrieve + rerank + format, at several corpus sizes."""
+    questions = [question for session in generate_questions(n_queries, 1, seed=seed + 1) for question in session]
+    results = {}
+    for size in sizes:
+        with working_directory(os.path.join(workdir, f"retrieval_{size}")):
+            # No query-embedding cache, so every query pays for its embedding like a new question would.
+            store = open_store(query_cache_size=0)
+            load_seconds = load_synthetic_chunks(store, size, seed)
+            processor = DocumentProcessor(n_results=20, distance_threshold=1.5, store=store,
+                                          context_packer=ContextPacker(token_budget=8000),
+                                          reranker=MMRReranker(max_results=8, max_per_source=3))
+            store.warmup()
+            
+            search, process = [], []
+            for question in questions:
+                started = time.perf_counter()
+                store.query(question, n_results=20)
+                search.append((time.perf_counter() - started) * 1000.0)
+                
+                started = time.perf_counter()
+                processor.process_query(question, [], question.lower().split())
+                process.append((time.perf_counter() - started) * 1000.0)
+            
+            started = time.perf_counter()
+            processor.process_queries(questions, [[] for _ in questions], [question.lower().split() for question in questions])
+            batch_ms = (time.perf_counter() - started) * 1000.0
+        results[str(size)] = {
+            "chunks": size,
+            "load_chunks_per_second": size / load_seconds if load_seconds > 0 else 0.0,
+            "search_ms": percentiles(search),
+            "process_query_ms": percentiles(process),
+            "batch_per_query_ms": batch_ms / len(questions) if questions else 0.0
+        }
+    return results
+
+def load_question_log(paths: List[str]) -> List[List[str]]:
+    """
+    Question sequences from logs. Accepts session files written by
+    SessionManager/TutorService (.json, one session each), JSON lines with
+    "session" and "question" fields, or text with one question per line and
+    blank lines between sessions. Directories are read file by file.
+    """
+    sessions: List[List[str]] = []
+    for path in paths:
+        if os.path.isdir(path):
+            sessions.extend(load_question_log(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.endswith((".json", ".jsonl", ".txt"))
+            )))
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith(".json"):
+                conversations = json.load(f).get("conversations", [])
+                sessions.append([conv["question"] for conv in conversations if conv.get("question")])
+            elif path.endswith(".jsonl"):
+                by_session: Dict[str, List[str]] = {}
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        by_session.setdefault(str(record.get("session", "default")), []).append(record["question"])
+                sessions.extend(by_session.values())
+            else:
+                current: List[str] = []
+                for line in f:
+                    if line.strip():
+                        current.append(line.strip())
+                    elif current:
+                        sessions.append(current)
+                        current = []
+                if current:
+                    sessions.append(current)
+    return [session for session in sessions if session]
+
+def benchmark_replay(workdir: str, sessions: List[List[str]], n_chunks: int, model_delay: float, pipelined: bool,
+                     seed: int, trace_path: Optional[str] = None, memory_backend: str = "chroma") -> Dict:
+    """
+    Replay question sequences through the tutor pipeline (the same path as
+    model.process_query) with the stand-in chat model, one memory per session.
+    """
+    summary = HistogramExporter()
+    exporters = [summary] + ([JsonLinesExporter(os.path.abspath(trace_path))] if trace_path else [])
+    with working_directory(os.path.join(workdir, "replay")):
+        store = open_store()
+        load_synthetic_chunks(store, n_chunks, seed)
+        tracer = Tracer(exporters)
+        pipeline = TutorPipeline(StandInChatModel(delay=model_delay), document_store=store, verbose=False, tracer=tracer)
+        store.warmup()
+        
+        turn_ms = []
+        started = time.perf_counter()
+        for i, questions in enumerate(sessions):
+            memory = create_memory(memory_backend, collection_name=f"replay-{i:05d}",
+                                   embedding_function=store.embedding_function, session_id=f"replay-{i}")
+            for question in questions:
+                turn_started = time.perf_counter()
+                trace = tracer.start(session=i)
+                history = pipeline.relevant_history(memory, question, trace=trace)
+                "".join(pipeline.stream_answer(memory, question, history, pipelined=pipelined, trace=trace))
+                turn_ms.append((time.perf_counter() - turn_started) * 1000.0)
+            memory.drop()
+        elapsed = time.perf_counter() - started
+        pipeline.close()
+    return {
+        "sessions": len(sessions),
+        "turns": len(turn_ms),
+        "chunks": n_chunks,
+        "model_delay": model_delay,
+        "memory_backend": memory_backend,
+        "turns_per_second": len(turn_ms) / elapsed if elapsed > 0 else 0.0,
+        "turn_ms": percentiles(turn_ms),
+        "stages": summary.summary()
+    }
+
+def flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves of a results document, keyed by dotted path."""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = float(value)
+    return flat
+
+def compare(old_path: str, new_path: str, threshold: float = 0.0) -> str:
+    """Table of metrics present in both result files with their relative change."""
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    old_flat, new_flat = flatten(old["results"]), flatten(new["results"])
+    lines = [f"{old_path} ({(old['meta'].get('commit') or '?')[:10]}) -> {new_path} ({(new['meta'].get('commit') or '?')[:10]})",
+             f"{'metric':<60} {'old':>12} {'new':>12} {'change':>9}"]
+    for key in sorted(old_flat.keys() & new_flat.keys()):
+        before, after = old_flat[key], new_flat[key]
+        change = (after - before) / before * 100.0 if before else 0.0
+        if abs(change) >= threshold:
+            lines.append(f"{key:<60} {before:>12.3f} {after:>12.3f} {change:>+8.1f}%")
+    return "\n".join(lines)
+
+def _run(args: argparse.Namespace, benchmarks: Dict) -> Dict:
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="rag-bench-")
+    results = {}
+    try:
+        # Library code prints progress; keep stdout for the JSON document.
+        with contextlib.redirect_stdout(sys.stderr):
+            for name, run in benchmarks.items():
+                print(f"== {name} ==", file=sys.stderr)
+                results[name] = run(workdir)
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {"meta": run_metadata(args), "results": results}
+
+def replay_sessions(args: argparse.Namespace) -> List[List[str]]:
+    if args.logs:
+        return load_question_log(args.logs)
+    return generate_questions(args.sessions, args.turns, seed=args.seed)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline ingestion, retrieval and replay benchmarks.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    def add_common(sub):
+        sub.add_argument("--output", "-o", help="Write the JSON results here instead of stdout")
+        sub.add_argument("--workdir", help="Directory for the benchmark stores (default: a temporary directory)")
+        sub.add_argument("--keep", action="store_true", help="Keep the temporary directory")
+        sub.add_argument("--seed", type=int, default=0, help="Seed for the generated corpus and questions")
+    
+    def add_ingest(sub):
+        sub.add_argument("--files", type=int, default=24, help="Generated files (default: 24)")
+        sub.add_argument("--pages", type=int, default=8, help="Pages per file (default: 8)")
+        sub.add_argument("--workers", type=int, default=1, help="Extraction processes (default: 1)")
+        sub.add_argument("--txt", action="store_true", help="Generate plain text instead of PDFs")
+    
+    def add_retrieval(sub):
+        sub.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000], help="Corpus sizes in chunks")
+        sub.add_argument("--queries", type=int, default=200, help="Queries per corpus size (default: 200)")
+    
+    def add_replay(sub):
+        sub.add_argument("logs", nargs="*", help="Question logs: session .json files, .jsonl, or text; default: generated")
+        sub.add_argument("--sessions", type=int, default=10, help="Generated sessions (default: 10)")
+        sub.add_argument("--turns", type=int, default=8, help="Turns per generated session (default: 8)")
+        sub.add_argument("--chunks", type=int, default=5000, help="Synthetic corpus size in chunks (default: 5000)")
+        sub.add_argument("--model-delay", type=float, default=0.0, help="Stand-in model delay per streamed piece, seconds")
+        sub.add_argument("--sequential", action="store_true", help="Optimize, then retrieve, instead of pipelining")
+        sub.add_argument("--trace", metavar="FILE", help="Also write per-turn traces as JSON lines")
+        sub.add_argument("--memory", choices=list(MEMORY_BACKENDS), default="chroma", help="Conversation memory backend")
+    
+    corpus_parser = subparsers.add_parser("corpus", help="Write a synthetic corpus to a folder")
+    corpus_parser.add_argument("folder")
+    corpus_parser.add_argument("--seed", type=int, default=0)
+    add_ingest(corpus_parser)
+    
+    ingest_parser = subparsers.add_parser("ingest", help="Chunks/s and peak RSS of an end-to-end ingest")
+    add_common(ingest_parser)
+    add_ingest(ingest_parser)
+    
+    retrieval_parser = subparsers.add_parser("retrieval", help="Per-query latency percentiles at several corpus sizes")
+    add_common(retrieval_parser)
+    add_retrieval(retrieval_parser)
+    
+    replay_parser = subparsers.add_parser("replay", help="Replay question sequences through the tutor pipeline")
+    add_common(replay_parser)
+    add_replay(replay_parser)
+    
+    all_parser = subparsers.add_parser("all", help="Run the ingest, retrieval and replay benchmarks")
+    add_common(all_parser)
+    add_ingest(all_parser)
+    add_retrieval(all_parser)
+    add_replay(all_parser)
+    
+    compare_parser = subparsers.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.0, help="Only show changes of at least this many percent")
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == "corpus":
+        paths = write_corpus(args.folder, args.files, pages_per_file=args.pages, seed=args.seed, pdf=not args.txt)
+        print(f"Wrote {len(paths)} files to {args.folder}")
+        return
+    if args.command == "compare":
+        print(compare(args.old, args.new, threshold=args.threshold))
+        return
+    
+    benchmarks = {}
+    if args.command in ("ingest", "all"):
+        benchmarks["ingest"] = lambda workdir: benchmark_ingest(os.path.join(workdir, "ingest"), args.files, args.pages,
+                                                                args.workers, not args.txt, args.seed)
+    if args.command in ("retrieval", "all"):
+        benchmarks["retrieval"] = lambda workdir: benchmark_retrieval(workdir, args.sizes, args.queries, args.seed)
+    if args.command in ("replay", "all"):
+        benchmarks["replay"] = lambda workdir: benchmark_replay(workdir, replay_sessions(args), args.chunks, args.model_delay,
+                                                                not args.sequential, args.seed, trace_path=args.trace,
+                                                                memory_backend=args.memory)
+    
+    document = _run(args, benchmarks)
+    text = json.dumps(document, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import hashlib
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from core.cache import LRUCache
+
+class AnswerCache:
+    """
+    Semantic cache of tutor answers.
+    
+    Entries are grouped by a fingerprint of the retrieved evidence (chunk ids
+    and their text), and a lookup hits only when the evidence fingerprint
+    matches and the cosine similarity of the optimized-query embeddings clears
+    `similarity_threshold`. Because chunk text is part of the fingerprint, a
+    re-ingest that changes a chunk also changes the fingerprint and the old
+    answer can no longer match. In-process ingests can evict entries directly
+    by passing the cache to BatchWriter as an index (add_chunks/remove_chunks).
+    """
+    
+    def __init__(self, similarity_threshold: float = 0.95, max_entries: int = 512, ttl: Optional[float] = 24 * 3600,
+                 max_per_fingerprint: int = 8):
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_per_fingerprint = max_per_fingerprint
+        # fingerprint -> (chunk ids, [(query vector, answer, created)]); evicted
+        # groups are also dropped from the chunk id -> fingerprints map.
+        self._groups = LRUCache(max_entries=max_entries, ttl=ttl, on_evict=self._forget)
+        self._chunk_fingerprints: Dict[str, Set[str]] = {}
+        # Reentrant: putting a group can evict another, which calls _forget.
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def fingerprint(results: Dict) -> str:
+        """Fingerprint of retrieved evidence: chunk ids together with their text."""
+        digest = hashlib.sha1()
+        ids = results.get('ids') or [[]]
+        documents = results.get('documents') or [[]]
+        for chunk_id, document in zip(ids[0], documents[0]):
+            digest.update(chunk_id.encode("utf-8"))
+            digest.update(b"\x00")
+            digest.update(hashlib.sha1((document or "").encode("utf-8")).digest())
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    def lookup(self, query_embedding, fingerprint: str) -> Optional[str]:
+        """Return a cached answer for near-identical queries over the same evidence."""
+        group = self._groups.get(fingerprint)
+        if group:
+            query = self._normalize(query_embedding)
+            now = time.time()
+            for vector, answer, created in reversed(group[1]):
+                if self.ttl is not None and now - created > self.ttl:
+                    continue
+                if float(np.dot(vector, query)) >= self.similarity_threshold:
+                    self.hits += 1
+                    return answer
+        self.misses += 1
+        return None
+    
+    def store(self, query_embedding, fingerprint: str, answer: str, chunk_ids: Iterable[str]):
+        """Cache an answer generated from the given evidence."""
+        with self._lock:
+            chunk_ids = tuple(dict.fromkeys(chunk_ids))
+            _, entries = self._groups.get(fingerprint) or (chunk_ids, [])
+            entries = (entries + [(self._normalize(query_embedding), answer, time.time())])[-self.max_per_fingerprint:]
+            for chunk_id in chunk_ids:
+                self._chunk_fingerprints.setdefault(chunk_id, set()).add(fingerprint)
+            self._groups.put(fingerprint, (chunk_ids, entries))
+    
+    def _forget(self, fingerprint: str, group: Tuple):
+        """Remove an evicted or invalidated group from the chunk id -> fingerprints map."""
+        with self._lock:
+            for chunk_id in group[0]:
+                fingerprints = self._chunk_fingerprints.get(chunk_id)
+                if fingerprints is not None:
+                    fingerprints.discard(fingerprint)
+                    if not fingerprints:
+                        del self._chunk_fingerprints[chunk_id]
+    
+    def invalidate_chunks(self, ids: Iterable[str]):
+        """Drop every answer whose evidence included one of these chunks."""
+        with self._lock:
+            for chunk_id in ids:
+                for fingerprint in list(self._chunk_fingerprints.get(chunk_id, ())):
+                    group = self._groups.pop(fingerprint)
+                    if group is not None:
+                        self._forget(fingerprint, group)
+                self._chunk_fingerprints.pop(chunk_id, None)
+    
+    def add_chunks(self, ids: List[str], documents: List[str], metadatas: Optional[List[Dict]] = None):
+        self.invalidate_chunks(ids)
+    
+    def remove_chunks(self, ids: Iterable[str]):
+        self.invalidate_chunks(ids)
+    
+    def clear(self):
+        with self._lock:
+            self._groups.clear()
+            self._chunk_fingerprints.clear()
+    
+    def __len__(self) -> int:
+        return len(self._groups)
@@ -0,0 +1,95 @@
+import time
+from typing import Dict, List, Optional
+
+class ProgressCounter:
+    """Report ingestion progress periodically instead of once per chunk."""
+    
+    def __init__(self, label: str = "chunks", every: int = 500, interval: float = 5.0):
+        self.label = label
+        self.every = every
+        self.interval = interval
+        self.count = 0
+        self.started = time.perf_counter()
+        self._last_report_count = 0
+        self._last_report_time = self.started
+    
+    def update(self, n: int = 1):
+        """Advance the counter and print a line when a reporting boundary is crossed."""
+        self.count += n
+        now = time.perf_counter()
+        if self.count - self._last_report_count >= self.every or now - self._last_report_time >= self.interval:
+            self.report(now)
+    
+    def report(self, now: Optional[float] = None):
+        """Print the current count and rate."""
+        now = now or time.perf_counter()
+        elapsed = max(now - self.started, 1e-9)
+        print(f"Ingested {self.count} {self.label} ({self.count / elapsed:.1f}/s)")
+        self._last_report_count = self.count
+        self._last_report_time = now
+
+class BatchWriter:
+    """
+    Buffer chunks across files and write them to a collection in bulk.
+    Side indexes (anything with add_chunks(ids, documents, metadatas) and
+    remove_chunks(ids)) are kept in step with every flush and delete.
+    """
+    
+    def __init__(self, collection, batch_size: int = 256, progress: Optional[ProgressCounter] = None,
+                 indexes: Optional[List] = None):
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self.progress = progress
+        self.indexes = indexes or []
+        self.written = 0
+        self.deleted = 0
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict] = []
+    
+    def add(self, chunk_id: str, document: str, metadata: Dict):
+        """Queue a chunk, flushing once the batch is full."""
+        self._ids.append(chunk_id)
+        self._documents.append(document)
+        self._metadatas.append(metadata)
+        if len(self._ids) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Write all pending chunks; the collection embeds the whole batch in one call."""
+        if not self._ids:
+            return
+        self.collection.upsert(
+            documents=self._documents,
+            metadatas=self._metadatas,
+            ids=self._ids
+        )
+        for index in self.indexes:
+            index.add_chunks(self._ids, self._documents, self._metadatas)
+        n = len(self._ids)
+        self.written += n
+        if self.progress:
+            self.progress.update(n)
+        self._ids, self._documents, self._metadatas = [], [], []
+    
+    def delete(self, ids: List[str]):
+        """Remove chunks from the collection in batch-sized requests."""
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            self.collection.delete(ids=batch)
+            for index in self.indexes:
+                index.remove_chunks(batch)
+            self.deleted += len(batch)
+    
+    def close(self):
+        """Flush the remaining chunks and print a final progress line."""
+        self.flush()
+        if self.progress:
+            self.progress.report()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterator, List, Optional, Tuple
+
+class LRUCache:
+    """
+    Thread-safe LRU mapping with an optional time-to-live per entry.
+    `on_evict(key, value)` is called for entries dropped over capacity or
+    found expired, outside the cache's lock, so it may call back into the
+    cache or take locks of its own.
+    """
+    
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None,
+                 on_evict: Optional[Callable[[Hashable, Any], None]] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a cached value and mark it most recently used."""
+        with self._lock:
+            entry = self._data.get(key)
+            expired = entry is not None and self._expired(entry[0])
+            if entry is not None and not expired:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if expired:
+                del self._data[key]
+            self.misses += 1
+        if expired:
+            self._evicted([(key, entry[1])])
+        return default
+    
+    def put(self, key: Hashable, value: Any, created: Optional[float] = None):
+        """Insert or replace a value, evicting the least recently used entries over capacity."""
+        evicted = []
+        with self._lock:
+            self._data[key] = (created if created is not None else time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                old_key, (_, old_value) = self._data.popitem(last=False)
+                evicted.append((old_key, old_value))
+        self._evicted(evicted)
+    
+    def _evicted(self, entries: List[Tuple[Hashable, Any]]):
+        if self.on_evict is not None:
+            for key, value in entries:
+                self.on_evict(key, value)
+    
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+    
+    def items(self) -> Iterator[Tuple[Hashable, Any, float]]:
+        """Snapshot of live (key, value, created) entries from least to most recently used."""
+        with self._lock:
+            entries = [(key, value, created) for key, (created, value) in self._data.items() if not self._expired(created)]
+        return iter(entries)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and not self._expired(entry[0])
+    
+    def __len__(self) -> int:
+        return len(self._data)
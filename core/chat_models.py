@@ -0,0 +1,93 @@
+import threading
+import time
+from typing import Iterator, NamedTuple, Optional
+
+class StandInMessage(NamedTuple):
+    """Minimal stand-in for a LangChain message: only `content` is used by the pipeline."""
+    content: str
+
+class ConcurrencyLimitedModel:
+    """
+    Share one chat model client between threads while capping in-flight generations.
+
+    `invoke` holds a slot for the whole call and `stream` for as long as the
+    stream is being consumed, so callers beyond `max_concurrent` wait their
+    turn instead of overloading the model server.
+    """
+    
+    def __init__(self, model, max_concurrent: int = 4):
+        self.model = model
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+    
+    def _acquire(self):
+        self._slots.acquire()
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+    
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+    
+    def invoke(self, prompt, **kwargs):
+        self._acquire()
+        try:
+            return self.model.invoke(prompt, **kwargs)
+        finally:
+            self._release()
+    
+    def stream(self, prompt, **kwargs) -> Iterator:
+        self._acquire()
+        try:
+            yield from self.model.stream(prompt, **kwargs)
+        finally:
+            self._release()
+
+class StandInChatModel:
+    """
+    Deterministic local chat model with the invoke/stream surface of ChatOllama.
+
+    Without a fixed `reply` it echoes the user question found in the prompt,
+    which keeps the query optimizer a no-op and gives every answer a
+    predictable text. `delay` is slept per streamed chunk to mimic generation.
+    """
+    
+    QUESTION_HEADERS = ("## USER QUESTION", "## CURRENT USER QUESTION")
+    
+    def __init__(self, reply: Optional[str] = None, delay: float = 0.0, words_per_chunk: int = 4):
+        self.reply = reply
+        self.delay = delay
+        self.words_per_chunk = words_per_chunk
+        self.calls = 0
+    
+    def _reply_for(self, prompt: str) -> str:
+        if self.reply is not None:
+            return self.reply
+        lines = str(prompt).splitlines()
+        for i, line in enumerate(lines):
+            if line.strip() in self.QUESTION_HEADERS:
+                for following in lines[i + 1:]:
+                    if following.strip():
+                        return following.strip()
+        return lines[-1].strip() if lines else ""
+    
+    def invoke(self, prompt, **kwargs) -> StandInMessage:
+        self.calls += 1
+        text = self._reply_for(prompt)
+        if self.delay:
+            time.sleep(self.delay * max(1, len(text.split()) // self.words_per_chunk))
+        return StandInMessage(text)
+    
+    def stream(self, prompt, **kwargs) -> Iterator[StandInMessage]:
+        self.calls += 1
+        words = self._reply_for(prompt).split(" ")
+        for start in range(0, len(words), self.words_per_chunk):
+            if self.delay:
+                time.sleep(self.delay)
+            piece = " ".join(words[start:start + self.words_per_chunk])
+            yield StandInMessage(piece if start == 0 else " " + piece)
@@ -0,0 +1,139 @@
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count (~4 characters per token for English text)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+class Chunk(NamedTuple):
+    index: int
+    text: str
+    page: Optional[int]
+
+class TextChunker:
+    """
+    Split page text into bounded, optionally overlapping chunks.
+    Sizes are given in characters or approximate tokens; token targets are
+    converted to a character budget so sizing stays a running length sum.
+    """
+    
+    def __init__(self, max_size: int = 300, overlap: int = 0, unit: str = "chars", min_chars: int = 10):
+        if unit not in ("chars", "tokens"):
+            raise ValueError(f"Unknown chunk size unit: {unit}")
+        if overlap >= max_size:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+        scale = 1 if unit == "chars" else CHARS_PER_TOKEN
+        self.max_size = max_size
+        self.overlap = overlap
+        self.unit = unit
+        self.max_chars = max_size * scale
+        self.overlap_chars = overlap * scale
+        self.min_chars = min_chars
+    
+    def stream(self, start_index: int = 0) -> "ChunkStream":
+        """Start an incremental chunking pass over one document."""
+        return ChunkStream(self, start_index)
+    
+    def chunk_pages(self, pages: Iterable[Tuple[Optional[int], str]], start_index: int = 0) -> Iterator[Chunk]:
+        """Chunk (page_number, text) pairs lazily, holding at most one page in memory."""
+        stream = self.stream(start_index)
+        for page, text in pages:
+            yield from stream.feed(page, text)
+        yield from stream.finish()
+    
+    def split_units(self, text: str) -> Iterator[str]:
+        """Break text into sentences, splitting any sentence that exceeds the size target."""
+        for paragraph in PARAGRAPH_BREAK.split(text):
+            for sentence in SENTENCE_BREAK.split(paragraph.strip()):
+                sentence = " ".join(sentence.split())
+                if not sentence:
+                    continue
+                if len(sentence) <= self.max_chars:
+                    yield sentence
+                else:
+                    yield from self._split_long(sentence)
+    
+    def _split_long(self, sentence: str) -> Iterator[str]:
+        """Split an oversized sentence on word boundaries, hard-cutting oversized words."""
+        words: List[str] = []
+        size = 0
+        for word in sentence.split(" "):
+            while len(word) > self.max_chars:
+                if words:
+                    yield " ".join(words)
+                    words, size = [], 0
+                yield word[:self.max_chars]
+                word = word[self.max_chars:]
+            if not word:
+                continue
+            word_size = len(word) + (1 if words else 0)
+            if words and size + word_size > self.max_chars:
+                yield " ".join(words)
+                words, size = [], 0
+                word_size = len(word)
+            words.append(word)
+            size += word_size
+        if words:
+            yield " ".join(words)
+
+class ChunkStream:
+    """Incremental chunker state for one document; chunks never span pages."""
+    
+    def __init__(self, chunker: TextChunker, start_index: int = 0):
+        self.chunker = chunker
+        self.next_index = start_index
+        self._page: Optional[int] = None
+        self._units: List[str] = []
+        self._size = 0
+        self._fresh = 0
+    
+    def feed(self, page: Optional[int], text: str) -> Iterator[Chunk]:
+        """Consume text from a page, yielding every chunk that becomes complete."""
+        if self._units and page != self._page:
+            yield from self._emit(carry_overlap=False)
+        self._page = page
+        max_chars = self.chunker.max_chars
+        for unit in self.chunker.split_units(text):
+            unit_size = len(unit) + (1 if self._units else 0)
+            if self._units and self._size + unit_size > max_chars:
+                yield from self._emit(carry_overlap=True)
+                if self._units and self._size + len(unit) + 1 > max_chars:
+                    self._units, self._size = [], 0
+                unit_size = len(unit) + (1 if self._units else 0)
+            self._units.append(unit)
+            self._size += unit_size
+            self._fresh += 1
+    
+    def finish(self) -> Iterator[Chunk]:
+        """Emit whatever is left at the end of the document."""
+        if self._units:
+            yield from self._emit(carry_overlap=False)
+    
+    def _emit(self, carry_overlap: bool) -> Iterator[Chunk]:
+        if self._fresh:
+            text = " ".join(self._units)
+            if len(text) >= self.chunker.min_chars:
+                yield Chunk(self.next_index, text, self._page)
+                self.next_index += 1
+        self._units = self._overlap_tail() if carry_overlap else []
+        self._size = sum(len(unit) for unit in self._units) + max(len(self._units) - 1, 0)
+        self._fresh = 0
+    
+    def _overlap_tail(self) -> List[str]:
+        """Trailing units of the emitted chunk that fit in the overlap budget (never all of them)."""
+        overlap = self.chunker.overlap_chars
+        if overlap <= 0:
+            return []
+        tail: List[str] = []
+        size = 0
+        for unit in reversed(self._units[1:]):
+            size += len(unit) + (1 if tail else 0)
+            if size > overlap:
+                break
+            tail.append(unit)
+        tail.reverse()
+        return tail
@@ -0,0 +1,114 @@
+from typing import Dict, List, Optional, Set, Tuple
+from core.chunker import estimate_tokens
+from core.query_tokenizer import normalize_words
+
+def document_header(i: int, metadata: Dict) -> str:
+    return f"\n--- Document {i} (Source: {metadata.get('source', 'Unknown')}) ---\n"
+
+def _shingles(text: str, size: int = 3) -> Set[str]:
+    words = normalize_words(text)
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def _join_overlapping(left: str, right: str, min_overlap: int = 20) -> str:
+    """Concatenate two adjacent chunks, dropping text the right one repeats from the left."""
+    for k in range(min(len(left), len(right)), min_overlap - 1, -1):
+        if left.endswith(right[:k]):
+            return left + right[k:]
+    return f"{left} {right}"
+
+class _PackedDocument:
+    __slots__ = ("metadata", "source", "first_index", "last_index", "parts", "shingles")
+    
+    def __init__(self, text: str, metadata: Dict, shingles: Set[str]):
+        self.metadata = metadata
+        self.source = metadata.get("source")
+        index = metadata.get("chunk_index")
+        self.first_index = index
+        self.last_index = index
+        self.parts = [text]
+        self.shingles = set(shingles)
+    
+    @property
+    def text(self) -> str:
+        text = self.parts[0]
+        for part in self.parts[1:]:
+            text = _join_overlapping(text, part)
+        return text
+
+class ContextPacker:
+    """
+    Pack ranked chunks into a prompt token budget.
+    
+    Chunks are taken in rank order. Near-duplicates of already selected text
+    (by word-shingle Jaccard or containment) are dropped, a chunk whose
+    `chunk_index` is adjacent to a selected chunk from the same `source` is
+    merged into it with the repeated overlap removed, and anything that would
+    exceed `token_budget` is skipped.
+    """
+    
+    def __init__(self, token_budget: int = 8000, duplicate_threshold: float = 0.8):
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+    
+    def _is_duplicate(self, shingles: Set[str], packed: List[_PackedDocument]) -> bool:
+        if not shingles:
+            return True
+        for document in packed:
+            common = len(shingles & document.shingles)
+            if not common:
+                continue
+            if common / len(shingles) >= self.duplicate_threshold:
+                return True
+            if common / len(shingles | document.shingles) >= self.duplicate_threshold:
+                return True
+        return False
+    
+    def _adjacent(self, metadata: Dict, packed: List[_PackedDocument]) -> Tuple[Optional[_PackedDocument], bool]:
+        """Find a packed document this chunk extends; the flag says whether it goes after it."""
+        source = metadata.get("source")
+        index = metadata.get("chunk_index")
+        if source is None or not isinstance(index, int):
+            return None, False
+        for document in packed:
+            if document.source != source or document.first_index is None:
+                continue
+            if index == document.last_index + 1:
+                return document, True
+            if index == document.first_index - 1:
+                return document, False
+        return None, False
+    
+    def pack(self, documents: List[Tuple[str, Dict]]) -> List[Tuple[str, Dict]]:
+        """Select, merge and deduplicate (text, metadata) pairs given in rank order."""
+        packed: List[_PackedDocument] = []
+        used = 0
+        for text, metadata in documents:
+            metadata = metadata or {}
+            shingles = _shingles(text)
+            if self._is_duplicate(shingles, packed):
+                continue
+            
+            neighbour, after = self._adjacent(metadata, packed)
+            if neighbour is not None:
+                cost = estimate_tokens(text)
+                if used + cost > self.token_budget:
+                    continue
+                if after:
+                    neighbour.parts.append(text)
+                    neighbour.last_index = metadata["chunk_index"]
+                else:
+                    neighbour.parts.insert(0, text)
+                    neighbour.first_index = metadata["chunk_index"]
+                neighbour.shingles |= shingles
+                used += cost
+                continue
+            
+            cost = estimate_tokens(document_header(len(packed) + 1, metadata) + text)
+            if used + cost > self.token_budget:
+                continue
+            packed.append(_PackedDocument(text, metadata, shingles))
+            used += cost
+        
+        return [(document.text, document.metadata) for document in packed]
@@ -1,69 +1,280 @@
+import os
 from typing import List, Dict, Tuple, Optional
 import utils.chroma_test as chroma_test
+from core.context_packer import ContextPacker, document_header
+from core.document_store import DocumentStore, get_document_store
+from core.instrumentation import NULL_TRACE
+from core.keyword_index import KeywordIndex, TermMatcher
+from core.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from core.reranker import MMRReranker, select_results
+
+RETRIEVAL_MODES = ("vector", "hybrid")
 
 class DocumentProcessor:
     """Process document retrieval and filtering."""
     
-    def __init__(self, n_results: int = 20, distance_threshold: float = 1.5):
+    def __init__(self, n_results: int = 20, distance_threshold: float = 1.5, store: Optional[DocumentStore] = None,
+                 keyword_index: Optional[KeywordIndex] = None, retrieval_mode: str = "vector",
+                 lexical_index: Optional[LexicalIndex] = None, rrf_k: int = 60,
+                 context_packer: Optional[ContextPacker] = None, reranker: Optional[MMRReranker] = None):
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {retrieval_mode}")
         self.n_results = n_results
         self.distance_threshold = distance_threshold
+        self.store = store or get_document_store()
+        self._keyword_index = keyword_index
+        self.retrieval_mode = retrieval_mode
+        self._lexical_index = lexical_index
+        self.rrf_k = rrf_k
+        self.context_packer = context_packer
+        self.reranker = reranker
+    
+    @property
+    def keyword_index(self) -> Optional[KeywordIndex]:
+        """Keyword index built by the ingest path, loaded on first use if present."""
+        if self._keyword_index is None:
+            path = KeywordIndex.path_for(self.store.path, self.store.collection_name)
+            if os.path.exists(path):
+                self._keyword_index = KeywordIndex.load(path)
+        return self._keyword_index
+    
+    @property
+    def lexical_index(self) -> Optional[LexicalIndex]:
+        """BM25 index built by the ingest path, loaded on first use if present."""
+        if self._lexical_index is None:
+            path = LexicalIndex.path_for(self.store.path, self.store.collection_name)
+            if os.path.exists(path):
+                self._lexical_index = LexicalIndex.load(path)
+        return self._lexical_index
+    
+    def query_include(self) -> List[str]:
+        """Fields to request from Chroma; the reranker also needs the chunk embeddings."""
+        include = ["documents", "metadatas", "distances"]
+        if self.reranker is not None:
+            include.append("embeddings")
+        return include
+    
+    def retrieve_documents(self, query: str, sources: Optional[List[str]] = None) -> Dict:
+        """
+        Retrieve documents from ChromaDB, fused with BM25 results in hybrid mode.
+        `sources` restricts the search to chunks of those files (and to their
+        shards when the store is sharded).
+        """
+        results = chroma_test.query_documents(query, n_results=self.n_results, verbose=False, store=self.store,
+                                              include=self.query_include(), sources=sources)
+        if self.retrieval_mode == "hybrid" and self.lexical_index is not None:
+            return self.fuse_lexical(query, results, sources=sources)
+        return results
+    
+    def retrieve_documents_batch(self, queries: List[str]) -> List[Dict]:
+        """Retrieve documents for several queries with one embedding pass and one multi-query search."""
+        results = self.store.query_many(queries, n_results=self.n_results, include=self.query_include())
+        if self.retrieval_mode == "hybrid" and self.lexical_index is not None:
+            results = [self.fuse_lexical(query, query_results) for query, query_results in zip(queries, results)]
+        return results
+    
+    def fuse_lexical(self, query: str, vector_results: Dict, sources: Optional[List[str]] = None) -> Dict:
+        """
+        Merge vector results with BM25 hits using reciprocal rank fusion.
+        Chunks found only lexically are fetched from the store; those outside
+        `sources` are dropped before the fused list is cut to n_results. A
+        lexical-only chunk has no vector distance, so it takes the distance of
+        the vector hit fused just above it: an exact-term hit passes the
+        distance threshold when the vector hits it outranks do. The result
+        keeps Chroma's query-result shape.
+        """
+        vector_ids = vector_results['ids'][0] if vector_results.get('ids') else []
+        known = {
+            chunk_id: (doc, metadata, distance)
+            for chunk_id, doc, metadata, distance in zip(
+                vector_ids,
+                vector_results['documents'][0],
+                vector_results['metadatas'][0],
+                vector_results['distances'][0]
+            )
+        }
+        lexical_ids, lexical_only = self._lexical_ranking(query, known, sources)
+        if not lexical_ids:
+            return vector_results
+        
+        fused = reciprocal_rank_fusion([vector_ids, lexical_ids], k=self.rrf_k)
+        fused_ids = [chunk_id for chunk_id, _ in fused[:self.n_results]]
+        
+        distances = self._borrowed_distances(fused_ids, known)
+        for chunk_id in fused_ids:
+            if chunk_id not in known:
+                doc, metadata = lexical_only[chunk_id]
+                known[chunk_id] = (doc, metadata, distances[chunk_id])
+        
+        return {
+            'ids': [fused_ids],
+            'documents': [[known[chunk_id][0] for chunk_id in fused_ids]],
+            'metadatas': [[known[chunk_id][1] for chunk_id in fused_ids]],
+            'distances': [[known[chunk_id][2] for chunk_id in fused_ids]]
+        }
     
-    def retrieve_documents(self, query: str) -> Dict:
-        """Retrieve documents from ChromaDB."""
-        return chroma_test.query_documents(query, n_results=self.n_results, verbose=False)
+    def _lexical_ranking(self, query: str, known: Dict[str, Tuple],
+                         sources: Optional[List[str]]) -> Tuple[List[str], Dict[str, Tuple]]:
+        """
+        Top n_results BM25 ids within `sources`, plus the documents and
+        metadatas of those not already in `known`. The BM25 index does not
+        know sources, so with a filter the search is widened until enough
+        hits survive it or the ranking runs out.
+        """
+        depth = self.n_results
+        lexical_only: Dict[str, Tuple] = {}
+        rejected = set()
+        while True:
+            lexical_hits = self.lexical_index.search(query, n_results=depth)
+            missing = [chunk_id for chunk_id, _ in lexical_hits
+                       if chunk_id not in known and chunk_id not in lexical_only and chunk_id not in rejected]
+            if missing:
+                fetched = self.store.get(missing)
+                for chunk_id, doc, metadata in zip(fetched['ids'], fetched['documents'], fetched['metadatas']):
+                    if sources and (metadata or {}).get("source") not in sources:
+                        rejected.add(chunk_id)
+                    else:
+                        lexical_only[chunk_id] = (doc, metadata)
+            lexical_ids = [chunk_id for chunk_id, _ in lexical_hits if chunk_id in known or chunk_id in lexical_only]
+            if len(lexical_ids) >= self.n_results or len(lexical_hits) < depth:
+                return lexical_ids[:self.n_results], lexical_only
+            depth *= 2
+    
+    @staticmethod
+    def _borrowed_distances(fused_ids: List[str], known: Dict[str, Tuple]) -> Dict[str, float]:
+        """
+        Distances for the fused ids missing from `known`, taken from the
+        nearest vector hit above them (the best vector distance when none
+        is, and 0.0 when there are no vector hits at all).
+        """
+        vector_distances = [known[chunk_id][2] for chunk_id in fused_ids if chunk_id in known]
+        if not vector_distances:
+            best = min((distance for _, _, distance in known.values()), default=0.0)
+            return {chunk_id: best for chunk_id in fused_ids}
+        borrowed = {}
+        above = vector_distances[0]
+        for chunk_id in fused_ids:
+            if chunk_id in known:
+                above = known[chunk_id][2]
+            else:
+                borrowed[chunk_id] = above
+        return borrowed
     
     def filter_documents(self, results: Dict, important_terms: List[str], key_terms: List[str]) -> List[Tuple]:
         """Filter documents by relevance and keyword matching."""
-        filtered_documents = []
-        
         if not results or 'documents' not in results or not results['documents']:
-            return filtered_documents
+            return []
         
+        distances = self._distances(results)
+        return [
+            (results['documents'][0][i], results['metadatas'][0][i], distances[i])
+            for i in self._filter_indices(results, important_terms, key_terms)
+        ]
+    
+    @staticmethod
+    def _distances(results: Dict) -> List[float]:
         distances = results.get('distances', [])
         if distances and len(distances) > 0:
-            distances = distances[0]
+            return distances[0]
+        return [0.0] * len(results['documents'][0])
+    
+    def _filter_indices(self, results: Dict, important_terms: List[str], key_terms: List[str]) -> List[int]:
+        """Positions of the results that pass the distance threshold and keyword match."""
+        kept = []
+        
+        if not results or 'documents' not in results or not results['documents']:
+            return kept
+        
+        distances = self._distances(results)
+        
+        ids = results.get('ids')
+        ids = ids[0] if ids else [None] * len(results['documents'][0])
+        
+        if important_terms:
+            matcher = TermMatcher(important_terms, self.keyword_index)
         else:
-            distances = [0.0] * len(results['documents'][0])
+            matcher = TermMatcher(key_terms, self.keyword_index) if key_terms else None
         
-        for doc, metadata, distance in zip(
-            results['documents'][0],
-            results['metadatas'][0],
-            distances
-        ):
-            doc_lower = doc.lower()
+        for i, (chunk_id, doc, distance) in enumerate(zip(ids, results['documents'][0], distances)):
+            if distance >= self.distance_threshold:
+                continue
             
-            if important_terms:
-                contains_important = any(term in doc_lower for term in important_terms)
-            else:
-                contains_important = any(term in doc_lower for term in key_terms) if key_terms else True
+            contains_important = matcher.matches(chunk_id, doc) if matcher else True
             
-            if contains_important and distance < self.distance_threshold:
-                filtered_documents.append((doc, metadata, distance))
+            if contains_important:
+                kept.append(i)
         
-        return filtered_documents
+        return kept
+    
+    def with_embeddings(self, results: Dict) -> Dict:
+        """Make sure a single-query result carries embeddings, fetching them by id if the search did not."""
+        ids = results['ids'][0] if results.get('ids') else []
+        embeddings = results.get('embeddings')
+        if not ids or (embeddings is not None and embeddings[0] is not None and len(embeddings[0]) == len(ids)):
+            return results
+        fetched = self.store.get(ids, include=["embeddings"])
+        by_id = dict(zip(fetched['ids'], fetched['embeddings']))
+        return {**results, 'embeddings': [[by_id[chunk_id] for chunk_id in ids]]}
+    
+    def rerank(self, results: Dict, important_terms: List[str], key_terms: List[str]) -> Tuple[List[Tuple], Dict]:
+        """
+        Filter, then rerank the survivors for diversity. Returns the filtered
+        documents and the reranked raw results that format_documents falls
+        back to when nothing passes the filter.
+        """
+        if not results or not results.get('ids') or not results['ids'][0]:
+            return [], results
+        results = self.with_embeddings(results)
+        kept = self._filter_indices(results, important_terms, key_terms)
+        if not kept:
+            return [], self.reranker.rerank(results)
+        selected = self.reranker.rerank(select_results(results, kept))
+        filtered_documents = list(zip(selected['documents'][0], selected['metadatas'][0], selected['distances'][0]))
+        return filtered_documents, selected
     
     def format_documents(self, filtered_documents: List[Tuple], fallback_results: Optional[Dict] = None) -> str:
-        """Format documents into text for prompt."""
-        documents_text = ""
-        
+        """Format documents into text for prompt, packed into the token budget when a packer is set."""
         if filtered_documents:
-            for i, (doc, metadata, distance) in enumerate(filtered_documents, 1):
-                documents_text += f"\n--- Document {i} (Source: {metadata.get('source', 'Unknown')}) ---\n"
-                documents_text += f"{doc}\n"
+            documents = [(doc, metadata) for doc, metadata, distance in filtered_documents]
         elif fallback_results and 'documents' in fallback_results and fallback_results['documents']:
-            for i, (doc, metadata) in enumerate(zip(
-                fallback_results['documents'][0],
-                fallback_results['metadatas'][0]
-            ), 1):
-                documents_text += f"\n--- Document {i} (Source: {metadata.get('source', 'Unknown')}) ---\n"
-                documents_text += f"{doc}\n"
+            documents = list(zip(fallback_results['documents'][0], fallback_results['metadatas'][0]))
+        else:
+            documents = []
+        
+        if self.context_packer is not None:
+            documents = self.context_packer.pack(documents)
         
-        return documents_text
+        parts = []
+        for i, (doc, metadata) in enumerate(documents, 1):
+            parts.append(document_header(i, metadata))
+            parts.append(f"{doc}\n")
+        
+        return "".join(parts)
+    
+    def process_results(self, results: Dict, important_terms: List[str], key_terms: List[str], trace=NULL_TRACE) -> str:
+        """Filter and format already retrieved results."""
+        with trace.span("filter"):
+            if self.reranker is not None:
+                filtered_documents, fallback_results = self.rerank(results, important_terms, key_terms)
+            else:
+                filtered_documents, fallback_results = self.filter_documents(results, important_terms, key_terms), results
+        trace.count("candidates_kept", len(filtered_documents))
+        if not filtered_documents:
+            trace.count("filter_fallbacks")
+        with trace.span("format"):
+            return self.format_documents(filtered_documents, fallback_results)
     
     def process_query(self, query: str, important_terms: List[str], key_terms: List[str]) -> tuple[str, Dict]:
         """Complete document processing pipeline."""
         results = self.retrieve_documents(query)
-        filtered_documents = self.filter_documents(results, important_terms, key_terms)
-        documents_text = self.format_documents(filtered_documents, results)
+        documents_text = self.process_results(results, important_terms, key_terms)
         return documents_text, results
-
+    
+    def process_queries(self, queries: List[str], important_terms: List[List[str]],
+                        key_terms: List[List[str]]) -> List[Tuple[str, Dict]]:
+        """Batch version of process_query: per-query (documents_text, results) in input order."""
+        batch_results = self.retrieve_documents_batch(queries)
+        return [
+            (self.process_results(results, query_important_terms, query_key_terms), results)
+            for results, query_important_terms, query_key_terms in zip(batch_results, important_terms, key_terms)
+        ]
@@ -0,0 +1,215 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+import chromadb
+from chromadb.utils import embedding_functions
+from core.cache import LRUCache
+from core.embedding_cache import CachedEmbeddingFunction, EmbeddingCache
+
+DEFAULT_DB_PATH = "chroma_db"
+DEFAULT_COLLECTION_NAME = "test_collection"
+
+# Chroma caches one system per path for the whole process, so closing any
+# store resets them all; stores compare generations to notice and reopen.
+_generation = 0
+
+class DocumentStore:
+    """Long-lived handle on the persistent ChromaDB document collection."""
+    
+    def __init__(self, path: str = DEFAULT_DB_PATH, collection_name: str = DEFAULT_COLLECTION_NAME,
+                 embedding_function=None, query_cache_size: int = 256, embedding_cache: Optional[EmbeddingCache] = None):
+        self.path = path
+        self.collection_name = collection_name
+        self._embedding_function = embedding_function
+        self._embedding_cache = embedding_cache
+        self._query_embeddings = LRUCache(max_entries=query_cache_size)
+        self._client = None
+        self._collection = None
+        self._opened_generation = -1
+        self._lock = threading.RLock()
+        self._warmup_thread: Optional[threading.Thread] = None
+    
+    @property
+    def embedding_function(self):
+        """
+        Embedding function shared by the collection, query-side callers and
+        conversation memory. By default it is Chroma's default model behind a
+        content-addressed cache persisted next to the Chroma directory.
+        """
+        if self._embedding_function is None:
+            with self._lock:
+                if self._embedding_function is None:
+                    cache = self._embedding_cache
+                    if cache is None:
+                        cache = EmbeddingCache(path=EmbeddingCache.path_for(self.path))
+                    self._embedding_function = CachedEmbeddingFunction(embedding_functions.DefaultEmbeddingFunction(), cache)
+        return self._embedding_function
+    
+    @property
+    def collection(self):
+        """Open the store on first use and return the collection."""
+        if self._collection is None or self._opened_generation != _generation:
+            with self._lock:
+                if self._collection is None or self._opened_generation != _generation:
+                    self._client = chromadb.PersistentClient(path=self.path)
+                    self._collection = self._client.get_or_create_collection(
+                        name=self.collection_name,
+                        embedding_function=self.embedding_function
+                    )
+                    self._opened_generation = _generation
+        return self._collection
+    
+    def is_open(self) -> bool:
+        """Check whether the underlying client has been opened."""
+        return self._collection is not None and self._opened_generation == _generation
+    
+    def warmup(self, background: bool = False):
+        """Open the store and load the vector index before the first real query."""
+        if background:
+            if self._warmup_thread is None or not self._warmup_thread.is_alive():
+                self._warmup_thread = threading.Thread(target=self._warmup, name="document-store-warmup", daemon=True)
+                self._warmup_thread.start()
+            return
+        self._warmup()
+    
+    def _warmup(self):
+        """Touch the collection so SQLite, the HNSW index and the embedding model are loaded."""
+        try:
+            collection = self.collection
+            if collection.count() > 0:
+                collection.query(query_texts=["warmup"], n_results=1, include=[])
+        except Exception as e:
+            print(f"Document store warmup failed: {e}")
+    
+    def close(self):
+        """Release the client so the next access reopens the store from disk."""
+        global _generation
+        with self._lock:
+            if self._client is not None:
+                clear_cache = getattr(self._client, "clear_system_cache", None)
+                if clear_cache is not None:
+                    clear_cache()
+                    _generation += 1
+            self._client = None
+            self._collection = None
+    
+    def reload(self):
+        """Close and immediately reopen the store, e.g. after an external re-ingest."""
+        with self._lock:
+            self.close()
+            return self.collection
+    
+    def collection_names(self) -> List[str]:
+        """Names of the Chroma collections holding this store's chunks."""
+        return [self.collection_name]
+    
+    def drop_collection(self):
+        """Delete the store's collections from disk; the next access creates them empty."""
+        with self._lock:
+            self.collection  # make sure the client is open
+            for name in self.collection_names():
+                self._client.delete_collection(name)
+            self._collection = None
+    
+    def max_batch_size(self) -> int:
+        """Largest number of records Chroma accepts in a single write."""
+        self.collection  # make sure the client is open
+        get_max = getattr(self._client, "get_max_batch_size", None)
+        if get_max is not None:
+            return get_max()
+        return getattr(self._client, "max_batch_size", 5461)
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query string, reusing recent embeddings of the same text."""
+        return self.embed_queries([query])[0]
+    
+    def embed_queries(self, queries: List[str]) -> List:
+        """Embed several queries, computing all uncached ones in a single embedding call."""
+        embeddings = [self._query_embeddings.get(query) for query in queries]
+        missing = list(dict.fromkeys(query for query, embedding in zip(queries, embeddings) if embedding is None))
+        if missing:
+            computed = dict(zip(missing, self.embedding_function(missing)))
+            for query, embedding in computed.items():
+                self._query_embeddings.put(query, embedding)
+            embeddings = [computed[query] if embedding is None else embedding for query, embedding in zip(queries, embeddings)]
+        return embeddings
+    
+    def query(self, query: str, n_results: int = 10, include: Optional[List[str]] = None,
+              sources: Optional[List[str]] = None) -> Dict:
+        """Run a vector search against the collection, optionally limited to chunks from `sources`."""
+        return self.collection.query(
+            query_embeddings=[self.embed_query(query)],
+            n_results=n_results,
+            include=include or ["documents", "metadatas", "distances"],
+            where=source_filter(sources)
+        )
+    
+    def query_many(self, queries: List[str], n_results: int = 10, include: Optional[List[str]] = None) -> List[Dict]:
+        """Search for several queries in one index probe; returns one single-query result per query."""
+        if not queries:
+            return []
+        results = self.collection.query(
+            query_embeddings=self.embed_queries(queries),
+            n_results=n_results,
+            include=include or ["documents", "metadatas", "distances"]
+        )
+        return split_query_results(results, len(queries))
+    
+    def get(self, ids: List[str], include: Optional[List[str]] = None) -> Dict:
+        """Fetch stored chunks by id."""
+        return self.collection.get(ids=ids, include=include or ["documents", "metadatas"])
+
+def source_filter(sources: Optional[List[str]]) -> Optional[Dict]:
+    """Chroma metadata filter matching chunks from any of `sources`, or None for no filter."""
+    if not sources:
+        return None
+    return {"source": {"$in": list(sources)}}
+
+QUERY_RESULT_KEYS = ("ids", "documents", "metadatas", "distances", "embeddings", "uris", "data")
+
+def split_query_results(results: Dict, n_queries: int) -> List[Dict]:
+    """Split a multi-query Chroma result into per-query results of the usual [[...]] shape."""
+    split = [{} for _ in range(n_queries)]
+    for key, value in results.items():
+        for i in range(n_queries):
+            if key in QUERY_RESULT_KEYS:
+                split[i][key] = [value[i]] if value is not None else None
+            else:
+                split[i][key] = value
+    return split
+
+_stores: Dict[Tuple[str, str], DocumentStore] = {}
+_stores_lock = threading.Lock()
+
+def get_document_store(path: str = DEFAULT_DB_PATH, collection_name: str = DEFAULT_COLLECTION_NAME) -> DocumentStore:
+    """
+    Return the process-wide store for a path and collection, creating it on
+    first use. Collections listed in the shard config next to the database
+    are opened as a ShardedDocumentStore.
+    """
+    # Imported here because the sharded store subclasses DocumentStore.
+    from core.sharded_store import ShardConfig, ShardedDocumentStore
+    
+    key = (path, collection_name)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            n_shards = ShardConfig.load(ShardConfig.path_for(path)).shard_count(collection_name)
+            if n_shards > 1:
+                store = ShardedDocumentStore(path=path, collection_name=collection_name, n_shards=n_shards)
+            else:
+                store = DocumentStore(path=path, collection_name=collection_name)
+            _stores[key] = store
+        return store
+
+def register_document_store(store: DocumentStore) -> DocumentStore:
+    """Make `store` the process-wide store for its path and collection, e.g. one with a custom embedding function."""
+    with _stores_lock:
+        _stores[(store.path, store.collection_name)] = store
+    return store
+
+def reset_document_stores():
+    """Close and forget every shared store, e.g. after the shard layout changed."""
+    with _stores_lock:
+        for store in _stores.values():
+            store.close()
+        _stores.clear()
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import numpy as np
+from core.cache import LRUCache
+from core.persist import atomic_write_json, sibling_path
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+EMBEDDING_CACHE_DIRNAME = "embedding_cache"
+KEY_SIZE = 16
+
+def text_key(text: str, namespace: str = "") -> bytes:
+    """Content address of a text for a given embedding model."""
+    return hashlib.blake2b(f"{namespace}\x00{text}".encode("utf-8"), digest_size=KEY_SIZE).digest()
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding store: an in-memory LRU in front of an
+    optional append-only disk store.
+
+    On disk, `vectors.f32` holds contiguous float32 rows that are read through
+    a memory map and `keys.bin` holds the matching 16-byte content hashes,
+    one per row. Several processes (the tutor, the service, an ingest) may
+    share a directory: appends hold an exclusive lock on `lock` and place
+    their rows after the rows already on disk, and rows written by other
+    processes are picked up on a miss. Vectors are written before their
+    keys, so a torn write at the end is ignored and overwritten by the next
+    append. Past `max_rows` rows on disk, new vectors are only cached in
+    memory.
+    """
+    
+    VERSION = 1
+    
+    def __init__(self, path: Optional[str] = None, max_entries: int = 4096, max_rows: int = 250_000):
+        self.path = path
+        self.max_rows = max_rows
+        self._memory = LRUCache(max_entries=max_entries)
+        self._rows: Dict[bytes, int] = {}
+        self._disk_rows = 0
+        self._vectors: Optional[np.memmap] = None
+        self.dim: Optional[int] = None
+        self._writable = True
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            with self._lock:
+                self._refresh()
+    
+    @staticmethod
+    def path_for(db_path: str) -> str:
+        # Shared by every store under one parent: entries are keyed by model and text, so sharing is safe.
+        return sibling_path(db_path, EMBEDDING_CACHE_DIRNAME)
+    
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+    
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the cache directory across processes (a no-op where fcntl is unavailable)."""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file("lock"), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def _read_meta(self) -> bool:
+        """Read the vector size from meta.json; False if the cache has not been created yet."""
+        try:
+            with open(self._file("meta.json"), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Ignoring unreadable embedding cache {self.path}: {e}")
+            self._writable = False
+            return False
+        if meta.get("version") != self.VERSION:
+            # Another version's files are left alone rather than overwritten.
+            self._writable = False
+            return False
+        self.dim = meta["dim"]
+        return True
+    
+    def _complete_rows(self) -> int:
+        """Rows whose vector and key are both fully on disk."""
+        try:
+            keys_bytes = os.path.getsize(self._file("keys.bin"))
+            vector_bytes = os.path.getsize(self._file("vectors.f32"))
+        except FileNotFoundError:
+            return 0
+        return min(keys_bytes // KEY_SIZE, vector_bytes // (4 * self.dim))
+    
+    def _refresh(self):
+        """Index rows appended to disk since the last refresh, by this or another process."""
+        if self.dim is None and not self._read_meta():
+            return
+        rows = self._complete_rows()
+        if rows <= self._disk_rows:
+            return
+        with open(self._file("keys.bin"), 'rb') as f:
+            f.seek(self._disk_rows * KEY_SIZE)
+            keys = f.read((rows - self._disk_rows) * KEY_SIZE)
+        for offset in range(rows - self._disk_rows):
+            self._rows.setdefault(keys[offset * KEY_SIZE:(offset + 1) * KEY_SIZE], self._disk_rows + offset)
+        self._disk_rows = rows
+    
+    def _row_vector(self, row: int) -> Optional[np.ndarray]:
+        # The map is widened lazily, when a row past its end is first read.
+        if self._vectors is None or row >= len(self._vectors):
+            self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode='r', shape=(self._disk_rows, self.dim))
+        if row >= len(self._vectors):
+            return None
+        return np.array(self._vectors[row])
+    
+    def _append(self, keys: List[bytes], vectors: np.ndarray):
+        with self._file_lock():
+            self._refresh()
+            if self.dim is None:
+                if not self._writable:
+                    return
+                self.dim = vectors.shape[1]
+                # Append mode creates missing files without truncating ones another process just created.
+                for name in ("keys.bin", "vectors.f32"):
+                    open(self._file(name), 'ab').close()
+                atomic_write_json(self._file("meta.json"), {"version": self.VERSION, "dim": self.dim})
+            if vectors.shape[1] != self.dim:
+                return
+            fresh = [i for i, key in enumerate(keys) if key not in self._rows]
+            start = self._disk_rows
+            fresh = fresh[:max(0, self.max_rows - start)]
+            if not fresh:
+                return
+            # Rows go right after the last complete row on disk, overwriting any torn tail.
+            # Vectors first: a key is only trusted once its row is complete.
+            with open(self._file("vectors.f32"), 'r+b') as f:
+                f.seek(start * 4 * self.dim)
+                f.write(np.ascontiguousarray(vectors[fresh], dtype=np.float32).tobytes())
+            with open(self._file("keys.bin"), 'r+b') as f:
+                f.seek(start * KEY_SIZE)
+                f.write(b"".join(keys[i] for i in fresh))
+            for offset, i in enumerate(fresh):
+                self._rows[keys[i]] = start + offset
+            self._disk_rows = start + len(fresh)
+    
+    def _lookup(self, key: bytes) -> Optional[np.ndarray]:
+        vector = self._memory.get(key)
+        if vector is None and key in self._rows:
+            with self._lock:
+                row = self._rows.get(key)
+                if row is not None:
+                    vector = self._row_vector(row)
+            if vector is not None:
+                self._memory.put(key, vector)
+        return vector
+    
+    def get_many(self, keys: List[bytes]) -> List[Optional[np.ndarray]]:
+        """Cached vectors for the keys, None where a key has not been embedded yet."""
+        found = [self._lookup(key) for key in keys]
+        if self.path and any(vector is None for vector in found):
+            # Another process may have embedded these since we last looked.
+            with self._lock:
+                before = self._disk_rows
+                self._refresh()
+                grew = self._disk_rows > before
+            if grew:
+                found = [self._lookup(key) if vector is None else vector for key, vector in zip(keys, found)]
+        for vector in found:
+            if vector is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return found
+    
+    def put_many(self, keys: List[bytes], vectors: List):
+        """Store freshly computed vectors in memory and, if configured, on disk."""
+        if not keys:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        for key, vector in zip(keys, matrix):
+            self._memory.put(key, vector)
+        if self.path:
+            with self._lock:
+                new: Dict[bytes, int] = {}
+                for row, key in enumerate(keys):
+                    if key not in self._rows:
+                        new.setdefault(key, row)
+                if new:
+                    self._append(list(new), matrix[list(new.values())])
+    
+    def __len__(self) -> int:
+        return max(len(self._rows), len(self._memory))
+
+class CachedEmbeddingFunction:
+    """
+    Embedding function that only computes embeddings for text it has not
+    seen before, delegating misses to `base` in one batch.
+
+    It reports the base function's name and config, so Chroma treats a
+    collection opened with it exactly like one opened with `base`.
+    """
+    
+    def __init__(self, base, cache: Optional[EmbeddingCache] = None, namespace: Optional[str] = None):
+        self.base = base
+        self.cache = cache if cache is not None else EmbeddingCache()
+        if namespace is None:
+            name = getattr(base, "name", None)
+            namespace = name() if callable(name) else type(base).__name__
+        self.namespace = namespace
+    
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        keys = [text_key(text, self.namespace) for text in input]
+        vectors = self.cache.get_many(keys)
+        # Embed each distinct unseen text once, even if it repeats within the call.
+        first_seen: Dict[bytes, int] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                first_seen.setdefault(keys[i], i)
+        if first_seen:
+            order = list(first_seen.values())
+            computed = self.base([input[i] for i in order])
+            self.cache.put_many([keys[i] for i in order], computed)
+            by_key = {keys[i]: np.asarray(vector, dtype=np.float32) for i, vector in zip(order, computed)}
+            vectors = [by_key[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return vectors
+    
+    def embed_query(self, input: List[str]) -> List[np.ndarray]:
+        return self(input)
+    
+    def embed_documents(self, input: List[str]) -> List[np.ndarray]:
+        return self(input)
+    
+    def __getattr__(self, name):
+        # name(), get_config(), default_space(), is_legacy() ... come from the base function.
+        if name == "base":
+            raise AttributeError(name)
+        return getattr(self.base, name)
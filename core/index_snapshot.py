@@ -0,0 +1,467 @@
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from core.document_store import DocumentStore
+from core.embedding_cache import EmbeddingCache
+from core.keyword_index import KeywordIndex
+from core.lexical_index import LexicalIndex
+
+SNAPSHOT_VERSION = 1
+MANIFEST_FILENAME = "snapshot.json"
+EMBEDDINGS_FILENAME = "embeddings.bin"
+CHUNKS_FILENAME = "chunks.bin"
+DTYPES = {"float32": np.float32, "float16": np.float16}
+# Rows per block when scanning the embedding matrix, so float16 snapshots are widened a block at a time.
+SCAN_BLOCK_ROWS = 65536
+
+class ColumnWriter:
+    """Append 8-byte-aligned arrays to one file and remember where each column starts."""
+    
+    def __init__(self, f):
+        self.f = f
+        self.position = 0
+        self.columns: Dict[str, Dict] = {}
+    
+    def add(self, name: str, array: np.ndarray):
+        padding = -self.position % 8
+        if padding:
+            self.f.write(b"\0" * padding)
+            self.position += padding
+        array = np.ascontiguousarray(array)
+        self.f.write(array.tobytes())
+        self.columns[name] = {"offset": self.position, "dtype": array.dtype.str, "length": int(array.shape[0])}
+        self.position += array.nbytes
+    
+    def add_strings(self, name: str, values: List[bytes]):
+        """A string column: uint64 offsets (n + 1) into one UTF-8 blob."""
+        offsets = np.zeros(len(values) + 1, dtype=np.uint64)
+        if values:
+            offsets[1:] = np.cumsum([len(value) for value in values], dtype=np.uint64)
+        self.add(f"{name}.offsets", offsets)
+        self.add(f"{name}.data", np.frombuffer(b"".join(values), dtype=np.uint8))
+
+def _metadata_kind(values: List) -> str:
+    kinds = {type(value) for value in values if value is not None}
+    if not kinds:
+        return "json"
+    if kinds == {bool}:
+        return "bool"
+    if kinds == {int}:
+        return "int"
+    if kinds <= {int, float}:
+        return "float"
+    if kinds == {str}:
+        return "str"
+    return "json"
+
+def _write_metadata(writer: ColumnWriter, metadatas: List[Dict]) -> List[Dict]:
+    """One typed column per metadata key, with a presence mask where some rows lack the key."""
+    keys = list(dict.fromkeys(key for metadata in metadatas for key in (metadata or {})))
+    layout = []
+    for i, key in enumerate(keys):
+        values = [(metadata or {}).get(key) for metadata in metadatas]
+        present = np.array([value is not None for value in values], dtype=np.uint8)
+        kind = _metadata_kind(values)
+        name = f"meta{i}"
+        if kind == "bool":
+            writer.add(name, np.array([bool(value) for value in values], dtype=np.uint8))
+        elif kind == "int":
+            writer.add(name, np.array([value or 0 for value in values], dtype=np.int64))
+        elif kind == "float":
+            writer.add(name, np.array([value or 0.0 for value in values], dtype=np.float64))
+        elif kind == "str":
+            writer.add_strings(name, [(value or "").encode("utf-8") for value in values])
+        else:
+            writer.add_strings(name, [json.dumps(value).encode("utf-8") if value is not None else b"" for value in values])
+        nullable = not present.all()
+        if nullable:
+            writer.add(f"{name}.present", present)
+        layout.append({"key": key, "kind": kind, "column": name, "nullable": nullable})
+    return layout
+
+def _embedding_function_name(store: DocumentStore) -> Optional[str]:
+    try:
+        return store.embedding_function.name()
+    except Exception:
+        return None
+
+def export_snapshot(store: DocumentStore, path: str, dtype: str = "float32", batch_size: int = 1000) -> Dict:
+    """
+    Write every chunk of `store` to a snapshot directory at `path`: the
+    embedding matrix, the id table, the chunk text and metadata columns, and
+    copies of the keyword and BM25 indexes. The directory is written under a
+    temporary name and swapped in when complete. Returns the manifest.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported snapshot dtype: {dtype}")
+    path = os.path.abspath(path)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    
+    collection = store.collection
+    total = collection.count()
+    ids: List[bytes] = []
+    documents: List[bytes] = []
+    metadatas: List[Dict] = []
+    dim = 0
+    # The embeddings, the bulk of the data, are streamed to disk batch by batch.
+    with open(os.path.join(tmp_path, EMBEDDINGS_FILENAME), 'wb') as f:
+        for offset in range(0, total, batch_size):
+            batch = collection.get(limit=batch_size, offset=offset, include=["documents", "metadatas", "embeddings"])
+            if not batch['ids']:
+                break
+            matrix = np.asarray(batch['embeddings'], dtype=DTYPES[dtype])
+            dim = dim or matrix.shape[1]
+            f.write(np.ascontiguousarray(matrix).tobytes())
+            ids.extend(chunk_id.encode("utf-8") for chunk_id in batch['ids'])
+            documents.extend((document or "").encode("utf-8") for document in batch['documents'])
+            metadatas.extend(metadata or {} for metadata in batch['metadatas'])
+    
+    with open(os.path.join(tmp_path, CHUNKS_FILENAME), 'wb') as f:
+        writer = ColumnWriter(f)
+        writer.add_strings("ids", ids)
+        writer.add_strings("documents", documents)
+        metadata_layout = _write_metadata(writer, metadatas)
+    
+    for index_cls in (KeywordIndex, LexicalIndex):
+        index_path = index_cls.path_for(store.path, store.collection_name)
+        if os.path.exists(index_path):
+            shutil.copyfile(index_path, index_cls.path_for(tmp_path, store.collection_name))
+    
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "created": datetime.now().isoformat(),
+        "collection": store.collection_name,
+        "count": len(ids),
+        "dim": int(dim),
+        "dtype": dtype,
+        "space": "l2",
+        "embedding_function": _embedding_function_name(store),
+        "columns": writer.columns,
+        "metadata": metadata_layout
+    }
+    with open(os.path.join(tmp_path, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    
+    if os.path.exists(path):
+        old_path = f"{path}.old-{os.getpid()}"
+        os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    else:
+        os.replace(tmp_path, path)
+    return manifest
+
+class IndexSnapshot:
+    """Read-only, memory-mapped view of a snapshot directory; processes mapping the same files share the page cache."""
+    
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        with open(os.path.join(self.path, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {self.manifest.get('version')} in {self.path}")
+        self.count = self.manifest["count"]
+        self.dim = self.manifest["dim"]
+        self.dtype = DTYPES[self.manifest["dtype"]]
+        if self.count:
+            self.embeddings = np.memmap(os.path.join(self.path, EMBEDDINGS_FILENAME), dtype=self.dtype, mode='r',
+                                        shape=(self.count, self.dim))
+            self._chunks = np.memmap(os.path.join(self.path, CHUNKS_FILENAME), dtype=np.uint8, mode='r')
+        else:
+            self.embeddings = np.zeros((0, self.dim), dtype=self.dtype)
+            self._chunks = np.zeros(0, dtype=np.uint8)
+        self._metadata = [(entry["key"], entry["kind"], entry["column"], entry["nullable"]) for entry in self.manifest["metadata"]]
+        self._ids = None
+        self._rows: Optional[Dict[str, int]] = None
+        self._lock = threading.Lock()
+    
+    def column(self, name: str) -> np.ndarray:
+        spec = self.manifest["columns"][name]
+        dtype = np.dtype(spec["dtype"])
+        start = spec["offset"]
+        return self._chunks[start:start + spec["length"] * dtype.itemsize].view(dtype)
+    
+    def _string(self, name: str, i: int) -> str:
+        offsets = self.column(f"{name}.offsets")
+        data = self.column(f"{name}.data")
+        return bytes(data[int(offsets[i]):int(offsets[i + 1])]).decode("utf-8")
+    
+    def id(self, i: int) -> str:
+        return self._string("ids", i)
+    
+    @property
+    def ids(self) -> List[str]:
+        """The id table, decoded on first use."""
+        if self._ids is None:
+            self._ids = [self.id(i) for i in range(self.count)]
+        return self._ids
+    
+    def row(self, chunk_id: str) -> Optional[int]:
+        if self._rows is None:
+            with self._lock:
+                if self._rows is None:
+                    self._rows = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        return self._rows.get(chunk_id)
+    
+    def document(self, i: int) -> str:
+        return self._string("documents", i)
+    
+    def metadata(self, i: int) -> Dict:
+        metadata = {}
+        for key, kind, name, nullable in self._metadata:
+            if nullable and not self.column(f"{name}.present")[i]:
+                continue
+            if kind in ("str", "json"):
+                text = self._string(name, i)
+                metadata[key] = text if kind == "str" else json.loads(text)
+            elif kind == "bool":
+                metadata[key] = bool(self.column(name)[i])
+            elif kind == "int":
+                metadata[key] = int(self.column(name)[i])
+            else:
+                metadata[key] = float(self.column(name)[i])
+        return metadata
+    
+    def metadata_values(self, key: str) -> List:
+        """All values of one metadata key in row order (None where missing), for filtering."""
+        for entry_key, kind, name, nullable in self._metadata:
+            if entry_key != key:
+                continue
+            if kind in ("str", "json"):
+                values = [self._string(name, i) for i in range(self.count)]
+                if kind == "json":
+                    values = [json.loads(value) if value else None for value in values]
+            else:
+                values = self.column(name).tolist()
+                if kind == "bool":
+                    values = [bool(value) for value in values]
+            if nullable:
+                present = self.column(f"{name}.present")
+                values = [value if present[i] else None for i, value in enumerate(values)]
+            return values
+        return [None] * self.count
+    
+    def iter_batches(self, batch_size: int = 1000) -> Iterator[Tuple[List[str], List[str], List[Dict], np.ndarray]]:
+        """(ids, documents, metadatas, float32 embeddings) in row order."""
+        for start in range(0, self.count, batch_size):
+            rows = range(start, min(start + batch_size, self.count))
+            yield ([self.id(i) for i in rows], [self.document(i) for i in rows], [self.metadata(i) for i in rows],
+                   np.asarray(self.embeddings[rows.start:rows.stop], dtype=np.float32))
+
+def import_snapshot(path: str, store: DocumentStore, batch_size: int = 1000) -> int:
+    """
+    Bulk-load a snapshot into `store` with its stored embeddings (no
+    embedding work) and bring the store's keyword and BM25 indexes up to
+    date. Into an empty collection the snapshot's index copies are
+    installed as they are; into one that already holds chunks the imported
+    chunks are added to the existing indexes, so the chunks already there
+    keep their postings. Returns the number of chunks loaded.
+    """
+    snapshot = IndexSnapshot(path)
+    expected = snapshot.manifest.get("embedding_function")
+    actual = _embedding_function_name(store)
+    if expected and actual and expected != actual:
+        print(f"Warning: snapshot was embedded with '{expected}' but the store embeds queries with '{actual}'.")
+    
+    batch_size = min(batch_size, store.max_batch_size())
+    collection = store.collection
+    index_classes = (KeywordIndex, LexicalIndex)
+    merge = collection.count() > 0
+    indexes = [index_cls.load(index_cls.path_for(store.path, store.collection_name)) for index_cls in index_classes] if merge else []
+    loaded = 0
+    for ids, documents, metadatas, embeddings in snapshot.iter_batches(batch_size):
+        collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+        for index in indexes:
+            index.add_chunks(ids, documents, metadatas)
+        loaded += len(ids)
+    
+    if merge:
+        for index in indexes:
+            index.save()
+        return loaded
+    for index_cls in index_classes:
+        source = index_cls.path_for(snapshot.path, snapshot.manifest["collection"])
+        if os.path.exists(source):
+            shutil.copyfile(source, index_cls.path_for(store.path, store.collection_name))
+    return loaded
+
+def _source_mask(snapshot: IndexSnapshot, where: Optional[Dict]) -> Optional[np.ndarray]:
+    """Row mask for the metadata filters the pipeline uses: {key: value}, {key: {"$eq": v}} and {key: {"$in": [...]}}."""
+    if not where:
+        return None
+    mask = np.ones(snapshot.count, dtype=bool)
+    for key, condition in where.items():
+        if isinstance(condition, dict):
+            if set(condition) == {"$in"}:
+                allowed = set(condition["$in"])
+            elif set(condition) == {"$eq"}:
+                allowed = {condition["$eq"]}
+            else:
+                raise ValueError(f"Unsupported filter on snapshot store: {where}")
+        else:
+            allowed = {condition}
+        values = snapshot.metadata_values(key)
+        mask &= np.fromiter((value in allowed for value in values), dtype=bool, count=snapshot.count)
+    return mask
+
+class SnapshotCollection:
+    """
+    The read-only subset of the Chroma collection API over an IndexSnapshot.
+    Queries are exact brute-force squared-L2 searches over the memory-mapped
+    matrix, matching Chroma's default distance.
+    """
+    
+    def __init__(self, snapshot: IndexSnapshot, embedding_function):
+        self.snapshot = snapshot
+        self.embedding_function = embedding_function
+        self.name = snapshot.manifest["collection"]
+        self._norms: Optional[np.ndarray] = None
+        self._masks: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+    
+    @property
+    def norms(self) -> np.ndarray:
+        """Squared row norms, computed once per process in one pass over the matrix."""
+        if self._norms is None:
+            with self._lock:
+                if self._norms is None:
+                    norms = np.empty(self.snapshot.count, dtype=np.float32)
+                    for start in range(0, self.snapshot.count, SCAN_BLOCK_ROWS):
+                        block = np.asarray(self.snapshot.embeddings[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+                        norms[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+                    self._norms = norms
+        return self._norms
+    
+    def count(self) -> int:
+        return self.snapshot.count
+    
+    def _mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self._masks[key] = _source_mask(self.snapshot, where)
+        return mask
+    
+    def _rows_result(self, rows: List[int], include: List[str]) -> Dict:
+        snapshot = self.snapshot
+        result = {"ids": [snapshot.id(i) for i in rows], "included": include}
+        result["documents"] = [snapshot.document(i) for i in rows] if "documents" in include else None
+        result["metadatas"] = [snapshot.metadata(i) for i in rows] if "metadatas" in include else None
+        result["embeddings"] = (np.asarray(snapshot.embeddings[rows], dtype=np.float32) if rows else
+                                np.zeros((0, snapshot.dim), dtype=np.float32)) if "embeddings" in include else None
+        return result
+    
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, where: Optional[Dict] = None) -> Dict:
+        include = include if include is not None else ["documents", "metadatas"]
+        if ids is not None:
+            rows = [row for row in (self.snapshot.row(chunk_id) for chunk_id in ids) if row is not None]
+        else:
+            rows = list(range(self.snapshot.count))
+        mask = self._mask(where)
+        if mask is not None:
+            rows = [row for row in rows if mask[row]]
+        start = offset or 0
+        rows = rows[start:start + limit] if limit is not None else rows[start:]
+        return self._rows_result(rows, include)
+    
+    def query(self, query_embeddings: Optional[List] = None, query_texts: Optional[List[str]] = None, n_results: int = 10,
+              include: Optional[List[str]] = None, where: Optional[Dict] = None) -> Dict:
+        include = include if include is not None else ["documents", "metadatas", "distances"]
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        snapshot = self.snapshot
+        
+        # ||x - q||^2 = ||x||^2 + ||q||^2 - 2 x.q, one block of the mmap at a time.
+        distances = np.empty((snapshot.count, len(queries)), dtype=np.float32)
+        for start in range(0, snapshot.count, SCAN_BLOCK_ROWS):
+            block = np.asarray(snapshot.embeddings[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+            distances[start:start + len(block)] = block @ queries.T
+        distances *= -2.0
+        distances += self.norms[:, None]
+        distances += np.einsum("ij,ij->i", queries, queries)[None, :]
+        np.maximum(distances, 0.0, out=distances)
+        mask = self._mask(where)
+        if mask is not None:
+            distances[~mask] = np.inf
+        
+        result = {"ids": [], "distances": [], "documents": [], "metadatas": [], "embeddings": []}
+        for q in range(len(queries)):
+            column = distances[:, q]
+            k = min(n_results, int(np.isfinite(column).sum()))
+            top = np.argpartition(column, k - 1)[:k] if 0 < k < len(column) else np.arange(k)
+            rows = [int(row) for row in top[np.argsort(column[top], kind="stable")]]
+            part = self._rows_result(rows, include)
+            result["ids"].append(part["ids"])
+            result["distances"].append([float(column[row]) for row in rows])
+            for field in ("documents", "metadatas", "embeddings"):
+                result[field].append(part[field])
+        for field in ("distances", "documents", "metadatas", "embeddings"):
+            if field not in include:
+                result[field] = None
+        result["included"] = include
+        return result
+    
+    def _read_only(self, *args, **kwargs):
+        raise ValueError("Snapshot stores are read-only; import the snapshot into a DocumentStore to modify it.")
+    
+    upsert = add = update = delete = _read_only
+
+class SnapshotStore(DocumentStore):
+    """
+    Serve queries straight from a snapshot directory, read-only and without
+    Chroma. The matrix and columns are memory-mapped, so opening is nearly
+    instant and replicas on one machine share a single copy in the page
+    cache. The keyword and BM25 indexes shipped with the snapshot are used
+    for filtering and hybrid retrieval. Query embeddings are cached in
+    memory only, so the snapshot directory is never written.
+    """
+    
+    def __init__(self, path: str, embedding_function=None, query_cache_size: int = 256,
+                 embedding_cache: Optional[EmbeddingCache] = None):
+        snapshot_path = os.path.abspath(path)
+        with open(os.path.join(snapshot_path, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            collection_name = json.load(f)["collection"]
+        # The snapshot directory stands in for the Chroma directory, so the
+        # side-index lookups (KeywordIndex.path_for etc.) resolve to its copies.
+        super().__init__(snapshot_path, collection_name,
+                         embedding_function=embedding_function, query_cache_size=query_cache_size,
+                         embedding_cache=embedding_cache if embedding_cache is not None else EmbeddingCache())
+        self.snapshot_path = snapshot_path
+    
+    @property
+    def collection(self) -> SnapshotCollection:
+        if self._collection is None:
+            with self._lock:
+                if self._collection is None:
+                    self._collection = SnapshotCollection(IndexSnapshot(self.snapshot_path), self.embedding_function)
+        return self._collection
+    
+    def is_open(self) -> bool:
+        return self._collection is not None
+    
+    def _warmup(self):
+        """Map the snapshot, compute row norms and load the embedding model."""
+        try:
+            collection = self.collection
+            if collection.count() > 0:
+                collection.norms
+                self.embed_query("warmup")
+        except Exception as e:
+            print(f"Snapshot store warmup failed: {e}")
+    
+    def close(self):
+        with self._lock:
+            self._collection = None
+    
+    def max_batch_size(self) -> int:
+        return 5461
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+from core.persist import atomic_write_json, load_versioned_json, store_path
+
+MANIFEST_FILENAME = "ingest_manifest.json"
+
+def file_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_hash(text: str) -> str:
+    """Short content hash used to detect changed chunks."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+class IngestManifest:
+    """Record ingested files and chunk hashes so re-ingests only touch what changed."""
+    
+    VERSION = 1
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+    
+    @staticmethod
+    def path_for(db_path: str, collection_name: str) -> str:
+        return store_path(db_path, MANIFEST_FILENAME, collection_name)
+    
+    @classmethod
+    def load(cls, path: str) -> "IngestManifest":
+        """Load a manifest from disk, starting empty if it is missing or unreadable."""
+        manifest = cls(path)
+        data = load_versioned_json(path, cls.VERSION, "ingest manifest")
+        if data:
+            manifest.files = data.get("files", {})
+        return manifest
+    
+    def save(self):
+        """Write the manifest atomically."""
+        atomic_write_json(self.path, {"version": self.VERSION, "files": self.files}, ensure_ascii=False)
+    
+    def get_file(self, file_path: str) -> Optional[Dict]:
+        return self.files.get(os.path.abspath(file_path))
+    
+    def is_unchanged(self, file_path: str, stat: os.stat_result) -> bool:
+        """Cheap check: same size and modification time as last ingest."""
+        entry = self.get_file(file_path)
+        return bool(entry) and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+    
+    def set_file(self, file_path: str, source: str, stat: os.stat_result, content_hash: str, chunks: Dict[str, str]):
+        self.files[os.path.abspath(file_path)] = {
+            "source": source,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": content_hash,
+            "chunks": chunks
+        }
+    
+    def touch_file(self, file_path: str, stat: os.stat_result):
+        """Refresh size and mtime of a file whose content hash did not change."""
+        entry = self.get_file(file_path)
+        if entry:
+            entry["size"] = stat.st_size
+            entry["mtime_ns"] = stat.st_mtime_ns
+    
+    def remove_file(self, file_path: str) -> List[str]:
+        """Forget a file and return the chunk ids it owned."""
+        entry = self.files.pop(os.path.abspath(file_path), None)
+        return list(entry["chunks"]) if entry else []
+    
+    def files_in_folder(self, folder_path: str) -> List[str]:
+        """Manifest paths that live directly in a folder."""
+        folder = os.path.abspath(folder_path)
+        return [path for path in self.files if os.path.dirname(path) == folder]
+
+class FileUpdate:
+    """Diff one file's chunks against its previous manifest entry as they are queued."""
+    
+    def __init__(self, writer, previous_chunks: Optional[Dict[str, str]] = None, force: bool = False):
+        self.writer = writer
+        self.previous_chunks = previous_chunks or {}
+        self.force = force
+        self.chunks: Dict[str, str] = {}
+        self.changed = 0
+        self.unchanged = 0
+    
+    def add(self, chunk_id: str, document: str, metadata: Dict):
+        """Queue a chunk on the writer only if it is new or its content changed."""
+        digest = chunk_hash(document + "\x00" + json.dumps(metadata, sort_keys=True))
+        self.chunks[chunk_id] = digest
+        if not self.force and self.previous_chunks.get(chunk_id) == digest:
+            self.unchanged += 1
+            return
+        self.changed += 1
+        self.writer.add(chunk_id, document, metadata)
+    
+    def stale_ids(self) -> List[str]:
+        """Chunk ids from the previous revision that the new one no longer produces."""
+        return [chunk_id for chunk_id in self.previous_chunks if chunk_id not in self.chunks]
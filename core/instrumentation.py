@@ -0,0 +1,229 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, List, Optional
+
+class Trace:
+    """
+    Timings and counts for one turn. Spans may overlap and may be recorded
+    from other threads (e.g. speculative retrieval); each keeps its start
+    offset from the beginning of the turn.
+    """
+    
+    enabled = True
+    
+    def __init__(self, tracer: "Tracer", name: str, attributes: Optional[Dict] = None):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.timestamp = datetime.now().isoformat()
+        self.started = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.counters: Dict[str, float] = {}
+        self.metrics: Dict[str, float] = {}
+        self.finished = False
+    
+    @contextmanager
+    def span(self, name: str):
+        """Time the enclosed block as a named stage of the turn."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.spans.append({
+                "name": name,
+                "start_ms": (start - self.started) * 1000.0,
+                "duration_ms": (end - start) * 1000.0
+            })
+    
+    def count(self, name: str, value: float = 1):
+        """Add to a per-turn counter (candidates, characters, cache hits, ...)."""
+        self.counters[name] = self.counters.get(name, 0) + value
+    
+    def metric(self, name: str, value: float):
+        """Set a per-turn measurement such as time to first token."""
+        self.metrics[name] = value
+    
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+    
+    def finish(self):
+        """Close the turn and hand the record to the tracer's exporters."""
+        if self.finished:
+            return
+        self.finished = True
+        self.metric("total_ms", (time.perf_counter() - self.started) * 1000.0)
+        self.tracer.export(self.to_record())
+    
+    def to_record(self) -> Dict:
+        return {
+            "timestamp": self.timestamp,
+            "name": self.name,
+            "attributes": self.attributes,
+            "spans": self.spans,
+            "counters": self.counters,
+            "metrics": self.metrics
+        }
+
+class NullTrace:
+    """Stand-in used while tracing is disabled: every call is a no-op."""
+    
+    enabled = False
+    _span = nullcontext()
+    
+    def span(self, name: str):
+        return self._span
+    
+    def count(self, name: str, value: float = 1):
+        pass
+    
+    def metric(self, name: str, value: float):
+        pass
+    
+    def set(self, **attributes):
+        pass
+    
+    def finish(self):
+        pass
+
+NULL_TRACE = NullTrace()
+
+class Tracer:
+    """
+    Entry point for pipeline instrumentation. A disabled tracer (the
+    default) hands out NULL_TRACE, so the instrumented code pays one method
+    call per stage. Enabled, finished turns go to every exporter, which is
+    any object with an `export(record)` method.
+    """
+    
+    def __init__(self, exporters: Optional[List] = None, enabled: Optional[bool] = None):
+        self.exporters = list(exporters or [])
+        self.enabled = bool(self.exporters) if enabled is None else enabled
+    
+    def start(self, name: str = "turn", **attributes):
+        """Begin a trace, or return NULL_TRACE when disabled."""
+        if not self.enabled:
+            return NULL_TRACE
+        return Trace(self, name, attributes)
+    
+    def export(self, record: Dict):
+        for exporter in self.exporters:
+            try:
+                exporter.export(record)
+            except Exception as e:
+                print(f"Trace exporter {type(exporter).__name__} failed: {e}")
+    
+    def close(self):
+        for exporter in self.exporters:
+            close = getattr(exporter, "close", None)
+            if close is not None:
+                close()
+
+class JsonLinesExporter:
+    """Append each finished trace to a JSON-lines file."""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+    
+    def export(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+    
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class Histogram:
+    """Log-bucketed histogram (about 9% relative resolution) with exact count, sum, min and max."""
+    
+    GROWTH = 2 ** 0.125
+    
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+    
+    def add(self, value: float):
+        bucket = math.floor(math.log(value, self.GROWTH)) if value > 0 else -10 ** 6
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+    
+    def percentile(self, q: float) -> float:
+        """Upper edge of the bucket holding the q-th percentile, clamped to the observed range."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q / 100.0 * self.count))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                edge = self.GROWTH ** (bucket + 1) if bucket > -10 ** 6 else 0.0
+                return min(max(edge, self.min), self.max)
+        return self.max
+    
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "min": self.min if self.count else 0.0,
+            "max": self.max if self.count else 0.0
+        }
+
+class HistogramExporter:
+    """In-process latency and metric histograms over all exported traces, keyed by span or metric name."""
+    
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, float] = {}
+        self.traces = 0
+        self._lock = threading.Lock()
+    
+    def _add(self, name: str, value: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(value)
+    
+    def export(self, record: Dict):
+        with self._lock:
+            self.traces += 1
+            for span in record["spans"]:
+                self._add(f"span.{span['name']}_ms", span["duration_ms"])
+            for name, value in record["metrics"].items():
+                self._add(name, value)
+            for name, value in record["counters"].items():
+                self._add(f"count.{name}", value)
+                self.counters[name] = self.counters.get(name, 0) + value
+    
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """count / mean / p50 / p95 / p99 / min / max per histogram."""
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+    
+    def report(self) -> str:
+        """The summary as a fixed-width table."""
+        lines = [f"{'name':<32} {'count':>7} {'mean':>10} {'p50':>10} {'p95':>10} {'p99':>10} {'max':>10}"]
+        for name, stats in self.summary().items():
+            lines.append(f"{name:<32} {stats['count']:>7} {stats['mean']:>10.2f} {stats['p50']:>10.2f} "
+                         f"{stats['p95']:>10.2f} {stats['p99']:>10.2f} {stats['max']:>10.2f}")
+        return "\n".join(lines)
@@ -0,0 +1,114 @@
+import re
+from typing import Dict, Iterable, List, Optional, Set
+from core.persist import atomic_write_json, load_versioned_json, store_path
+from core.query_tokenizer import normalize_words, word_bigrams
+
+KEYWORD_INDEX_FILENAME = "keyword_index.json"
+
+class KeywordIndex:
+    """Inverted index from normalized word bigrams to chunk ids, built at ingest time."""
+    
+    # Version 2 only records bigrams that occur verbatim in the chunk text.
+    VERSION = 2
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.postings: Dict[str, Set[str]] = {}
+        self.chunk_terms: Dict[str, List[str]] = {}
+    
+    @staticmethod
+    def path_for(db_path: str, collection_name: str) -> str:
+        return store_path(db_path, KEYWORD_INDEX_FILENAME, collection_name)
+    
+    @classmethod
+    def load(cls, path: str) -> "KeywordIndex":
+        """Load an index from disk, starting empty if it is missing or unreadable."""
+        index = cls(path)
+        data = load_versioned_json(path, cls.VERSION, "keyword index")
+        if data:
+            for chunk_id, terms in data.get("chunks", {}).items():
+                index._add_terms(chunk_id, terms)
+        return index
+    
+    def save(self):
+        """Write the index atomically; postings are rebuilt from the per-chunk terms on load."""
+        atomic_write_json(self.path, {"version": self.VERSION, "chunks": self.chunk_terms}, ensure_ascii=False)
+    
+    @staticmethod
+    def terms_for(text: str) -> List[str]:
+        """
+        Distinct bigrams of a text, normalized the same way QueryTokenizer
+        normalizes queries, that also occur verbatim in the lowercased text.
+        Bigrams split by punctuation or a line break are left out, so a
+        posting is only ever a chunk the substring test would match too.
+        """
+        lowered = text.lower()
+        return [term for term in dict.fromkeys(word_bigrams(normalize_words(text))) if term in lowered]
+    
+    def _add_terms(self, chunk_id: str, terms: List[str]):
+        self.chunk_terms[chunk_id] = terms
+        for term in terms:
+            self.postings.setdefault(term, set()).add(chunk_id)
+    
+    def add_chunks(self, ids: List[str], documents: List[str], metadatas: Optional[List[Dict]] = None):
+        """Index (or re-index) chunks."""
+        self.remove_chunks([chunk_id for chunk_id in ids if chunk_id in self.chunk_terms])
+        for chunk_id, document in zip(ids, documents):
+            self._add_terms(chunk_id, self.terms_for(document))
+    
+    def remove_chunks(self, ids: Iterable[str]):
+        """Drop chunks from the index."""
+        for chunk_id in ids:
+            for term in self.chunk_terms.pop(chunk_id, []):
+                chunk_ids = self.postings.get(term)
+                if chunk_ids is not None:
+                    chunk_ids.discard(chunk_id)
+                    if not chunk_ids:
+                        del self.postings[term]
+    
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self.chunk_terms
+    
+    def __len__(self) -> int:
+        return len(self.chunk_terms)
+    
+    def has_term(self, term: str) -> bool:
+        return term in self.postings
+    
+    def chunks_with_any(self, terms: Iterable[str]) -> Set[str]:
+        """Ids of chunks containing at least one of the terms."""
+        matched: Set[str] = set()
+        for term in terms:
+            matched |= self.postings.get(term, set())
+        return matched
+
+class TermMatcher:
+    """
+    Decide which chunks contain any of a query's terms, as a substring of the
+    lowercased chunk text. The index only speeds up the positive case: terms
+    in its vocabulary are resolved once into the chunks that contain them as
+    a bigram, and every other chunk is checked with one compiled alternation
+    over all the terms, so a term that is a prefix of an indexed bigram
+    ("neural network" in "neural networks") still matches.
+    """
+    
+    def __init__(self, terms: List[str], index: Optional[KeywordIndex] = None):
+        self.index = index
+        terms = [term.lower() for term in terms]
+        if index is not None:
+            self.matched_ids = index.chunks_with_any(term for term in terms if index.has_term(term))
+        else:
+            self.matched_ids = set()
+        self.pattern = self._compile(terms)
+    
+    @staticmethod
+    def _compile(terms: List[str]):
+        if not terms:
+            return None
+        return re.compile("|".join(re.escape(term) for term in sorted(set(terms), key=len, reverse=True)))
+    
+    def matches(self, chunk_id: Optional[str], document: str) -> bool:
+        """Check whether a chunk contains any of the terms."""
+        if chunk_id is not None and chunk_id in self.matched_ids:
+            return True
+        return self.pattern is not None and self.pattern.search(document.lower()) is not None
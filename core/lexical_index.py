@@ -0,0 +1,109 @@
+import heapq
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from core.persist import atomic_write_json, load_versioned_json, store_path
+from core.query_tokenizer import normalize_words
+
+LEXICAL_INDEX_FILENAME = "lexical_index.json"
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from how i in is it its of on or
+that the this to was what when where which who why will with you your
+""".split())
+
+def lexical_terms(text: str) -> List[str]:
+    """Normalized unigrams with stopwords removed."""
+    return [word for word in normalize_words(text) if word not in STOPWORDS]
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several ranked id lists: score(id) = sum over lists of 1 / (k + rank)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class LexicalIndex:
+    """Persistent BM25 index over the same chunk ids as the Chroma collection."""
+    
+    VERSION = 1
+    
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths: Dict[str, int] = {}
+        self.doc_terms: Dict[str, Dict[str, int]] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.total_length = 0
+    
+    @staticmethod
+    def path_for(db_path: str, collection_name: str) -> str:
+        return store_path(db_path, LEXICAL_INDEX_FILENAME, collection_name)
+    
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        """Load an index from disk, starting empty if it is missing or unreadable."""
+        index = cls(path)
+        data = load_versioned_json(path, cls.VERSION, "lexical index")
+        if data:
+            for chunk_id, doc in data.get("docs", {}).items():
+                index._add_doc(chunk_id, doc["len"], doc["tf"])
+        return index
+    
+    def save(self):
+        """Write the index atomically; postings are rebuilt from per-chunk term counts on load."""
+        docs = {
+            chunk_id: {"len": self.doc_lengths[chunk_id], "tf": terms}
+            for chunk_id, terms in self.doc_terms.items()
+        }
+        atomic_write_json(self.path, {"version": self.VERSION, "docs": docs}, ensure_ascii=False)
+    
+    def _add_doc(self, chunk_id: str, length: int, term_counts: Dict[str, int]):
+        self.doc_lengths[chunk_id] = length
+        self.doc_terms[chunk_id] = term_counts
+        self.total_length += length
+        for term, count in term_counts.items():
+            self.postings.setdefault(term, {})[chunk_id] = count
+    
+    def add_chunks(self, ids: List[str], documents: List[str], metadatas: Optional[List[Dict]] = None):
+        """Index (or re-index) chunks."""
+        self.remove_chunks([chunk_id for chunk_id in ids if chunk_id in self.doc_terms])
+        for chunk_id, document in zip(ids, documents):
+            terms = lexical_terms(document)
+            self._add_doc(chunk_id, len(terms), dict(Counter(terms)))
+    
+    def remove_chunks(self, ids: Iterable[str]):
+        """Drop chunks from the index."""
+        for chunk_id in ids:
+            terms = self.doc_terms.pop(chunk_id, None)
+            if terms is None:
+                continue
+            self.total_length -= self.doc_lengths.pop(chunk_id)
+            for term in terms:
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(chunk_id, None)
+                    if not posting:
+                        del self.postings[term]
+    
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+    
+    def search(self, query: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        """Top chunk ids by BM25 score for the query."""
+        n_docs = len(self.doc_terms)
+        if n_docs == 0:
+            return []
+        avg_length = self.total_length / n_docs or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(lexical_terms(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1.0 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, tf in posting.items():
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[chunk_id] / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
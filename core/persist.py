@@ -0,0 +1,57 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+def sibling_path(db_path: str, name: str) -> str:
+    """Location of a file or directory kept next to a Chroma directory, shared by every store under the same parent."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), name)
+
+def store_path(db_path: str, name: str, collection_name: Optional[str] = None) -> str:
+    """
+    Location of a file that belongs to one Chroma directory: inside it, and
+    prefixed with the collection name when the file describes a single
+    collection. Stores under one parent directory, and collections in one
+    store, never share such files, and deleting the Chroma directory
+    deletes them too.
+    """
+    filename = f"{collection_name}.{name}" if collection_name else name
+    return os.path.join(os.path.abspath(db_path), filename)
+
+@contextmanager
+def atomic_open(path: str, mode: str = 'w'):
+    """
+    Open a temporary file beside `path` and move it into place on success, so
+    readers never see a partial file. The temporary name includes the pid and
+    thread id, so concurrent writers in other processes or threads do not
+    interleave.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, **({} if 'b' in mode else {"encoding": "utf-8"})) as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def atomic_write_json(path: str, data: Dict, **dump_kwargs):
+    """Write a JSON document atomically."""
+    with atomic_open(path) as f:
+        json.dump(data, f, **dump_kwargs)
+
+def load_versioned_json(path: str, version: int, description: str) -> Optional[Dict]:
+    """The JSON document at `path`, or None if it is missing, unreadable or of another version."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Ignoring unreadable {description} {path}: {e}")
+        return None
+    if not isinstance(data, dict) or data.get("version") != version:
+        return None
+    return data
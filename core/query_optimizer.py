@@ -1,11 +1,84 @@
+import hashlib
+import os
 from typing import Optional, List, Dict
+from core.cache import LRUCache
+from core.instrumentation import NULL_TRACE
+from core.persist import atomic_write_json, load_versioned_json
+from core.query_tokenizer import normalize_words
 from prompts.query_optimizer import QUERY_OPTIMIZER_PROMPT
 
+# History entries shown to the optimizer, and how much of each answer it sees.
+HISTORY_ENTRIES = 2
+ANSWER_CHARS = 250
+
+# Words that usually point back at an earlier turn ("give an example of it").
+FOLLOW_UP_MARKERS = frozenset("""
+it its this that these those they them their he she his her
+example examples more else also another again same above previous
+""".split())
+
+class OptimizerCache:
+    """LRU cache of optimized queries, optionally persisted to a JSON file."""
+    
+    VERSION = 2
+    
+    def __init__(self, max_entries: int = 1024, path: Optional[str] = None, autosave_every: int = 20):
+        self.path = path
+        self.autosave_every = autosave_every
+        self._entries = LRUCache(max_entries=max_entries)
+        self._unsaved = 0
+        if path and os.path.exists(path):
+            self.load()
+    
+    @staticmethod
+    def make_key(user_question: str, relevant_history: Optional[List[Dict]]) -> str:
+        """
+        Key on the normalized question plus a hash of the history text the
+        optimizer sees. Record ids restart in every session, so they would
+        match unrelated turns.
+        """
+        digest = hashlib.sha1()
+        for conv in (relevant_history or [])[:HISTORY_ENTRIES]:
+            for text in (conv.get("question", ""), conv.get("answer", "")[:ANSWER_CHARS]):
+                digest.update(text.encode("utf-8"))
+                digest.update(b"\0")
+        return " ".join(normalize_words(user_question)) + "|" + digest.hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        return self._entries.get(key)
+    
+    def put(self, key: str, optimized_query: str):
+        self._entries.put(key, optimized_query)
+        self._unsaved += 1
+        if self.path and self._unsaved >= self.autosave_every:
+            self.save()
+    
+    def load(self):
+        """Load persisted entries, ignoring an unreadable file or one from another version."""
+        data = load_versioned_json(self.path, self.VERSION, "optimizer cache")
+        for key, value in (data or {}).get("entries", []):
+            self._entries.put(key, value)
+    
+    def save(self):
+        """Write entries to disk in LRU order so reloading preserves recency."""
+        if not self.path:
+            return
+        entries = [[key, value] for key, value, _ in self._entries.items()]
+        atomic_write_json(self.path, {"version": self.VERSION, "entries": entries}, ensure_ascii=False)
+        self._unsaved = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
 class QueryOptimizer:
     """Optimize search queries using LLM with conversation history."""
     
-    def __init__(self, model):
+    def __init__(self, model, cache: Optional[OptimizerCache] = None, skip_self_contained: bool = True,
+                 min_self_contained_words: int = 6):
         self.model = model
+        self.cache = cache
+        self.skip_self_contained = skip_self_contained
+        self.min_self_contained_words = min_self_contained_words
     
     def _format_history_context(self, relevant_history: Optional[List[Dict]]) -> str:
         """Format conversation history for query optimization prompt."""
@@ -14,15 +87,49 @@ class QueryOptimizer:
         
         history_context = "\n## PREVIOUS CONVERSATION CONTEXT (MANDATORY TO USE)\n"
         history_context += "The current question is a FOLLOW-UP. You MUST use the context below.\n\n"
-        for i, conv in enumerate(relevant_history[:2], 1):
+        for i, conv in enumerate(relevant_history[:HISTORY_ENTRIES], 1):
             history_context += f"Previous Conversation {i}:\n"
             history_context += f"Question: {conv['question']}\n"
-            history_context += f"Answer summary: {conv['answer'][:250]}...\n\n"
+            history_context += f"Answer summary: {conv['answer'][:ANSWER_CHARS]}...\n\n"
         
         return history_context
     
-    def optimize(self, user_question: str, relevant_history: Optional[List[Dict]] = None) -> str:
+    def is_self_contained(self, user_question: str, relevant_history: Optional[List[Dict]] = None) -> bool:
+        """
+        Cheap check for questions the LLM rewrite would barely change: any
+        question without history, or a long question with no words that
+        refer back to earlier turns.
+        """
+        if not relevant_history:
+            return True
+        words = normalize_words(user_question)
+        if len(words) < self.min_self_contained_words:
+            return False
+        return not any(word in FOLLOW_UP_MARKERS for word in words)
+    
+    def optimize(self, user_question: str, relevant_history: Optional[List[Dict]] = None, trace=NULL_TRACE) -> str:
         """Generate optimized search query."""
+        if self.skip_self_contained and self.is_self_contained(user_question, relevant_history):
+            trace.count("optimizer_skipped")
+            return user_question.strip()
+        
+        cache_key = None
+        if self.cache is not None:
+            cache_key = OptimizerCache.make_key(user_question, relevant_history)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                trace.count("optimizer_cache_hits")
+                return cached
+        
+        with trace.span("optimize_llm"):
+            optimized_query = self._optimize_with_model(user_question, relevant_history)
+        
+        if cache_key is not None:
+            self.cache.put(cache_key, optimized_query)
+        return optimized_query
+    
+    def _optimize_with_model(self, user_question: str, relevant_history: Optional[List[Dict]]) -> str:
+        """Ask the LLM to rewrite the question into a search query."""
         history_context = self._format_history_context(relevant_history)
         
         query_prompt = QUERY_OPTIMIZER_PROMPT.format(
@@ -38,4 +145,3 @@ class QueryOptimizer:
             optimized_query = f"{prev_q} {user_question}"
         
         return optimized_query
-
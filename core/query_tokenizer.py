@@ -1,13 +1,25 @@
+import string
 from typing import List
 
+def normalize_words(text: str) -> List[str]:
+    """Lowercase, split on whitespace and strip surrounding punctuation."""
+    words = (word.strip(string.punctuation) for word in text.lower().split())
+    return [word for word in words if word]
+
+def word_bigrams(words: List[str]) -> List[str]:
+    """Adjacent word pairs joined by a single space."""
+    return [f"{words[i]} {words[i+1]}" for i in range(len(words) - 1)]
+
 class QueryTokenizer:
     """Extract key terms from queries for document filtering."""
     
     def extract_key_terms(self, query: str) -> List[str]:
-        """Extract 2-word phrases from query."""
-        query_lower = query.lower()
-        words = query_lower.split()
-        key_terms = [f"{words[i]} {words[i+1]}" for i in range(len(words) - 1) if len(f"{words[i]} {words[i+1]}") > 5]
+        """
+        Extract 2-word phrases from query. Words keep their punctuation
+        ("c++", "node.js?"): the terms are matched as substrings of the chunk
+        text, so stripping it would change which chunks the filter keeps.
+        """
+        key_terms = [term for term in word_bigrams(query.lower().split()) if len(term) > 5]
         return key_terms
     
     def extract_important_terms(self, key_terms: List[str]) -> List[str]:
@@ -0,0 +1,75 @@
+from typing import Dict, List, Optional
+import numpy as np
+
+def select_results(results: Dict, indices: List[int]) -> Dict:
+    """Subset of a single-query Chroma result, in the order of `indices`."""
+    selected = {}
+    for key in ("ids", "documents", "metadatas", "distances", "embeddings"):
+        values = results.get(key)
+        if values is None:
+            continue
+        values = values[0]
+        selected[key] = [[values[i] for i in indices]]
+    return selected
+
+class MMRReranker:
+    """
+    Diversity reranking of retrieved chunks with maximal marginal relevance.
+
+    Candidates farther than an adaptive cutoff from the best vector hit are
+    dropped first (`relative_cutoff` times the best distance, but never
+    tighter than `min_margin` above it). Chunks are then picked greedily by
+    lambda * relevance - (1 - lambda) * (max cosine similarity to the chunks
+    already picked), with at most `max_per_source` chunks per source file.
+    Relevance is 1 - distance / 2, the cosine similarity for Chroma's default
+    squared-L2 distance over unit-length embeddings.
+    """
+    
+    def __init__(self, lambda_mult: float = 0.7, max_results: int = 8, max_per_source: Optional[int] = 3,
+                 relative_cutoff: float = 1.3, min_margin: float = 0.1):
+        self.lambda_mult = lambda_mult
+        self.max_results = max_results
+        self.max_per_source = max_per_source
+        self.relative_cutoff = relative_cutoff
+        self.min_margin = min_margin
+    
+    def rerank(self, results: Dict) -> Dict:
+        """Select and order chunks of a single-query result (which must include embeddings)."""
+        ids = results['ids'][0] if results.get('ids') else []
+        if not ids:
+            return results
+        distances = np.asarray(results['distances'][0], dtype=np.float32)
+        # Hybrid results with no vector hits give their lexical-only chunks distance 0.0; those must not set the cutoff.
+        positive = distances[distances > 0]
+        best = float(positive.min()) if len(positive) else 0.0
+        cutoff = max(best * self.relative_cutoff, best + self.min_margin)
+        candidates = np.flatnonzero(distances <= cutoff)
+        
+        vectors = np.asarray(results['embeddings'][0], dtype=np.float32)[candidates]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms > 0, norms, 1.0)
+        similarity = vectors @ vectors.T
+        relevance = 1.0 - distances[candidates] / 2.0
+        
+        metadatas = results['metadatas'][0]
+        sources = [(metadatas[i] or {}).get("source") for i in candidates]
+        per_source: Dict[str, int] = {}
+        
+        blocked = np.zeros(len(candidates), dtype=bool)
+        max_similarity = np.zeros(len(candidates), dtype=np.float32)
+        picked: List[int] = []
+        while len(picked) < self.max_results and not blocked.all():
+            scores = self.lambda_mult * relevance - (1.0 - self.lambda_mult) * max_similarity
+            scores[blocked] = -np.inf
+            choice = int(np.argmax(scores))
+            picked.append(choice)
+            blocked[choice] = True
+            max_similarity = np.maximum(max_similarity, similarity[choice])
+            
+            source = sources[choice]
+            if self.max_per_source is not None and source is not None:
+                per_source[source] = per_source.get(source, 0) + 1
+                if per_source[source] >= self.max_per_source:
+                    blocked |= np.array([other == source for other in sources])
+        
+        return select_results(results, [int(candidates[i]) for i in picked])
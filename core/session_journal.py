@@ -0,0 +1,92 @@
+import base64
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from core.persist import atomic_open
+
+# (ids, documents, metadatas, embeddings)
+Records = Tuple[List[str], List[str], List[Dict], List[np.ndarray]]
+
+def encode_vector(vector) -> str:
+    """Compact text form of an embedding: base64 of its float32 bytes."""
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+def decode_vector(text: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(text), dtype=np.float32)
+
+class SessionJournal:
+    """
+    Append-only JSON-lines log of conversation records written after every turn.
+    Each line carries the record id, document, metadata and embedding, so a
+    restore needs no embedding work, or the ids of records that were removed.
+    A torn last line (crash mid-write) is skipped when replaying.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = 0
+    
+    def append(self, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings: List):
+        lines = [
+            json.dumps({"id": record_id, "document": document, "metadata": metadata, "embedding": encode_vector(embedding)},
+                       ensure_ascii=False)
+            for record_id, document, metadata, embedding in zip(ids, documents, metadatas, embeddings)
+        ]
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write("".join(line + "\n" for line in lines))
+            f.flush()
+        self.entries += len(lines)
+    
+    def remove(self, ids: List[str]):
+        """Log that records were dropped (e.g. compacted into a summary)."""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"removed": ids}, ensure_ascii=False) + "\n")
+            f.flush()
+        self.entries += 1
+    
+    def replay(self, records: Dict[str, Tuple[str, Dict, np.ndarray]]):
+        """Apply logged additions and removals, in write order, to id -> (document, metadata, embedding)."""
+        self.entries = 0
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    if "removed" in record:
+                        for record_id in record["removed"]:
+                            records.pop(record_id, None)
+                    else:
+                        records[record["id"]] = (record["document"], record["metadata"], decode_vector(record["embedding"]))
+                except Exception:
+                    continue
+                self.entries += 1
+    
+    def truncate(self):
+        """Drop logged records once a snapshot holds them."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.entries = 0
+
+def write_snapshot(path: str, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings: List):
+    """Write all records atomically as one .npz: an id array, a float32 matrix and the records as JSON."""
+    matrix = np.asarray(embeddings, dtype=np.float32) if embeddings else np.zeros((0, 0), dtype=np.float32)
+    records = json.dumps([{"document": document, "metadata": metadata} for document, metadata in zip(documents, metadatas)],
+                         ensure_ascii=False)
+    with atomic_open(path, 'wb') as f:
+        np.savez(f, version=np.array(1), ids=np.array(ids, dtype=str), embeddings=matrix, records=np.array(records))
+
+def read_snapshot(path: str) -> Optional[Records]:
+    """Load a snapshot written by write_snapshot, or None if it is missing or unreadable."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            ids = [str(record_id) for record_id in data["ids"]]
+            embeddings = list(data["embeddings"])
+            records = json.loads(str(data["records"]))
+    except Exception as e:
+        print(f"Ignoring unreadable session snapshot {path}: {e}")
+        return None
+    return ids, [record["document"] for record in records], [record["metadata"] for record in records], embeddings
@@ -1,15 +1,64 @@
 import json
 import os
+from functools import partial
 from typing import Optional, Dict, List
+from core.session_journal import SessionJournal, read_snapshot, write_snapshot
 from memory.conversation_memory import ConversationMemory
+from memory.vector_memory import VectorMemory
 from datetime import datetime
 
+# "chroma" keeps each session in an in-memory Chroma collection; the NumPy
+# backends keep it in a plain matrix (int8-quantized for "numpy-int8").
+MEMORY_BACKENDS = {
+    "chroma": ConversationMemory,
+    "numpy": VectorMemory,
+    "numpy-int8": partial(VectorMemory, quantize=True)
+}
+
+def create_memory(backend: str = "chroma", **kwargs) -> ConversationMemory:
+    """A conversation memory of the named backend, constructed with ConversationMemory's keyword arguments."""
+    if backend not in MEMORY_BACKENDS:
+        raise ValueError(f"Unknown memory backend '{backend}'; expected one of {', '.join(MEMORY_BACKENDS)}")
+    return MEMORY_BACKENDS[backend](**kwargs)
+
 class SessionManager:
     """Manage session serialization and deserialization."""
     
-    def __init__(self, session_file: str = "session.json"):
+    def __init__(self, session_file: str = "session.json", memory: Optional[ConversationMemory] = None,
+                 snapshot_every: int = 50, memory_backend: str = "chroma"):
         self.session_file = session_file
-        self.memory = ConversationMemory()
+        # Without an explicit memory, one of `memory_backend` is created with default settings.
+        self.memory = memory if memory is not None else create_memory(memory_backend)
+        # Every turn is appended to the journal; every `snapshot_every` turns the
+        # whole memory, embeddings included, is compacted into the snapshot.
+        base_path = os.path.splitext(session_file)[0]
+        self.snapshot_file = f"{base_path}.snapshot.npz"
+        self.journal = SessionJournal(f"{base_path}.journal.jsonl")
+        self.snapshot_every = snapshot_every
+        self.memory.listeners.append(self)
+    
+    def add_records(self, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings: List):
+        """Journal new turns as they are stored, compacting once the journal grows long."""
+        self._ensure_directory()
+        self.journal.append(ids, documents, metadatas, embeddings)
+        if self.journal.entries >= self.snapshot_every:
+            self.snapshot()
+    
+    def remove_records(self, ids: List[str]):
+        """Journal records the memory dropped, so a restore does not bring them back."""
+        self._ensure_directory()
+        self.journal.remove(ids)
+    
+    def snapshot(self):
+        """Write every stored record, with its embedding, to the snapshot and reset the journal."""
+        self._ensure_directory()
+        write_snapshot(self.snapshot_file, *self.memory.get_records())
+        self.journal.truncate()
+    
+    def _ensure_directory(self):
+        directory = os.path.dirname(self.session_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
     
     def save_session(self, conversations: List[Dict]):
         """Serialize conversation history to file."""
@@ -18,8 +67,10 @@ class SessionManager:
             "conversations": conversations
         }
         
+        self._ensure_directory()
         with open(self.session_file, 'w', encoding='utf-8') as f:
             json.dump(session_data, f, indent=2, ensure_ascii=False)
+        self.snapshot()
     
     def load_session(self) -> Optional[List[Dict]]:
         """Deserialize conversation history from file."""
@@ -34,7 +85,29 @@ class SessionManager:
             return None
     
     def restore_memory(self):
-        """Restore conversation memory from saved session."""
+        """
+        Restore conversation memory from the snapshot plus the journal, bulk
+        loading stored embeddings. Sessions saved before journaling existed
+        are restored from the session file by re-adding each turn.
+        """
+        records = {}
+        snapshot = read_snapshot(self.snapshot_file)
+        if snapshot:
+            for record_id, document, metadata, embedding in zip(*snapshot):
+                records[record_id] = (document, metadata, embedding)
+        # A crash between writing a snapshot and resetting the journal leaves
+        # records in both; replaying on top of the snapshot keeps the latest.
+        self.journal.replay(records)
+        if snapshot is not None or self.journal.entries:
+            ids = list(records)
+            self.memory.add_records(
+                ids,
+                [records[record_id][0] for record_id in ids],
+                [records[record_id][1] for record_id in ids],
+                [records[record_id][2] for record_id in ids]
+            )
+            return
+        
         conversations = self.load_session()
         if conversations:
             for conv in conversations:
@@ -51,4 +124,3 @@ class SessionManager:
     def get_memory(self) -> ConversationMemory:
         """Get the memory instance."""
         return self.memory
-
@@ -0,0 +1,202 @@
+import hashlib
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import chromadb
+from core.document_store import DocumentStore, DEFAULT_COLLECTION_NAME, DEFAULT_DB_PATH, source_filter
+import core.document_store as document_store
+from core.persist import atomic_write_json, load_versioned_json, store_path
+
+SHARDS_FILENAME = "shards.json"
+QUERY_FIELDS = ("ids", "documents", "metadatas", "distances", "embeddings")
+
+def shard_for_source(source: str, n_shards: int) -> int:
+    """Stable shard number for a source file, so all of its chunks live together."""
+    return int.from_bytes(hashlib.blake2b(source.encode("utf-8"), digest_size=8).digest(), "big") % n_shards
+
+class ShardConfig:
+    """Persisted shard layout of the collections in a Chroma directory, written inside it."""
+    
+    VERSION = 1
+    
+    def __init__(self, path: str, shards: Optional[Dict[str, int]] = None):
+        self.path = path
+        self.shards: Dict[str, int] = shards or {}
+    
+    @staticmethod
+    def path_for(db_path: str) -> str:
+        return store_path(db_path, SHARDS_FILENAME)
+    
+    @classmethod
+    def load(cls, path: str) -> "ShardConfig":
+        """Load the layout, starting empty (unsharded) if it is missing or unreadable."""
+        config = cls(path)
+        data = load_versioned_json(path, cls.VERSION, "shard config")
+        if data:
+            config.shards = {name: int(count) for name, count in data.get("collections", {}).items()}
+        return config
+    
+    def save(self):
+        """Write the layout atomically."""
+        atomic_write_json(self.path, {"version": self.VERSION, "collections": self.shards})
+    
+    def shard_count(self, collection_name: str) -> int:
+        return self.shards.get(collection_name, 1)
+
+class ShardedCollection:
+    """
+    The subset of the Chroma collection API the pipeline uses, spread over
+    several collections. Writes are routed by the chunk's `source` metadata;
+    queries fan out to the shards in a thread pool and the per-shard top-k
+    lists are merged by distance. Deletes by id go to every shard, since a
+    missing id is a no-op.
+    """
+    
+    def __init__(self, shards: List, embedding_function, executor: ThreadPoolExecutor):
+        self.shards = shards
+        self.embedding_function = embedding_function
+        self.executor = executor
+    
+    def _map(self, fn, shards=None) -> List:
+        shards = self.shards if shards is None else shards
+        if len(shards) == 1:
+            return [fn(shards[0])]
+        return list(self.executor.map(fn, shards))
+    
+    def shard_index(self, metadata: Optional[Dict], chunk_id: str) -> int:
+        source = (metadata or {}).get("source") or chunk_id
+        return shard_for_source(source, len(self.shards))
+    
+    def upsert(self, ids: List[str], documents: Optional[List[str]] = None, metadatas: Optional[List[Dict]] = None,
+               embeddings: Optional[List] = None):
+        groups: Dict[int, List[int]] = {}
+        for i, chunk_id in enumerate(ids):
+            groups.setdefault(self.shard_index(metadatas[i] if metadatas else None, chunk_id), []).append(i)
+        # Embed the whole batch in one call before splitting it.
+        if embeddings is None and documents is not None:
+            embeddings = self.embedding_function(documents)
+        
+        def write(item):
+            shard, positions = item
+            self.shards[shard].upsert(
+                ids=[ids[i] for i in positions],
+                documents=[documents[i] for i in positions] if documents is not None else None,
+                metadatas=[metadatas[i] for i in positions] if metadatas is not None else None,
+                embeddings=[embeddings[i] for i in positions] if embeddings is not None else None
+            )
+        
+        list(self.executor.map(write, groups.items()))
+    
+    def delete(self, ids: List[str]):
+        self._map(lambda shard: shard.delete(ids=ids))
+    
+    def count(self) -> int:
+        return sum(self._map(lambda shard: shard.count()))
+    
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, where: Optional[Dict] = None) -> Dict:
+        include = include or ["documents", "metadatas"]
+        if ids is not None:
+            parts = self._map(lambda shard: shard.get(ids=ids, include=include, where=where))
+        else:
+            # Page through the shards in order as if they were one collection.
+            parts = []
+            skip, remaining = offset or 0, limit
+            for shard in self.shards:
+                if remaining is not None and remaining <= 0:
+                    break
+                size = shard.count()
+                if skip >= size:
+                    skip -= size
+                    continue
+                part = shard.get(limit=remaining, offset=skip, include=include, where=where)
+                parts.append(part)
+                skip = 0
+                if remaining is not None:
+                    remaining -= len(part['ids'])
+        merged = {"ids": [chunk_id for part in parts for chunk_id in part['ids']]}
+        for field in include:
+            merged[field] = [value for part in parts for value in (part.get(field) if part.get(field) is not None else [])]
+        return merged
+    
+    def query(self, query_embeddings: Optional[List] = None, query_texts: Optional[List[str]] = None, n_results: int = 10,
+              include: Optional[List[str]] = None, where: Optional[Dict] = None, shard_indexes: Optional[List[int]] = None) -> Dict:
+        include = include if include is not None else ["documents", "metadatas", "distances"]
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        shard_include = list(dict.fromkeys(list(include) + ["distances"]))
+        shards = self.shards if shard_indexes is None else [self.shards[i] for i in sorted(set(shard_indexes))]
+        parts = self._map(lambda shard: shard.query(query_embeddings=query_embeddings, n_results=n_results,
+                                                    include=shard_include, where=where), shards)
+        
+        merged = {field: [] for field in ("ids",) + tuple(include)}
+        for q in range(len(query_embeddings)):
+            candidates = [
+                (part['distances'][q][i], p, i)
+                for p, part in enumerate(parts)
+                for i in range(len(part['ids'][q]))
+            ]
+            top = heapq.nsmallest(n_results, candidates)
+            for field in merged:
+                merged[field].append([parts[p][field][q][i] for _, p, i in top])
+        for field in QUERY_FIELDS:
+            merged.setdefault(field, None)
+        return merged
+
+class ShardedDocumentStore(DocumentStore):
+    """
+    DocumentStore over `n_shards` collections named `<collection>_shard<NN>`
+    in one Chroma directory. Each shard has its own HNSW index, so no single
+    index has to hold the whole corpus, and queries search the shards in
+    parallel. Passing `sources` to query() searches only the shards that
+    hold those files.
+    """
+    
+    def __init__(self, path: str = DEFAULT_DB_PATH, collection_name: str = DEFAULT_COLLECTION_NAME, n_shards: int = 4,
+                 embedding_function=None, query_cache_size: int = 256, embedding_cache=None):
+        super().__init__(path, collection_name, embedding_function=embedding_function, query_cache_size=query_cache_size,
+                         embedding_cache=embedding_cache)
+        self.n_shards = n_shards
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    def shard_name(self, shard: int) -> str:
+        return f"{self.collection_name}_shard{shard:02d}"
+    
+    def collection_names(self) -> List[str]:
+        return [self.shard_name(shard) for shard in range(self.n_shards)]
+    
+    @property
+    def collection(self) -> ShardedCollection:
+        """Open the store on first use and return the sharded collection facade."""
+        if self._collection is None or self._opened_generation != document_store._generation:
+            with self._lock:
+                if self._collection is None or self._opened_generation != document_store._generation:
+                    self._client = chromadb.PersistentClient(path=self.path)
+                    if self._executor is None:
+                        self._executor = ThreadPoolExecutor(max_workers=self.n_shards, thread_name_prefix="shard-query")
+                    shards = [
+                        self._client.get_or_create_collection(name=self.shard_name(shard), embedding_function=self.embedding_function)
+                        for shard in range(self.n_shards)
+                    ]
+                    self._collection = ShardedCollection(shards, self.embedding_function, self._executor)
+                    self._opened_generation = document_store._generation
+        return self._collection
+    
+    def close(self):
+        """Release the client and the fan-out threads; the next access reopens both."""
+        with self._lock:
+            super().close()
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+    
+    def query(self, query: str, n_results: int = 10, include: Optional[List[str]] = None,
+              sources: Optional[List[str]] = None) -> Dict:
+        """Search all shards, or only those holding `sources`, and merge the top results."""
+        return self.collection.query(
+            query_embeddings=[self.embed_query(query)],
+            n_results=n_results,
+            include=include or ["documents", "metadatas", "distances"],
+            where=source_filter(sources),
+            shard_indexes=[shard_for_source(source, self.n_shards) for source in sources] if sources else None
+        )
@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from core.document_processor import DocumentProcessor
+from core.instrumentation import NULL_TRACE
+from core.query_tokenizer import normalize_words
+
+def query_similarity(a: str, b: str) -> float:
+    """Jaccard similarity of the normalized word sets of two queries."""
+    words_a, words_b = set(normalize_words(a)), set(normalize_words(b))
+    if not words_a and not words_b:
+        return 1.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+def top_k_overlap(ids_a: List[str], ids_b: List[str], k: int) -> float:
+    """Fraction of the top-k ids two result lists share."""
+    top_a, top_b = set(ids_a[:k]), set(ids_b[:k])
+    if not top_a or not top_b:
+        return 0.0
+    return len(top_a & top_b) / min(len(top_a), len(top_b))
+
+class SpeculativeRetriever:
+    """
+    Overlap retrieval for the raw question with query optimization.
+    
+    Retrieval for the user's question starts in the background while the
+    optimizer runs. If the optimized query is near-identical, the speculative
+    result is used as is. Otherwise the optimized query is probed for ids and
+    distances only; if its top-k overlaps the speculative top-k enough, the
+    speculative result is reused, and if not, only the chunks the speculative
+    result lacks are fetched.
+    """
+    
+    def __init__(self, doc_processor: DocumentProcessor, similarity_threshold: float = 0.8,
+                 overlap_threshold: float = 0.6, overlap_k: int = 5, executor: Optional[ThreadPoolExecutor] = None):
+        self.doc_processor = doc_processor
+        self.similarity_threshold = similarity_threshold
+        self.overlap_threshold = overlap_threshold
+        self.overlap_k = overlap_k
+        self.executor = executor or ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculative-retrieval")
+        self.reused = 0
+        self.probed = 0
+    
+    def retrieve(self, user_question: str, optimize: Callable[[], str], trace=NULL_TRACE) -> Tuple[str, Dict]:
+        """
+        Run `optimize` while retrieving for the raw question; return
+        (optimized_query, results). The speculative search is traced as
+        "retrieve" from the worker thread, so it overlaps the "optimize"
+        span; the probe for a rewritten query is traced as "retrieve_probe".
+        """
+        def speculate():
+            with trace.span("retrieve"):
+                return self.doc_processor.retrieve_documents(user_question)
+        
+        speculative_future = self.executor.submit(speculate)
+        try:
+            optimized_query = optimize()
+        except BaseException:
+            speculative_future.cancel()
+            raise
+        speculative = speculative_future.result()
+        
+        if query_similarity(user_question, optimized_query) >= self.similarity_threshold:
+            self.reused += 1
+            return optimized_query, speculative
+        
+        self.probed += 1
+        with trace.span("retrieve_probe"):
+            return optimized_query, self._retrieve_reusing(optimized_query, speculative)
+    
+    def _retrieve_reusing(self, optimized_query: str, speculative: Dict) -> Dict:
+        """Retrieve for the optimized query, reusing chunks already fetched speculatively."""
+        processor = self.doc_processor
+        probe = processor.store.query(optimized_query, n_results=processor.n_results, include=["distances"])
+        probe_ids = probe['ids'][0] if probe.get('ids') else []
+        speculative_ids = speculative['ids'][0] if speculative.get('ids') else []
+        
+        if top_k_overlap(probe_ids, speculative_ids, self.overlap_k) >= self.overlap_threshold:
+            self.reused += 1
+            return speculative
+        
+        known = {
+            chunk_id: (doc, metadata)
+            for chunk_id, doc, metadata in zip(speculative_ids, speculative['documents'][0], speculative['metadatas'][0])
+        }
+        missing = [chunk_id for chunk_id in probe_ids if chunk_id not in known]
+        if missing:
+            fetched = processor.store.get(missing)
+            for chunk_id, doc, metadata in zip(fetched['ids'], fetched['documents'], fetched['metadatas']):
+                known[chunk_id] = (doc, metadata)
+        
+        pairs = [(chunk_id, distance) for chunk_id, distance in zip(probe_ids, probe['distances'][0]) if chunk_id in known]
+        results = {
+            'ids': [[chunk_id for chunk_id, _ in pairs]],
+            'documents': [[known[chunk_id][0] for chunk_id, _ in pairs]],
+            'metadatas': [[known[chunk_id][1] for chunk_id, _ in pairs]],
+            'distances': [[distance for _, distance in pairs]]
+        }
+        if processor.retrieval_mode == "hybrid" and processor.lexical_index is not None:
+            results = processor.fuse_lexical(optimized_query, results)
+        return results
+    
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,170 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+from core.answer_cache import AnswerCache
+from core.chat_models import ConcurrencyLimitedModel
+from core.chunker import estimate_tokens
+from core.context_packer import ContextPacker
+from core.document_processor import DocumentProcessor
+from core.document_store import DocumentStore, get_document_store
+from core.instrumentation import NULL_TRACE, Tracer
+from core.prompt_formatter import PromptFormatter
+from core.query_optimizer import OptimizerCache, QueryOptimizer
+from core.query_tokenizer import QueryTokenizer
+from core.reranker import MMRReranker
+from core.speculative_retriever import SpeculativeRetriever
+from memory.conversation_memory import ConversationMemory
+
+class TutorPipeline:
+    """
+    The question → answer pipeline, shared by every session in a process.
+
+    Everything here is session-independent (model client, document store,
+    retrieval, caches); the caller passes the session's ConversationMemory
+    into each turn.
+    """
+    
+    def __init__(self, model, document_store: Optional[DocumentStore] = None,
+                 doc_processor: Optional[DocumentProcessor] = None, optimizer_cache: Optional[OptimizerCache] = None,
+                 answer_cache: Optional[AnswerCache] = None, max_concurrent_generations: Optional[int] = None,
+                 retrieval_workers: int = 2, verbose: bool = True, tracer: Optional[Tracer] = None):
+        if max_concurrent_generations:
+            model = ConcurrencyLimitedModel(model, max_concurrent=max_concurrent_generations)
+        self.model = model
+        self.document_store = document_store or get_document_store()
+        # Leave most of num_ctx for the template, history and the answer itself.
+        self.doc_processor = doc_processor or DocumentProcessor(
+            n_results=20,
+            distance_threshold=1.5,
+            store=self.document_store,
+            context_packer=ContextPacker(token_budget=8000),
+            reranker=MMRReranker(max_results=8, max_per_source=3)
+        )
+        self.query_optimizer = QueryOptimizer(model, cache=optimizer_cache if optimizer_cache is not None else OptimizerCache())
+        self.tokenizer = QueryTokenizer()
+        self.prompt_formatter = PromptFormatter()
+        self.speculative_retriever = SpeculativeRetriever(
+            self.doc_processor,
+            executor=ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix="speculative-retrieval")
+        )
+        if answer_cache is None:
+            answer_cache = AnswerCache(similarity_threshold=0.95, max_entries=512, ttl=24 * 3600)
+        self.answer_cache = answer_cache
+        self.verbose = verbose
+        # Disabled unless the caller passes a tracer with exporters.
+        self.tracer = tracer if tracer is not None else Tracer()
+    
+    def relevant_history(self, memory: ConversationMemory, user_question: str, trace=NULL_TRACE) -> List[Dict]:
+        """Get relevant conversation history with fallback."""
+        with trace.span("history"):
+            relevant_history = memory.get_relevant_history(user_question, n_results=3)
+            
+            if relevant_history:
+                relevant_history = [conv for conv in relevant_history if conv['distance'] < 1.2]
+            
+            if not relevant_history:
+                relevant_history = memory.get_recent_history(2)
+        
+        trace.count("history_turns", len(relevant_history))
+        return relevant_history
+    
+    def stream_answer(self, memory: ConversationMemory, user_question: str, relevant_history=None,
+                      pipelined: bool = True, stream: bool = True, debug_prompt: bool = False, trace=None) -> Iterator[str]:
+        """
+        Run the pipeline for one question and yield the answer text as it is
+        generated. Pass the trace from `tracer.start()` to include the history
+        lookup; otherwise the turn gets its own. The trace is finished when
+        the turn ends.
+        """
+        if trace is None:
+            trace = self.tracer.start()
+        try:
+            yield from self._stream_answer(memory, user_question, relevant_history, pipelined, stream, debug_prompt, trace)
+        except BaseException as e:
+            trace.set(error=type(e).__name__)
+            raise
+        finally:
+            trace.finish()
+    
+    def _stream_answer(self, memory, user_question, relevant_history, pipelined, stream, debug_prompt, trace):
+        def optimize():
+            with trace.span("optimize"):
+                return self.query_optimizer.optimize(user_question, relevant_history, trace=trace)
+        
+        with trace.span("optimize_retrieve"):
+            if pipelined:
+                # Retrieval for the raw question runs while the optimizer is waiting on the LLM.
+                optimized_query, results = self.speculative_retriever.retrieve(user_question, optimize, trace=trace)
+            else:
+                optimized_query = optimize()
+                with trace.span("retrieve"):
+                    results = self.doc_processor.retrieve_documents(optimized_query)
+        if self.verbose:
+            print(f"\n[Optimized Query]: {optimized_query}")
+        trace.count("candidates_retrieved", len(results['ids'][0]) if results.get('ids') else 0)
+        
+        with trace.span("tokenize"):
+            key_terms, important_terms = self.tokenizer.tokenize(optimized_query)
+        documents_text = self.doc_processor.process_results(results, important_terms, key_terms, trace=trace)
+        
+        with trace.span("answer_cache"):
+            fingerprint = AnswerCache.fingerprint(results)
+            query_embedding = self.document_store.embed_query(optimized_query)
+            answer = self.answer_cache.lookup(query_embedding, fingerprint)
+        
+        if answer is None:
+            with trace.span("prompt"):
+                dynamic_prompt = self.prompt_formatter.format(user_question, documents_text, relevant_history)
+            trace.count("prompt_chars", len(dynamic_prompt))
+            trace.count("prompt_tokens", estimate_tokens(dynamic_prompt))
+            if debug_prompt:
+                print("\n" + "=" * 70)
+                print("OPTIMIZED PROMPT SENT TO MODEL")
+                print("=" * 70)
+                print(dynamic_prompt)
+                print("=" * 70 + "\n")
+            
+            generation_start = time.perf_counter()
+            with trace.span("generate"):
+                if stream:
+                    parts = []
+                    for chunk in self.model.stream(dynamic_prompt):
+                        if chunk.content:
+                            if not parts:
+                                trace.metric("llm_ttft_ms", (time.perf_counter() - generation_start) * 1000.0)
+                            parts.append(chunk.content)
+                            yield chunk.content
+                    answer = "".join(parts)
+                else:
+                    answer = self.model.invoke(dynamic_prompt).content
+                    trace.metric("llm_ttft_ms", (time.perf_counter() - generation_start) * 1000.0)
+                    yield answer
+            if trace.enabled:
+                # Wall time includes time the consumer spent between pieces.
+                elapsed = time.perf_counter() - generation_start
+                answer_tokens = estimate_tokens(answer)
+                trace.count("answer_tokens", answer_tokens)
+                trace.metric("llm_tokens_per_s", answer_tokens / elapsed if elapsed > 0 else 0.0)
+            self.answer_cache.store(query_embedding, fingerprint, answer, results.get('ids', [[]])[0])
+        else:
+            trace.count("answer_cache_hits")
+            if self.verbose:
+                print("\n[Answer served from cache]")
+            yield answer
+        
+        with trace.span("memory_write"):
+            memory.add_conversation(
+                question=user_question,
+                answer=answer,
+                metadata={"retrieved_docs_count": len(results.get('documents', [{}])[0]) if results else 0}
+            )
+    
+    def answer(self, memory: ConversationMemory, user_question: str, relevant_history=None, **kwargs) -> str:
+        """Run one turn to completion and return the full answer."""
+        return "".join(self.stream_answer(memory, user_question, relevant_history, **kwargs))
+    
+    def close(self):
+        """Stop the retrieval threads, persist the optimizer cache and flush trace exporters."""
+        self.speculative_retriever.close()
+        self.query_optimizer.cache.save()
+        self.tracer.close()
@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Set
+import chromadb
+from core.session_manager import SessionManager, create_memory
+from core.tutor_pipeline import TutorPipeline
+
+_DONE = object()
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+def session_slug(session_id: str) -> str:
+    """File- and collection-safe name for a session id, unique even after sanitizing."""
+    readable = re.sub(r"[^A-Za-z0-9_-]", "_", session_id)[:48]
+    return f"{readable}-{hashlib.sha1(session_id.encode('utf-8')).hexdigest()[:8]}"
+
+class TutorSession:
+    """Per-session state: its own memory and session file, one turn at a time."""
+    
+    def __init__(self, session_id: str, session_manager: SessionManager):
+        self.session_id = session_id
+        self.session_manager = session_manager
+        self.memory = session_manager.get_memory()
+        self.lock = asyncio.Lock()
+        self.turns = 0
+        self.last_active = time.time()
+        # Set under the lock once the session is saved and its memory dropped.
+        self.closed = False
+
+class TutorService:
+    """
+    Serve many concurrent tutor sessions from one process.
+
+    Every session gets an isolated conversation memory (of `memory_backend`)
+    and session file, while the document store, embedding function, caches and LLM client
+    live once in the shared TutorPipeline. Turns run in a thread pool so the
+    event loop stays free; turns of the same session are serialized, and the
+    number of generations in flight across sessions is bounded by the
+    pipeline's `max_concurrent_generations`.
+    """
+    
+    def __init__(self, pipeline: TutorPipeline, session_dir: str = "sessions", max_workers: int = 32,
+                 pipelined: bool = True, memory_client=None, memory_max_turns: Optional[int] = 200,
+                 memory_backend: str = "chroma"):
+        self.pipeline = pipeline
+        self.session_dir = session_dir
+        self.pipelined = pipelined
+        # Only the Chroma backend needs a client; the NumPy backends hold each session in plain arrays.
+        self.memory_backend = memory_backend
+        self.memory_client = memory_client or (chromadb.Client() if memory_backend == "chroma" else None)
+        self.memory_max_turns = memory_max_turns
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tutor-session")
+        self.sessions: Dict[str, TutorSession] = {}
+        self._turns: Set[asyncio.Task] = set()
+        self._opening: Dict[str, asyncio.Future] = {}
+        self._closing: Dict[str, asyncio.Future] = {}
+    
+    def session_file(self, session_id: str) -> str:
+        return os.path.join(self.session_dir, f"{session_slug(session_id)}.json")
+    
+    def _open_session(self, session_id: str) -> TutorSession:
+        memory = create_memory(
+            self.memory_backend,
+            collection_name=f"memory-{session_slug(session_id)}",
+            client=self.memory_client,
+            embedding_function=self.pipeline.document_store.embedding_function,
+            max_turns=self.memory_max_turns,
+            session_id=session_id
+        )
+        session_manager = SessionManager(session_file=self.session_file(session_id), memory=memory)
+        session_manager.restore_memory()
+        return TutorSession(session_id, session_manager)
+    
+    async def get_session(self, session_id: str) -> TutorSession:
+        """Return an open session, restoring it from its session file on first use."""
+        # A session being closed is restored again only once it is saved.
+        while session_id in self._closing:
+            await asyncio.shield(self._closing[session_id])
+        session = self.sessions.get(session_id)
+        if session is not None:
+            return session
+        # Concurrent first requests for one session share a single restore.
+        opening = self._opening.get(session_id)
+        if opening is not None:
+            return await opening
+        loop = asyncio.get_running_loop()
+        opening = loop.run_in_executor(self.executor, self._open_session, session_id)
+        self._opening[session_id] = opening
+        try:
+            session = await opening
+            self.sessions[session_id] = session
+        finally:
+            self._opening.pop(session_id, None)
+        return session
+    
+    def _run_turn(self, session: TutorSession, user_question: str, emit):
+        trace = self.pipeline.tracer.start(session_id=session.session_id)
+        relevant_history = self.pipeline.relevant_history(session.memory, user_question, trace=trace)
+        for piece in self.pipeline.stream_answer(session.memory, user_question, relevant_history, pipelined=self.pipelined,
+                                                 trace=trace):
+            emit(piece)
+    
+    async def _locked_turn(self, session: TutorSession, user_question: str, emit):
+        """
+        Run one turn while holding the session lock. The lock is released
+        only once the turn has finished in the executor, even if the caller
+        stopped listening, so turns of a session never overlap and an idle
+        check never closes a session under a running turn.
+        """
+        loop = asyncio.get_running_loop()
+        
+        def produce() -> bool:
+            try:
+                self._run_turn(session, user_question, emit)
+                return True
+            except BaseException as e:
+                emit(_Failure(e))
+                return False
+            finally:
+                emit(_DONE)
+        
+        try:
+            while True:
+                async with session.lock:
+                    if not session.closed:
+                        if await loop.run_in_executor(self.executor, produce):
+                            session.turns += 1
+                        session.last_active = time.time()
+                        return
+                # Closed while this turn waited for the lock; continue on the restored session.
+                session = await self.get_session(session.session_id)
+        except Exception as e:
+            # The turn never started, e.g. the executor was shut down.
+            emit(_Failure(e))
+            emit(_DONE)
+    
+    async def stream(self, session_id: str, user_question: str) -> AsyncIterator[str]:
+        """
+        Answer a question for a session, yielding the answer as it is generated.
+        A turn that is abandoned midway still finishes in the background so its
+        Q&A is recorded in the session's memory, and the session's next turn
+        waits for it.
+        """
+        session = await self.get_session(session_id)
+        # Marked active before the turn is queued, so an idle check does not close it meanwhile.
+        session.last_active = time.time()
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        def emit(item):
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        
+        turn = loop.create_task(self._locked_turn(session, user_question, emit))
+        self._turns.add(turn)
+        turn.add_done_callback(self._turns.discard)
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+        # Shielded: cancelling the caller must not cancel the turn that holds the lock.
+        await asyncio.shield(turn)
+    
+    async def ask(self, session_id: str, user_question: str) -> str:
+        """Answer a question for a session and return the full answer."""
+        parts: List[str] = []
+        async for piece in self.stream(session_id, user_question):
+            parts.append(piece)
+        return "".join(parts)
+    
+    async def close_session(self, session_id: str, save: bool = True):
+        """
+        Save a session's history to its session file and release its memory,
+        after the turns already waiting for it. The session stays registered
+        until then, and get_session() waits for the save instead of restoring
+        a second copy from an outdated file.
+        """
+        closing = self._closing.get(session_id)
+        if closing is not None:
+            await asyncio.shield(closing)
+            return
+        session = self.sessions.get(session_id)
+        if session is None:
+            return
+        loop = asyncio.get_running_loop()
+        closing = loop.create_future()
+        self._closing[session_id] = closing
+        try:
+            async with session.lock:
+                self.sessions.pop(session_id, None)
+                session.closed = True
+                await loop.run_in_executor(self.executor, self._close_session, session, save)
+        finally:
+            del self._closing[session_id]
+            closing.set_result(None)
+    
+    def _close_session(self, session: TutorSession, save: bool):
+        if save:
+            os.makedirs(self.session_dir, exist_ok=True)
+            session.session_manager.save_session(session.session_manager.get_all_conversations())
+        session.memory.drop()
+    
+    async def close_idle_sessions(self, max_idle: float) -> List[str]:
+        """Close sessions that have not had a turn for `max_idle` seconds."""
+        now = time.time()
+        idle = [
+            session_id for session_id, session in self.sessions.items()
+            if now - session.last_active > max_idle and not session.lock.locked()
+        ]
+        for session_id in idle:
+            await self.close_session(session_id)
+        return idle
+    
+    async def close(self):
+        """Close every session and shut down the shared pipeline."""
+        # Abandoned turns may outlive their session's close and reopen it, so repeat until both are gone.
+        while self.sessions or any(not turn.done() for turn in self._turns):
+            for session_id in list(self.sessions):
+                await self.close_session(session_id)
+            await asyncio.gather(*self._turns, return_exceptions=True)
+        self.executor.shutdown(wait=True)
+        self.pipeline.close()
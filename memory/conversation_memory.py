@@ -1,71 +1,247 @@
+import bisect
+import threading
 import chromadb
+from chromadb.utils import embedding_functions
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
+
+RECORD_FIELDS = ["question", "answer", "timestamp", "seq", "session_id"]
+
+def to_conversation(metadata: Dict, record_id: Optional[str] = None) -> Dict:
+    """Conversation dict (id, seq, question, answer, timestamp, extra metadata) from a stored record's metadata."""
+    return {
+        "id": record_id,
+        "seq": metadata.get("seq"),
+        "question": metadata.get("question", ""),
+        "answer": metadata.get("answer", ""),
+        "timestamp": metadata.get("timestamp", ""),
+        "metadata": {k: v for k, v in metadata.items() if k not in RECORD_FIELDS}
+    }
+
+def conversation_document(question: str, answer: str) -> str:
+    """The embedded text of a turn."""
+    return f"Question: {question}\nAnswer: {answer}"
+
+def summary_document(summary: str) -> str:
+    """The embedded text of a summary record."""
+    return f"Summary of earlier conversation:\n{summary}"
+
+def summarize_conversations(conversations: List[Dict], max_chars: int = 1500) -> str:
+    """Extractive summary: one line per turn with the question and the start of its answer."""
+    lines = []
+    for conv in conversations:
+        if conv["metadata"].get("summary"):
+            lines.append(conv["answer"])
+        else:
+            answer = " ".join(conv["answer"].split())
+            lines.append(f"- {conv['question']} → {answer[:160]}")
+    lines = "\n".join(lines).split("\n")
+    # Keep the most recent lines when older summaries have piled up.
+    size = sum(len(line) + 1 for line in lines)
+    while len(lines) > 1 and size > max_chars:
+        size -= len(lines.pop(0)) + 1
+    return "\n".join(lines)[-max_chars:]
 
 class ConversationMemory:
     """Store and retrieve conversation history using in-memory ChromaDB."""
     
-    def __init__(self, collection_name: str = "conversation_memory"):
-        self.client = chromadb.Client()
-        self.collection = self.client.get_or_create_collection(name=collection_name)
+    def __init__(self, collection_name: str = "conversation_memory", client=None, embedding_function=None,
+                 max_turns: Optional[int] = None, max_bytes: Optional[int] = None, compact_batch: int = 10,
+                 summarizer: Optional[Callable[[List[Dict]], str]] = None, session_id: str = "default"):
+        # Sessions served from one process pass a shared client and embedding function.
+        if embedding_function is None:
+            embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        self.embedding_function = embedding_function
+        self.client = None
+        self.collection = self._open_collection(collection_name, client)
+        self.session_id = session_id
+        # Notified with add_records(ids, documents, metadatas, embeddings) and
+        # remove_records(ids) whenever the stored records change.
+        self.listeners = []
+        # Bounded mode: beyond max_turns records or max_bytes of text, the oldest
+        # `compact_batch` records are rolled into one summary record.
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.compact_batch = max(2, compact_batch)
+        self.summarizer = summarizer or summarize_conversations
+        # Sequence index: sorted seqs plus seq -> (record id, metadata, document size).
+        self._seqs: List[int] = []
+        self._records: Dict[int, Tuple[str, Dict, int]] = {}
+        self.next_seq = 1
+        self.total_bytes = 0
+        self._lock = threading.RLock()
+    
+    def _open_collection(self, collection_name: str, client):
+        self.client = client or chromadb.Client()
+        return self.client.get_or_create_collection(name=collection_name, embedding_function=self.embedding_function)
+    
+    def _write(self, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings: List):
+        """Upsert records with precomputed embeddings into the backing store."""
+        self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+    
+    def _delete(self, ids: List[str]):
+        self.collection.delete(ids=ids)
+    
+    def record_id(self, seq: int) -> str:
+        """Chroma id of a turn: unique per session and ordered by sequence."""
+        return f"{self.session_id}:{seq:08d}"
+    
+    def _index(self, seq: int, record_id: str, document: str, metadata: Dict):
+        size = len(document.encode("utf-8"))
+        if seq in self._records:
+            self.total_bytes -= self._records[seq][2]
+        else:
+            bisect.insort(self._seqs, seq)
+        self._records[seq] = (record_id, metadata, size)
+        self.total_bytes += size
+        self.next_seq = max(self.next_seq, seq + 1)
+    
+    def _unindex(self, seqs: List[int]):
+        for seq in seqs:
+            record = self._records.pop(seq, None)
+            if record is not None:
+                self.total_bytes -= record[2]
+        removed = set(seqs)
+        self._seqs = [seq for seq in self._seqs if seq not in removed]
     
     def add_conversation(self, question: str, answer: str, metadata: Optional[Dict] = None):
         """Store a Q&A pair in memory."""
         timestamp = datetime.now().isoformat()
-        combined_text = f"Question: {question}\nAnswer: {answer}"
-        
-        conv_metadata = {
-            "timestamp": timestamp,
-            "question": question,
-            "answer": answer,
-            **(metadata or {})
-        }
+        combined_text = conversation_document(question, answer)
         
-        self.collection.add(
-            documents=[combined_text],
-            metadatas=[conv_metadata],
-            ids=[timestamp]
-        )
+        with self._lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            conv_metadata = {
+                **(metadata or {}),
+                "timestamp": timestamp,
+                "question": question,
+                "answer": answer,
+                "seq": seq,
+                "session_id": self.session_id
+            }
+            
+            self._store(seq, self.record_id(seq), combined_text, conv_metadata)
+            self.compact()
+    
+    def _store(self, seq: int, record_id: str, document: str, metadata: Dict):
+        # Embed here rather than inside Chroma so listeners can persist the vector.
+        embeddings = self.embedding_function([document])
+        self._write([record_id], [document], [metadata], embeddings)
+        self._index(seq, record_id, document, metadata)
+        for listener in self.listeners:
+            listener.add_records([record_id], [document], [metadata], embeddings)
+    
+    def is_over_limit(self) -> bool:
+        if self.max_turns is not None and len(self._seqs) > self.max_turns:
+            return True
+        return self.max_bytes is not None and self.total_bytes > self.max_bytes and len(self._seqs) > 1
+    
+    def compact(self):
+        """Roll the oldest records into summary records until the memory is within its bounds."""
+        with self._lock:
+            while self.is_over_limit():
+                batch_seqs = self._seqs[:self.compact_batch]
+                if len(batch_seqs) < 2:
+                    break
+                conversations = self._conversations(batch_seqs)
+                batch_ids = [conv["id"] for conv in conversations]
+                summary = self.summarizer(conversations)
+                turns = sum(conv["metadata"].get("turns", 1) for conv in conversations)
+                # The summary takes the place (and sequence number) of the newest turn it covers.
+                seq = batch_seqs[-1]
+                summary_metadata = {
+                    "timestamp": conversations[-1]["timestamp"],
+                    "question": f"Summary of {turns} earlier turns",
+                    "answer": summary,
+                    "summary": True,
+                    "turns": turns,
+                    "seq": seq,
+                    "session_id": self.session_id
+                }
+                self._delete(batch_ids)
+                self._unindex(batch_seqs)
+                for listener in self.listeners:
+                    listener.remove_records(batch_ids)
+                self._store(seq, f"{self.record_id(seq)}-summary", summary_document(summary), summary_metadata)
+    
+    def add_records(self, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings: List, batch_size: int = 1000):
+        """Bulk-load stored records with their embeddings, without embedding work or listener calls."""
+        with self._lock:
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                self._write(ids[start:end], documents[start:end], metadatas[start:end], embeddings[start:end])
+            # Records saved before sequence ids existed are numbered by timestamp after the rest.
+            unnumbered = sorted((i for i, metadata in enumerate(metadatas) if metadata.get("seq") is None),
+                                key=lambda i: metadatas[i].get("timestamp", ""))
+            for i, metadata in enumerate(metadatas):
+                if metadata.get("seq") is not None:
+                    self._index(int(metadata["seq"]), ids[i], documents[i], metadata)
+            for i in unnumbered:
+                self._index(self.next_seq, ids[i], documents[i], metadatas[i])
+            self.compact()
+    
+    def get_records(self):
+        """All stored records as (ids, documents, metadatas, embeddings)."""
+        records = self.collection.get(include=["documents", "metadatas", "embeddings"])
+        embeddings = records.get('embeddings')
+        return records['ids'], records['documents'], records['metadatas'], list(embeddings) if embeddings is not None else []
     
     def get_relevant_history(self, query: str, n_results: int = 3) -> List[Dict]:
         """Retrieve semantically similar past conversations."""
+        return self.get_relevant_history_batch([query], n_results=n_results)[0]
+    
+    def get_relevant_history_batch(self, queries: List[str], n_results: int = 3) -> List[List[Dict]]:
+        """Retrieve similar past conversations for several queries with one embedding pass and one search."""
+        if not queries:
+            return []
         results = self.collection.query(
-            query_texts=[query],
+            query_texts=queries,
             n_results=n_results,
-            include=["documents", "metadatas", "distances"]
+            include=["metadatas", "distances"]
         )
         
-        if not results or not results.get('metadatas') or not results['metadatas'][0]:
-            return []
+        if not results or not results.get('metadatas'):
+            return [[] for _ in queries]
         
-        relevant_history = []
-        for metadata, distance in zip(results['metadatas'][0], results['distances'][0]):
-            relevant_history.append({
-                "question": metadata.get("question", ""),
-                "answer": metadata.get("answer", ""),
-                "timestamp": metadata.get("timestamp", ""),
-                "distance": distance,
-                "metadata": {k: v for k, v in metadata.items() if k not in ["question", "answer", "timestamp"]}
-            })
+        batch_history = []
+        for ids, metadatas, distances in zip(results['ids'], results['metadatas'], results['distances']):
+            relevant_history = []
+            for record_id, metadata, distance in zip(ids, metadatas, distances):
+                relevant_history.append({**to_conversation(metadata, record_id), "distance": distance})
+            batch_history.append(relevant_history)
         
-        return relevant_history
+        return batch_history
     
-    def get_all_history(self) -> List[Dict]:
-        """Get all conversation history sorted by timestamp."""
-        all_results = self.collection.get(include=["metadatas"])
-        
-        if not all_results or not all_results.get('metadatas'):
+    def _conversations(self, seqs: List[int]) -> List[Dict]:
+        return [to_conversation(self._records[seq][1], self._records[seq][0]) for seq in seqs]
+    
+    def get_recent_history(self, n: int) -> List[Dict]:
+        """The last n conversations, oldest first, read from the sequence index."""
+        if n <= 0:
             return []
-        
-        conversations = []
-        for metadata in all_results['metadatas']:
-            conversations.append({
-                "question": metadata.get("question", ""),
-                "answer": metadata.get("answer", ""),
-                "timestamp": metadata.get("timestamp", ""),
-                "metadata": {k: v for k, v in metadata.items() if k not in ["question", "answer", "timestamp"]}
-            })
-        
-        conversations.sort(key=lambda x: datetime.fromisoformat(x['timestamp']).timestamp() if x.get('timestamp') else 0)
-        return conversations
-
+        with self._lock:
+            return self._conversations(self._seqs[-n:])
+    
+    def get_history_range(self, start_seq: int, end_seq: Optional[int] = None) -> List[Dict]:
+        """Conversations with start_seq <= seq < end_seq, oldest first."""
+        with self._lock:
+            start = bisect.bisect_left(self._seqs, start_seq)
+            end = len(self._seqs) if end_seq is None else bisect.bisect_left(self._seqs, end_seq)
+            return self._conversations(self._seqs[start:end])
+    
+    def get_all_history(self) -> List[Dict]:
+        """Get all conversation history in turn order."""
+        with self._lock:
+            return self._conversations(self._seqs)
+    
+    def __len__(self) -> int:
+        return len(self._seqs)
+    
+    def drop(self):
+        """Delete the backing collection, e.g. when a service session ends."""
+        with self._lock:
+            self.client.delete_collection(self.collection.name)
+            self._seqs = []
+            self._records.clear()
+            self.total_bytes = 0
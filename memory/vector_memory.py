@@ -0,0 +1,216 @@
+import bisect
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from memory.conversation_memory import ConversationMemory, RECORD_FIELDS, conversation_document, summary_document
+
+class MemoryRecord:
+    """
+    One stored turn. The question and answer are kept once; the embedded
+    document is rebuilt from them and only stored when it has another form.
+    """
+    
+    __slots__ = ("record_id", "seq", "question", "answer", "timestamp", "session_id", "extra", "size", "text")
+    
+    def __init__(self, record_id: str, seq: int, document: str, metadata: Dict):
+        self.record_id = record_id
+        self.seq = seq
+        self.question = metadata.get("question", "")
+        self.answer = metadata.get("answer", "")
+        self.timestamp = metadata.get("timestamp", "")
+        self.session_id = metadata.get("session_id")
+        self.extra = {k: v for k, v in metadata.items() if k not in RECORD_FIELDS} or None
+        self.size = len(document.encode("utf-8"))
+        self.text = None
+        if document != self.document:
+            self.text = document
+    
+    @property
+    def document(self) -> str:
+        if self.text is not None:
+            return self.text
+        if self.extra and self.extra.get("summary"):
+            return summary_document(self.answer)
+        return conversation_document(self.question, self.answer)
+    
+    def metadata(self) -> Dict:
+        metadata = {**(self.extra or {}), "timestamp": self.timestamp, "question": self.question, "answer": self.answer,
+                    "seq": self.seq}
+        if self.session_id is not None:
+            metadata["session_id"] = self.session_id
+        return metadata
+    
+    def conversation(self) -> Dict:
+        return {
+            "id": self.record_id,
+            "seq": self.seq,
+            "question": self.question,
+            "answer": self.answer,
+            "timestamp": self.timestamp,
+            "metadata": dict(self.extra or {})
+        }
+
+class VectorMemory(ConversationMemory):
+    """
+    ConversationMemory without a Chroma collection, for processes holding
+    many sessions. Embeddings live in a preallocated NumPy matrix that grows
+    by doubling, and records in __slots__ objects that keep each answer
+    once. get_relevant_history is an exact brute-force cosine top-k; with
+    quantize=True the matrix is int8 with a scale per row, a quarter of the
+    float32 size. Distances are squared L2 between the normalized vectors,
+    the same scale the Chroma backend reports for unit-length embeddings.
+    """
+    
+    def __init__(self, collection_name: str = "conversation_memory", client=None, embedding_function=None,
+                 max_turns: Optional[int] = None, max_bytes: Optional[int] = None, compact_batch: int = 10,
+                 summarizer: Optional[Callable[[List[Dict]], str]] = None, session_id: str = "default",
+                 quantize: bool = False, initial_capacity: int = 64):
+        self.quantize = quantize
+        self.initial_capacity = max(1, initial_capacity)
+        # Row storage: the matrix (float32, or int8 codes), per-row dequantization
+        # scale and inverse norm, and the record id and record held in each row.
+        self._vectors: Optional[np.ndarray] = None
+        self._scales = np.ones(0, dtype=np.float32)
+        self._inv_norms = np.zeros(0, dtype=np.float32)
+        self._row_ids: List[str] = []
+        self._row_records: List[Optional[MemoryRecord]] = []
+        self._rows: Dict[str, int] = {}
+        super().__init__(collection_name=collection_name, client=client, embedding_function=embedding_function,
+                         max_turns=max_turns, max_bytes=max_bytes, compact_batch=compact_batch, summarizer=summarizer,
+                         session_id=session_id)
+    
+    def _open_collection(self, collection_name: str, client):
+        return None
+    
+    def _reserve(self, rows: int, dim: int):
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if rows <= capacity:
+            return
+        capacity = max(rows, capacity * 2, self.initial_capacity)
+        vectors = np.empty((capacity, dim), dtype=np.int8 if self.quantize else np.float32)
+        scales = np.ones(capacity, dtype=np.float32)
+        inv_norms = np.zeros(capacity, dtype=np.float32)
+        count = len(self._row_ids)
+        if self._vectors is not None:
+            vectors[:count] = self._vectors[:count]
+            scales[:count] = self._scales[:count]
+            inv_norms[:count] = self._inv_norms[:count]
+        self._vectors, self._scales, self._inv_norms = vectors, scales, inv_norms
+    
+    def _write(self, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings: List):
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        norms = np.linalg.norm(matrix, axis=1)
+        inv_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        if self.quantize:
+            peaks = np.abs(matrix).max(axis=1) if matrix.size else np.zeros(len(ids), dtype=np.float32)
+            scales = np.where(peaks > 0, peaks / 127.0, 1.0).astype(np.float32)
+            matrix = np.rint(matrix / scales[:, None]).astype(np.int8)
+        else:
+            scales = np.ones(len(ids), dtype=np.float32)
+        
+        with self._lock:
+            for i, record_id in enumerate(ids):
+                row = self._rows.get(record_id)
+                if row is None:
+                    row = len(self._row_ids)
+                    self._reserve(row + 1, matrix.shape[1])
+                    self._row_ids.append(record_id)
+                    self._row_records.append(None)
+                    self._rows[record_id] = row
+                self._vectors[row] = matrix[i]
+                self._scales[row] = scales[i]
+                self._inv_norms[row] = inv_norms[i]
+    
+    def _delete(self, ids: List[str]):
+        """Free the rows of `ids`, moving the last row into each hole so the matrix stays dense."""
+        with self._lock:
+            for record_id in ids:
+                row = self._rows.pop(record_id, None)
+                if row is None:
+                    continue
+                last = len(self._row_ids) - 1
+                if row != last:
+                    self._vectors[row] = self._vectors[last]
+                    self._scales[row] = self._scales[last]
+                    self._inv_norms[row] = self._inv_norms[last]
+                    self._row_ids[row] = self._row_ids[last]
+                    self._row_records[row] = self._row_records[last]
+                    self._rows[self._row_ids[row]] = row
+                self._row_ids.pop()
+                self._row_records.pop()
+    
+    def _index(self, seq: int, record_id: str, document: str, metadata: Dict):
+        record = MemoryRecord(record_id, seq, document, metadata)
+        previous = self._records.get(seq)
+        if previous is not None:
+            self.total_bytes -= previous.size
+        else:
+            bisect.insort(self._seqs, seq)
+        self._records[seq] = record
+        self.total_bytes += record.size
+        self.next_seq = max(self.next_seq, seq + 1)
+        row = self._rows.get(record_id)
+        if row is not None:
+            self._row_records[row] = record
+    
+    def _unindex(self, seqs: List[int]):
+        for seq in seqs:
+            record = self._records.pop(seq, None)
+            if record is not None:
+                self.total_bytes -= record.size
+        removed = set(seqs)
+        self._seqs = [seq for seq in self._seqs if seq not in removed]
+    
+    def _conversations(self, seqs: List[int]) -> List[Dict]:
+        return [self._records[seq].conversation() for seq in seqs]
+    
+    def get_records(self):
+        """All stored records as (ids, documents, metadatas, embeddings); quantized embeddings are dequantized."""
+        with self._lock:
+            count = len(self._row_ids)
+            records = self._row_records[:count]
+            embeddings = [] if self._vectors is None else list(self._vectors[:count].astype(np.float32) * self._scales[:count, None])
+            return (list(self._row_ids), [record.document for record in records],
+                    [record.metadata() for record in records], embeddings)
+    
+    def get_relevant_history_batch(self, queries: List[str], n_results: int = 3) -> List[List[Dict]]:
+        """Cosine top-k over every stored record for each query, with one embedding pass and one matrix product."""
+        if not queries:
+            return []
+        if not self._row_ids or n_results <= 0:
+            return [[] for _ in queries]
+        # Embed outside the lock; the search itself takes microseconds.
+        query_matrix = np.asarray(self.embedding_function(queries), dtype=np.float32).reshape(len(queries), -1)
+        query_norms = np.linalg.norm(query_matrix, axis=1, keepdims=True)
+        query_matrix = np.divide(query_matrix, query_norms, out=np.zeros_like(query_matrix), where=query_norms > 0)
+        
+        with self._lock:
+            count = len(self._row_ids)
+            if count == 0:
+                return [[] for _ in queries]
+            similarities = self._vectors[:count] @ query_matrix.T
+            similarities *= (self._scales[:count] * self._inv_norms[:count])[:, None]
+            records = self._row_records[:count]
+        
+        k = min(n_results, count)
+        batch_history = []
+        for column in similarities.T:
+            top = np.argpartition(-column, k - 1)[:k] if k < count else np.arange(count)
+            top = top[np.argsort(-column[top], kind="stable")]
+            batch_history.append([
+                {**records[row].conversation(), "distance": max(0.0, 2.0 - 2.0 * float(column[row]))}
+                for row in top
+            ])
+        return batch_history
+    
+    def drop(self):
+        """Release the stored vectors and records, e.g. when a service session ends."""
+        with self._lock:
+            self._vectors = None
+            self._scales = np.ones(0, dtype=np.float32)
+            self._inv_norms = np.zeros(0, dtype=np.float32)
+            self._row_ids = []
+            self._row_records = []
+            self._rows.clear()
+            self._seqs = []
+            self._records.clear()
+            self.total_bytes = 0
@@ -1,79 +1,215 @@
-import langchain_ollama
-from memory.conversation_memory import ConversationMemory
-from core.query_optimizer import QueryOptimizer
-from core.query_tokenizer import QueryTokenizer
-from core.document_processor import DocumentProcessor
-from core.prompt_formatter import PromptFormatter
-from core.session_manager import SessionManager
+import argparse
+import threading
+from typing import Optional
+from core.instrumentation import NULL_TRACE
 
-model = langchain_ollama.ChatOllama(
-    model="gpt-oss:20b",
-    num_ctx=32768    
-)
+# Heavy dependencies (langchain_ollama, chromadb and the embedding model) are
+# imported and built by TutorApp on first use, so importing this module is
+# cheap and the CLI can show its first prompt immediately.
 
-session_manager = SessionManager()
-memory = session_manager.get_memory()
-query_optimizer = QueryOptimizer(model)
-tokenizer = QueryTokenizer()
-doc_processor = DocumentProcessor(n_results=20, distance_threshold=1.5)
-prompt_formatter = PromptFormatter()
-
-def process_query(user_question: str, relevant_history=None):
-    """Process a single query through the complete pipeline."""
-    optimized_query = query_optimizer.optimize(user_question, relevant_history)
-    print(f"\n[Optimized Query]: {optimized_query}")
-    
-    key_terms, important_terms = tokenizer.tokenize(optimized_query)
-    documents_text, results = doc_processor.process_query(optimized_query, important_terms, key_terms)
-    
-    dynamic_prompt = prompt_formatter.format(user_question, documents_text, relevant_history)
-    print("\n" + "=" * 70)
-    print("OPTIMIZED PROMPT SENT TO MODEL")
-    print("=" * 70)
-    print(dynamic_prompt)
-    print("=" * 70 + "\n")
-    
-    response = model.invoke(dynamic_prompt)
-    print("-------------------------------- MODEL RESPONSE --------------------------------")
-    print(response.content)
-    print("-------------------------------- MODEL RESPONSE --------------------------------")
-    
-    memory.add_conversation(
-        question=user_question,
-        answer=response.content,
-        metadata={"retrieved_docs_count": len(results.get('documents', [{}])[0]) if results else 0}
-    )
-    
-    return response.content
-
-def get_relevant_history(user_question: str):
-    """Get relevant conversation history with fallback."""
-    relevant_history = memory.get_relevant_history(user_question, n_results=3)
+class TutorApp:
+    """
+    The tutor's components, created on first use: the Ollama client, the
+    shared pipeline (document store, embedding function, caches) and the
+    restored conversation memory. warmup(background=True) builds them while
+    the user is typing.
+    """
+    
+    def __init__(self, model_name: str = "gpt-oss:20b", num_ctx: int = 32768, trace_path: Optional[str] = None,
+                 snapshot_path: Optional[str] = None, memory_backend: str = "chroma"):
+        self.model_name = model_name
+        self.num_ctx = num_ctx
+        self.trace_path = trace_path
+        self.snapshot_path = snapshot_path
+        self.memory_backend = memory_backend
+        self.trace_summary = None
+        self._pipeline = None
+        self._session_manager = None
+        self._lock = threading.Lock()
+        self._warmup_thread: Optional[threading.Thread] = None
+    
+    def _build(self):
+        import langchain_ollama
+        from core.instrumentation import HistogramExporter, JsonLinesExporter, Tracer
+        from core.query_optimizer import OptimizerCache
+        from core.session_manager import SessionManager, create_memory
+        from core.tutor_pipeline import TutorPipeline
+        
+        model = langchain_ollama.ChatOllama(
+            model=self.model_name,
+            num_ctx=self.num_ctx
+        )
+        
+        # Tracing stays disabled (a no-op per stage) unless a trace file is given.
+        if self.trace_path:
+            self.trace_summary = HistogramExporter()
+            tracer = Tracer([JsonLinesExporter(self.trace_path), self.trace_summary])
+        else:
+            tracer = Tracer()
+        
+        # A snapshot directory is served read-only from memory-mapped files instead of the Chroma collection.
+        document_store = None
+        if self.snapshot_path:
+            from core.index_snapshot import SnapshotStore
+            document_store = SnapshotStore(self.snapshot_path)
+        
+        pipeline = TutorPipeline(model, document_store=document_store, optimizer_cache=OptimizerCache(path="optimizer_cache.json"),
+                                 tracer=tracer)
+        document_store = pipeline.document_store
+        # Conversation memory embeds through the same cached embedding function as the documents.
+        # Past 200 records the oldest turns are rolled into a summary, keeping per-turn cost flat.
+        memory = create_memory(self.memory_backend, embedding_function=document_store.embedding_function, max_turns=200)
+        session_manager = SessionManager(memory=memory)
+        # Bulk-load earlier turns with their stored embeddings; new turns are journaled as they happen.
+        session_manager.restore_memory()
+        # Open SQLite, load the index and the embedding model ahead of the first query.
+        document_store.warmup()
+        
+        self._session_manager = session_manager
+        self._pipeline = pipeline
+    
+    def _ensure_built(self):
+        if self._pipeline is None:
+            with self._lock:
+                if self._pipeline is None:
+                    self._build()
+    
+    def warmup(self, background: bool = False):
+        """Build every component now, or in a daemon thread that the first turn waits for."""
+        if not background:
+            self._ensure_built()
+            return
+        if self._warmup_thread is None:
+            self._warmup_thread = threading.Thread(target=self._warmup, name="tutor-warmup", daemon=True)
+            self._warmup_thread.start()
+    
+    def _warmup(self):
+        try:
+            self._ensure_built()
+        except Exception as e:
+            # The first turn retries the build and surfaces the error.
+            print(f"\nBackground startup failed: {e}")
+    
+    @property
+    def pipeline(self):
+        self._ensure_built()
+        return self._pipeline
+    
+    @property
+    def session_manager(self):
+        self._ensure_built()
+        return self._session_manager
     
-    if relevant_history:
-        relevant_history = [conv for conv in relevant_history if conv['distance'] < 1.2]
+    @property
+    def memory(self):
+        return self.session_manager.get_memory()
     
-    if not relevant_history:
-        all_history = memory.get_all_history()
-        if all_history:
-            relevant_history = all_history[-2:]
+    @property
+    def tracer(self):
+        return self.pipeline.tracer
     
-    return relevant_history
+    def is_ready(self) -> bool:
+        return self._pipeline is not None
+    
+    def stream_query(self, user_question: str, relevant_history=None, pipelined: bool = True, stream: bool = True,
+                     debug_prompt: bool = False, trace=None):
+        """Run the pipeline for one question and yield the answer text as it is generated."""
+        return self.pipeline.stream_answer(self.memory, user_question, relevant_history, pipelined=pipelined, stream=stream,
+                                           debug_prompt=debug_prompt, trace=trace)
+    
+    def process_query(self, user_question: str, relevant_history=None, pipelined: bool = True, stream: bool = True,
+                      debug_prompt: bool = False, trace=None):
+        """Process a single query through the complete pipeline, printing the answer as it arrives."""
+        parts = []
+        for piece in self.stream_query(user_question, relevant_history, pipelined=pipelined, stream=stream,
+                                       debug_prompt=debug_prompt, trace=trace):
+            if not parts:
+                print("-------------------------------- MODEL RESPONSE --------------------------------")
+            print(piece, end="", flush=True)
+            parts.append(piece)
+        if not parts:
+            print("-------------------------------- MODEL RESPONSE --------------------------------")
+        print("\n-------------------------------- MODEL RESPONSE --------------------------------")
+        
+        return "".join(parts)
+    
+    def get_relevant_history(self, user_question: str, trace=NULL_TRACE):
+        """Get relevant conversation history with fallback."""
+        return self.pipeline.relevant_history(self.memory, user_question, trace=trace)
+    
+    def close(self):
+        """Save the session and persist caches, if anything was started."""
+        if self._warmup_thread is not None:
+            self._warmup_thread.join()
+        if not self.is_ready():
+            return
+        self._session_manager.save_session(self._session_manager.get_all_conversations())
+        self._pipeline.close()
+        if self.trace_summary is not None:
+            print(self.trace_summary.report())
+
+_app: Optional[TutorApp] = None
+_app_lock = threading.Lock()
 
-prompt = input("\nEnter your first question: ")
-process_query(prompt, relevant_history=None)
+def get_app(**kwargs) -> TutorApp:
+    """The process-wide TutorApp, created (but not built) on first call; kwargs apply only then."""
+    global _app
+    with _app_lock:
+        if _app is None:
+            _app = TutorApp(**kwargs)
+        return _app
 
-while True:
-    print("\n" + "=" * 70)
-    prompt = input("Enter another question (or 'quit' to exit): ").strip()
+def stream_query(user_question: str, relevant_history=None, pipelined: bool = True, stream: bool = True,
+                 debug_prompt: bool = False, trace=None):
+    """Run the pipeline for one question and yield the answer text as it is generated."""
+    return get_app().stream_query(user_question, relevant_history, pipelined=pipelined, stream=stream,
+                                  debug_prompt=debug_prompt, trace=trace)
+
+def process_query(user_question: str, relevant_history=None, pipelined: bool = True, stream: bool = True,
+                  debug_prompt: bool = False, trace=None):
+    """Process a single query through the complete pipeline, printing the answer as it arrives."""
+    return get_app().process_query(user_question, relevant_history, pipelined=pipelined, stream=stream,
+                                   debug_prompt=debug_prompt, trace=trace)
+
+def get_relevant_history(user_question: str, trace=NULL_TRACE):
+    """Get relevant conversation history with fallback."""
+    return get_app().get_relevant_history(user_question, trace=trace)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="StudyBuddy RAG tutor")
+    parser.add_argument("--debug-prompt", action="store_true", help="Print the full prompt sent to the model each turn")
+    parser.add_argument("--no-stream", action="store_true", help="Print the answer only once it is complete")
+    parser.add_argument("--trace", metavar="FILE", help="Append per-turn stage timings to FILE (JSON lines) and print a summary on exit")
+    parser.add_argument("--model", default="gpt-oss:20b", help="Ollama model name (default: gpt-oss:20b)")
+    parser.add_argument("--snapshot", metavar="DIR", help="Answer from an exported index snapshot (read-only) instead of chroma_db")
+    parser.add_argument("--memory", choices=["chroma", "numpy", "numpy-int8"], default="chroma",
+                        help="Conversation memory backend (default: chroma)")
+    args = parser.parse_args(argv)
     
-    if prompt.lower() in ['quit', 'exit', 'q']:
-        conversations = session_manager.get_all_conversations()
-        session_manager.save_session(conversations)
-        break
+    app = get_app(model_name=args.model, trace_path=args.trace, snapshot_path=args.snapshot, memory_backend=args.memory)
+    # Load the model client, document store and session while the user types the first question.
+    app.warmup(background=True)
     
-    if not prompt:
-        continue
+    prompt = input("\nEnter your first question: ")
+    app.process_query(prompt, relevant_history=None, stream=not args.no_stream, debug_prompt=args.debug_prompt)
     
-    relevant_history = get_relevant_history(prompt)
-    process_query(prompt, relevant_history)
+    while True:
+        print("\n" + "=" * 70)
+        try:
+            prompt = input("Enter another question (or 'quit' to exit): ").strip()
+        except EOFError:
+            prompt = "quit"
+        
+        if prompt.lower() in ['quit', 'exit', 'q']:
+            app.close()
+            break
+        
+        if not prompt:
+            continue
+        
+        trace = app.tracer.start()
+        relevant_history = app.get_relevant_history(prompt, trace=trace)
+        app.process_query(prompt, relevant_history, stream=not args.no_stream, debug_prompt=args.debug_prompt, trace=trace)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import time
+import numpy as np
+from core.answer_cache import AnswerCache
+from core.cache import LRUCache
+
+def evidence(i: int):
+    ids = [f"chunk-{i}-a", f"chunk-{i}-b"]
+    return {"ids": [ids], "documents": [[f"text {i} a", f"text {i} b"]]}, ids
+
+def vector(i: int):
+    return np.random.default_rng(i).standard_normal(8)
+
+def test_lookup_hits_only_on_the_same_evidence():
+    cache = AnswerCache()
+    results, ids = evidence(0)
+    cache.store(vector(0), AnswerCache.fingerprint(results), "answer", ids)
+    assert cache.lookup(vector(0), AnswerCache.fingerprint(results)) == "answer"
+    assert cache.lookup(vector(0), AnswerCache.fingerprint(evidence(1)[0])) is None
+    cache.invalidate_chunks(["chunk-0-b"])
+    assert cache.lookup(vector(0), AnswerCache.fingerprint(results)) is None
+    assert cache._chunk_fingerprints == {}
+
+def test_evicted_groups_leave_no_reverse_entries():
+    cache = AnswerCache(max_entries=4)
+    for i in range(100):
+        results, ids = evidence(i)
+        cache.store(vector(i), AnswerCache.fingerprint(results), f"answer {i}", ids)
+    assert len(cache) == 4
+    assert set(cache._chunk_fingerprints) == {f"chunk-{i}-{part}" for i in range(96, 100) for part in "ab"}
+    results, ids = evidence(99)
+    assert cache.lookup(vector(99), AnswerCache.fingerprint(results)) == "answer 99"
+
+def test_expired_groups_leave_no_reverse_entries():
+    cache = AnswerCache(ttl=0.01)
+    results, ids = evidence(0)
+    cache.store(vector(0), AnswerCache.fingerprint(results), "answer", ids)
+    time.sleep(0.02)
+    assert cache.lookup(vector(0), AnswerCache.fingerprint(results)) is None
+    assert cache._chunk_fingerprints == {}
+
+def test_lru_on_evict_reports_capacity_and_expiry_evictions():
+    evicted = []
+    cache = LRUCache(max_entries=2, ttl=0.05, on_evict=lambda key, value: evicted.append((key, value)))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert evicted == [("b", 2)]
+    cache.pop("a")
+    time.sleep(0.06)
+    assert cache.get("c") is None
+    assert evicted == [("b", 2), ("c", 3)]
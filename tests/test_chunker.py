@@ -0,0 +1,48 @@
+import pytest
+from core.chunker import TextChunker
+
+SENTENCES = [f"Sentence number {i} talks about topic {i}." for i in range(12)]
+
+def test_chunks_respect_the_size_and_keep_sentences_whole():
+    chunker = TextChunker(max_size=100)
+    chunks = list(chunker.chunk_pages([(1, " ".join(SENTENCES))]))
+    assert len(chunks) > 1
+    assert all(len(chunk.text) <= 100 for chunk in chunks)
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+    assert " ".join(chunk.text for chunk in chunks) == " ".join(SENTENCES)
+
+def test_chunks_never_span_pages():
+    chunker = TextChunker(max_size=300)
+    chunks = list(chunker.chunk_pages([(1, "First page text here."), (2, "Second page text here.")], start_index=5))
+    assert [(chunk.index, chunk.page, chunk.text) for chunk in chunks] == [
+        (5, 1, "First page text here."),
+        (6, 2, "Second page text here."),
+    ]
+
+def test_overlap_repeats_trailing_sentences():
+    chunker = TextChunker(max_size=100, overlap=45)
+    chunks = [chunk.text for chunk in chunker.chunk_pages([(1, " ".join(SENTENCES))])]
+    assert all(len(text) <= 100 for text in chunks)
+    assert chunks[:2] == [" ".join(SENTENCES[0:2]), " ".join(SENTENCES[1:3])]
+    for previous, current in zip(chunks, chunks[1:]):
+        last_sentence = previous.split(". ")[-1]
+        assert current.startswith(last_sentence.rstrip(".") + ".")
+    covered = " ".join(chunks)
+    assert all(sentence in covered for sentence in SENTENCES)
+
+def test_overlap_does_not_cross_a_page_break():
+    chunker = TextChunker(max_size=100, overlap=45)
+    chunks = list(chunker.chunk_pages([(1, " ".join(SENTENCES[:2])), (2, " ".join(SENTENCES[2:4]))]))
+    assert [chunk.page for chunk in chunks] == [1, 2]
+    assert chunks[1].text == " ".join(SENTENCES[2:4])
+
+def test_long_sentences_split_on_words_and_long_words_are_cut():
+    chunker = TextChunker(max_size=20)
+    units = list(chunker.split_units("alpha beta gamma delta epsilon " + "x" * 45))
+    assert units == ["alpha beta gamma", "delta epsilon", "x" * 20, "x" * 20, "x" * 5]
+
+def test_token_sizes_scale_to_characters():
+    chunker = TextChunker(max_size=25, overlap=5, unit="tokens")
+    assert (chunker.max_chars, chunker.overlap_chars) == (100, 20)
+    with pytest.raises(ValueError):
+        TextChunker(max_size=10, overlap=10)
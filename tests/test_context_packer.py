@@ -0,0 +1,52 @@
+from core.chunker import estimate_tokens
+from core.context_packer import ContextPacker, document_header
+
+def chunk(source, index, text):
+    return text, {"source": source, "chunk_index": index}
+
+def packed_tokens(packed):
+    return sum(estimate_tokens(document_header(i, metadata) + text) for i, (text, metadata) in enumerate(packed, 1))
+
+def test_packing_stays_within_the_budget_and_keeps_rank_order():
+    documents = [
+        chunk("a.pdf", 0, "Gradient descent updates weights against the gradient of the loss."),
+        chunk("b.pdf", 7, " ".join(f"filler{i}" for i in range(60))),
+        chunk("c.pdf", 3, "Momentum keeps a running average of past gradients."),
+    ]
+    budget = estimate_tokens(document_header(1, documents[0][1]) + documents[0][0]) \
+        + estimate_tokens(document_header(2, documents[2][1]) + documents[2][0])
+    packed = ContextPacker(token_budget=budget).pack(documents)
+    # The oversized second chunk is skipped; the smaller third one still fits.
+    assert [metadata["source"] for _, metadata in packed] == ["a.pdf", "c.pdf"]
+    assert packed_tokens(packed) <= budget
+
+def test_adjacent_chunks_merge_with_the_overlap_removed():
+    documents = [
+        chunk("a.pdf", 4, "Backpropagation applies the chain rule layer by layer to get gradients."),
+        chunk("b.pdf", 1, "Dropout randomly zeroes activations while training."),
+        chunk("a.pdf", 5, "layer by layer to get gradients. Each weight then moves by the learning rate."),
+        chunk("a.pdf", 3, "Training a network needs the gradient of the loss."),
+    ]
+    packed = ContextPacker().pack(documents)
+    assert len(packed) == 2
+    merged, metadata = packed[0]
+    assert metadata["source"] == "a.pdf"
+    assert merged == ("Training a network needs the gradient of the loss. "
+                      "Backpropagation applies the chain rule layer by layer to get gradients. "
+                      "Each weight then moves by the learning rate.")
+    assert packed[1][0] == documents[1][0]
+
+def test_merged_chunks_count_against_the_budget():
+    documents = [
+        chunk("a.pdf", 0, "Convolutions share weights across positions in the image."),
+        chunk("a.pdf", 1, " ".join(f"detail{i}" for i in range(40))),
+    ]
+    budget = estimate_tokens(document_header(1, documents[0][1]) + documents[0][0]) + 5
+    packed = ContextPacker(token_budget=budget).pack(documents)
+    assert packed == [(documents[0][0], documents[0][1])]
+
+def test_near_duplicates_are_dropped():
+    text = "Batch normalization rescales activations using statistics of the mini batch."
+    documents = [chunk("a.pdf", 0, text), chunk("b.pdf", 9, "Batch normalization rescales activations using statistics."), chunk("c.pdf", 2, text)]
+    packed = ContextPacker().pack(documents)
+    assert [metadata["source"] for _, metadata in packed] == ["a.pdf"]
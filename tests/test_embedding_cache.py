@@ -0,0 +1,67 @@
+import multiprocessing
+import os
+import numpy as np
+from core.embedding_cache import EmbeddingCache, text_key
+
+DIM = 8
+
+def vector_for(text: str) -> np.ndarray:
+    """A distinct, reproducible vector per text."""
+    seed = int.from_bytes(text_key(text)[:4], "little")
+    return np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+
+def put(cache: EmbeddingCache, texts):
+    cache.put_many([text_key(text) for text in texts], [vector_for(text) for text in texts])
+
+def assert_cached(cache: EmbeddingCache, texts):
+    vectors = cache.get_many([text_key(text) for text in texts])
+    for text, vector in zip(texts, vectors):
+        assert vector is not None, text
+        np.testing.assert_array_equal(vector, vector_for(text))
+
+def test_interleaved_writers_keep_rows_aligned(tmp_path):
+    path = str(tmp_path / "cache")
+    # Both instances open before anything is on disk, and max_entries=1 forces reads from disk.
+    first = EmbeddingCache(path=path, max_entries=1)
+    second = EmbeddingCache(path=path, max_entries=1)
+    put(first, ["alpha"])
+    put(second, ["beta", "gamma"])
+    put(first, ["delta"])
+    put(second, ["epsilon"])
+    for cache in (first, second, EmbeddingCache(path=path, max_entries=1)):
+        assert_cached(cache, ["alpha", "beta", "gamma", "delta", "epsilon"])
+
+def test_new_instance_does_not_truncate_existing_cache(tmp_path):
+    path = str(tmp_path / "cache")
+    late = EmbeddingCache(path=path)
+    put(EmbeddingCache(path=path), ["alpha", "beta"])
+    put(late, ["gamma"])
+    assert_cached(EmbeddingCache(path=path, max_entries=1), ["alpha", "beta", "gamma"])
+
+def _write_many(path: str, worker: int):
+    cache = EmbeddingCache(path=path, max_entries=1)
+    for batch in range(40):
+        put(cache, [f"text {worker}-{batch}-{i}" for i in range(5)] + ["shared text"])
+
+def test_concurrent_processes(tmp_path):
+    path = str(tmp_path / "cache")
+    workers = [multiprocessing.Process(target=_write_many, args=(path, worker)) for worker in range(6)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+        assert process.exitcode == 0
+    texts = [f"text {worker}-{batch}-{i}" for worker in range(6) for batch in range(40) for i in range(5)]
+    cache = EmbeddingCache(path=path, max_entries=1)
+    assert_cached(cache, texts + ["shared text"])
+    # Every text was written once, even the one all workers embedded.
+    assert os.path.getsize(os.path.join(path, "keys.bin")) == 16 * (len(texts) + 1)
+
+def test_disk_rows_are_capped(tmp_path):
+    path = str(tmp_path / "cache")
+    cache = EmbeddingCache(path=path, max_rows=3)
+    put(cache, ["a", "b", "c", "d", "e"])
+    assert_cached(cache, ["a", "b", "c", "d", "e"])
+    assert os.path.getsize(os.path.join(path, "keys.bin")) == 16 * 3
+    assert_cached(EmbeddingCache(path=path), ["a", "b", "c"])
+    assert EmbeddingCache(path=path).get_many([text_key("d")]) == [None]
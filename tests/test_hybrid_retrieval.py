@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+from core.document_processor import DocumentProcessor
+
+CHUNKS = {
+    "a1": ("Backpropagation computes gradients layer by layer.", {"source": "a.pdf"}),
+    "a2": ("Backpropagation reuses the chain rule.", {"source": "a.pdf"}),
+    "a3": ("Learning rates scale each gradient step.", {"source": "a.pdf"}),
+    "b1": ("Backpropagation through time unrolls the network.", {"source": "b.pdf"}),
+    "b2": ("Backpropagation needs differentiable layers.", {"source": "b.pdf"}),
+    "b3": ("Truncated backpropagation bounds the unrolling.", {"source": "b.pdf"}),
+}
+
+class FakeStore:
+    path = "unused"
+    collection_name = "unused"
+    
+    def get(self, ids, include=None):
+        return {
+            'ids': list(ids),
+            'documents': [CHUNKS[chunk_id][0] for chunk_id in ids],
+            'metadatas': [CHUNKS[chunk_id][1] for chunk_id in ids],
+        }
+
+def vector_results(hits):
+    return {
+        'ids': [[chunk_id for chunk_id, _ in hits]],
+        'documents': [[CHUNKS[chunk_id][0] for chunk_id, _ in hits]],
+        'metadatas': [[CHUNKS[chunk_id][1] for chunk_id, _ in hits]],
+        'distances': [[distance for _, distance in hits]],
+    }
+
+def processor_with(lexical_ids, n_results):
+    lexical_index = SimpleNamespace(search=lambda query, n_results: [(chunk_id, 1.0) for chunk_id in lexical_ids][:n_results])
+    return DocumentProcessor(n_results=n_results, store=FakeStore(), retrieval_mode="hybrid", lexical_index=lexical_index)
+
+def test_sources_are_filtered_before_truncation():
+    # b.pdf hits outrank a2 lexically; cut to n_results first, they would push
+    # a2 out and then be dropped themselves, leaving only the vector hit.
+    processor = processor_with(["b1", "b2", "b3", "a2"], n_results=3)
+    fused = processor.fuse_lexical("backpropagation", vector_results([("a1", 0.4)]), sources=["a.pdf"])
+    assert fused['ids'][0] == ["a1", "a2"]
+    assert all(metadata["source"] == "a.pdf" for metadata in fused['metadatas'][0])
+
+def test_lexical_only_hits_borrow_the_distance_above_them():
+    processor = processor_with(["a2", "a3"], n_results=5)
+    fused = processor.fuse_lexical("backpropagation", vector_results([("a1", 0.4), ("a3", 0.9)]))
+    distances = dict(zip(fused['ids'][0], fused['distances'][0]))
+    assert fused['ids'][0] == ["a3", "a1", "a2"]
+    assert distances == {"a3": 0.9, "a1": 0.4, "a2": 0.4}
+
+def test_lexical_only_hits_respect_the_distance_threshold():
+    processor = processor_with(["a2"], n_results=5)
+    processor.distance_threshold = 0.5
+    fused = processor.fuse_lexical("backpropagation", vector_results([("a1", 0.8)]))
+    assert fused['ids'][0] == ["a1", "a2"]
+    assert processor.filter_documents(fused, [], []) == []
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from benchmarks.corpus import generate_chunks
+from benchmarks.fakes import HashEmbeddingFunction
+from core.document_store import DocumentStore
+from core.index_snapshot import SnapshotStore, export_snapshot, import_snapshot
+from core.keyword_index import KeywordIndex
+from core.lexical_index import LexicalIndex
+
+QUERIES = [
+    "What is the learning rate in neural networks?",
+    "How does the splitting criterion relate to the leaf node?",
+    "Explain the role of the kernel in support vector machines.",
+]
+SOURCES = ["synthetic_00001.pdf", "synthetic_00003.pdf"]
+
+@pytest.fixture(scope="module")
+def stores(tmp_path_factory):
+    """A Chroma store of synthetic chunks and a float32 snapshot exported from it."""
+    root = tmp_path_factory.mktemp("snapshot")
+    store = DocumentStore(path=str(root / "chroma_db"), collection_name="docs", embedding_function=HashEmbeddingFunction())
+    ids, documents, metadatas = zip(*generate_chunks(300))
+    store.collection.upsert(ids=list(ids), documents=list(documents), metadatas=list(metadatas))
+    for index in side_indexes(store):
+        index.add_chunks(list(ids), list(documents), list(metadatas))
+        index.save()
+    export_snapshot(store, str(root / "snapshot"))
+    yield store, SnapshotStore(str(root / "snapshot"), embedding_function=HashEmbeddingFunction()), root
+    store.close()
+
+def side_indexes(store):
+    """The store's keyword and BM25 indexes, loaded from disk (empty if missing)."""
+    return [index_cls.load(index_cls.path_for(store.path, store.collection_name)) for index_cls in (KeywordIndex, LexicalIndex)]
+
+def assert_same_indexes(expected_store, actual_store):
+    expected_keywords, expected_lexical = side_indexes(expected_store)
+    actual_keywords, actual_lexical = side_indexes(actual_store)
+    assert actual_keywords.chunk_terms == expected_keywords.chunk_terms
+    assert actual_lexical.doc_terms == expected_lexical.doc_terms
+    assert actual_lexical.total_length == expected_lexical.total_length
+
+def assert_same_results(expected, actual):
+    np.testing.assert_allclose(actual["distances"][0], expected["distances"][0], rtol=1e-4, atol=1e-4)
+    assert actual["ids"] == expected["ids"]
+    assert actual["documents"] == expected["documents"]
+    assert actual["metadatas"] == expected["metadatas"]
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_snapshot_queries_match_chroma(stores, query):
+    store, snapshot, _ = stores
+    assert snapshot.collection.count() == store.collection.count()
+    assert_same_results(store.query(query, n_results=5), snapshot.query(query, n_results=5))
+    assert_same_results(store.query(query, n_results=5, sources=SOURCES), snapshot.query(query, n_results=5, sources=SOURCES))
+
+def test_snapshot_get_and_side_indexes(stores):
+    store, snapshot, _ = stores
+    ids = ["synthetic_00000.pdf_0", "synthetic_00004.pdf_7"]
+    expected, actual = store.get(ids), snapshot.get(ids)
+    for field in ("ids", "documents", "metadatas"):
+        assert actual[field] == expected[field]
+    assert_same_indexes(store, snapshot)
+
+def test_import_restores_the_collection(stores, tmp_path):
+    store, _, root = stores
+    imported = DocumentStore(path=str(tmp_path / "imported_db"), collection_name="docs", embedding_function=HashEmbeddingFunction())
+    try:
+        assert import_snapshot(str(root / "snapshot"), imported) == store.collection.count()
+        for query in QUERIES:
+            assert_same_results(store.query(query, n_results=5), imported.query(query, n_results=5))
+        assert_same_indexes(store, imported)
+    finally:
+        imported.close()
+
+def test_import_into_a_filled_collection_keeps_its_postings(stores, tmp_path):
+    store, _, root = stores
+    extra = [("notes_0", "Backpropagation computes the gradient layer by layer.", {"source": "notes.pdf"}),
+             ("notes_1", "Pruning removes branches that do not improve the tree.", {"source": "notes.pdf"})]
+    imported = DocumentStore(path=str(tmp_path / "imported_db"), collection_name="docs", embedding_function=HashEmbeddingFunction())
+    # What an ingest of the same chunks would have produced: indexes over both sets.
+    expected = DocumentStore(path=str(tmp_path / "expected_db"), collection_name="docs", embedding_function=HashEmbeddingFunction())
+    try:
+        ids, documents, metadatas = (list(column) for column in zip(*extra))
+        imported.collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+        for index in side_indexes(imported):
+            index.add_chunks(ids, documents, metadatas)
+            index.save()
+        assert import_snapshot(str(root / "snapshot"), imported) == store.collection.count()
+        assert imported.collection.count() == store.collection.count() + len(extra)
+        
+        all_ids, all_documents, all_metadatas = (list(column) for column in zip(*generate_chunks(300), *extra))
+        for index in side_indexes(expected):
+            index.add_chunks(all_ids, all_documents, all_metadatas)
+            index.save()
+        assert_same_indexes(expected, imported)
+        assert "notes_0" in side_indexes(imported)[0]
+    finally:
+        imported.close()
+        expected.close()
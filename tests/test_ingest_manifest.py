@@ -0,0 +1,49 @@
+from benchmarks.fakes import HashEmbeddingFunction
+from core.document_store import DocumentStore, get_document_store, register_document_store, reset_document_stores
+from core.ingest_manifest import IngestManifest
+from core.keyword_index import KeywordIndex
+from core.lexical_index import LexicalIndex
+from utils.chroma_test import ingest_documents
+
+SENTENCES = [f"Lecture point {i} explains a separate idea in detail." for i in range(8)]
+
+def ingest(folder, capsys):
+    capsys.readouterr()
+    ingest_documents(str(folder), chunk_size=60)
+    return capsys.readouterr().out
+
+def stored_state():
+    """Chunk ids in the collection, the manifest and both side indexes."""
+    store = get_document_store()
+    manifest = IngestManifest.load(IngestManifest.path_for(store.path, store.collection_name))
+    keyword_index = KeywordIndex.load(KeywordIndex.path_for(store.path, store.collection_name))
+    lexical_index = LexicalIndex.load(LexicalIndex.path_for(store.path, store.collection_name))
+    manifest_ids = {chunk_id for entry in manifest.files.values() for chunk_id in entry["chunks"]}
+    return (set(store.collection.get(include=[])['ids']), manifest_ids,
+            set(keyword_index.chunk_terms), set(lexical_index.doc_terms))
+
+def test_shrunk_and_deleted_files_drop_their_stale_chunks(tmp_path, monkeypatch, capsys):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    (folder / "a.txt").write_text(" ".join(SENTENCES) + "\n")
+    (folder / "b.txt").write_text("Sorting algorithms order a list of items.\n")
+    monkeypatch.chdir(tmp_path)
+    register_document_store(DocumentStore(embedding_function=HashEmbeddingFunction()))
+    try:
+        ingest(folder, capsys)
+        ids = stored_state()[0]
+        assert {f"a.txt_{i}" for i in range(8)} | {"b.txt_0"} == ids
+        assert all(state == ids for state in stored_state())
+        
+        (folder / "a.txt").write_text(" ".join(SENTENCES[:3]) + "\n")
+        (folder / "b.txt").unlink()
+        out = ingest(folder, capsys)
+        assert "Processing 1 of 1 files" in out and "1 removed" in out
+        expected = {"a.txt_0", "a.txt_1", "a.txt_2"}
+        assert all(state == expected for state in stored_state())
+        
+        out = ingest(folder, capsys)
+        assert "Processing 0 of 1 files" in out
+        assert all(state == expected for state in stored_state())
+    finally:
+        reset_document_stores()
@@ -0,0 +1,120 @@
+import random
+from types import SimpleNamespace
+from benchmarks.corpus import QUESTION_TEMPLATES, TOPICS, generate_chunks
+from core.document_processor import DocumentProcessor
+from core.keyword_index import KeywordIndex, TermMatcher
+from core.query_tokenizer import QueryTokenizer
+
+def substring_filter(results, important_terms, key_terms, distance_threshold):
+    """The filter as it was before the keyword index: a substring test per term."""
+    kept = []
+    for doc, metadata, distance in zip(results['documents'][0], results['metadatas'][0], results['distances'][0]):
+        doc_lower = doc.lower()
+        if important_terms:
+            contains_important = any(term in doc_lower for term in important_terms)
+        else:
+            contains_important = any(term in doc_lower for term in key_terms) if key_terms else True
+        if contains_important and distance < distance_threshold:
+            kept.append((doc, metadata, distance))
+    return kept
+
+def baseline_key_terms(query):
+    """QueryTokenizer.extract_key_terms as it was before the keyword index."""
+    words = query.lower().split()
+    return [f"{words[i]} {words[i+1]}" for i in range(len(words) - 1) if len(f"{words[i]} {words[i+1]}") > 5]
+
+PUNCTUATED_QUESTIONS = [
+    "Explain C++ templates",
+    "Why are node.js servers single threaded?",
+    "What is a decision tree?",
+    "Explain gradient descent, step by step.",
+]
+PUNCTUATED_CHUNKS = [
+    ("cpp", "C++ templates are expanded at compile time."),
+    ("c", "C templates do not exist; macros are used instead."),
+    ("node", "Most node.js servers run a single threaded event loop."),
+    ("tree", "What is a decision tree? A model that splits data."),
+    ("descent", "Gradient descent, step by step, lowers the loss."),
+    ("other", "Support vector machines maximize the margin."),
+]
+
+def test_key_terms_keep_punctuation():
+    tokenizer = QueryTokenizer()
+    for question in PUNCTUATED_QUESTIONS:
+        assert tokenizer.extract_key_terms(question) == baseline_key_terms(question)
+
+def test_punctuated_terms_filter_like_the_baseline():
+    index = KeywordIndex()
+    index.add_chunks([chunk_id for chunk_id, _ in PUNCTUATED_CHUNKS], [text for _, text in PUNCTUATED_CHUNKS])
+    processor = DocumentProcessor(distance_threshold=1.5, store=SimpleNamespace(path="unused"), keyword_index=index)
+    results = {
+        'ids': [[chunk_id for chunk_id, _ in PUNCTUATED_CHUNKS]],
+        'documents': [[text for _, text in PUNCTUATED_CHUNKS]],
+        'metadatas': [[{"source": "notes.pdf"} for _ in PUNCTUATED_CHUNKS]],
+        'distances': [[0.5] * len(PUNCTUATED_CHUNKS)],
+    }
+    kept = {}
+    for question in PUNCTUATED_QUESTIONS:
+        key_terms, important_terms = QueryTokenizer().tokenize(question)
+        filtered = processor.filter_documents(results, important_terms, key_terms)
+        assert filtered == substring_filter(results, important_terms, key_terms, 1.5)
+        kept[question] = [doc for doc, _, _ in filtered]
+    # "c++ templates" is not "c templates", and "tree?" needs the question mark.
+    assert kept["Explain C++ templates"] == ["C++ templates are expanded at compile time."]
+    assert kept["What is a decision tree?"] == ["What is a decision tree? A model that splits data."]
+
+def test_prefix_of_indexed_bigram_matches():
+    index = KeywordIndex()
+    index.add_chunks(["plural", "singular", "other"],
+                     ["Deep neural networks learn features.", "A neural network has layers.", "Decision trees split data."])
+    # The term is in the index vocabulary (from "singular"), but "plural" only has it as a prefix.
+    matcher = TermMatcher(["neural network"], index)
+    assert index.has_term("neural network") and "plural" not in index.chunks_with_any(["neural network"])
+    assert matcher.matches("plural", "Deep neural networks learn features.")
+    assert not matcher.matches("other", "Decision trees split data.")
+
+def test_unindexed_chunk_falls_back_to_text():
+    index = KeywordIndex()
+    index.add_chunks(["indexed"], ["The entropy of a split."])
+    matcher = TermMatcher(["information gain"], index)
+    assert matcher.matches("new", "Information gain drives the split.")
+    assert not matcher.matches("indexed", "The entropy of a split.")
+
+def test_indexed_filter_agrees_with_substring_filter():
+    chunks = list(generate_chunks(600, seed=3))
+    extra = ["A neural network has layers.", "Deep neural networks stack layers.", "Each decision tree splits data.",
+             "Decision trees overfit without pruning."]
+    chunks += [(f"extra_{i}", text, {"source": "extra.pdf", "chunk_index": i}) for i, text in enumerate(extra)]
+    index = KeywordIndex()
+    index.add_chunks([chunk_id for chunk_id, _, _ in chunks], [text for _, text, _ in chunks])
+    processor = DocumentProcessor(distance_threshold=1.5, store=SimpleNamespace(path="unused"), keyword_index=index)
+    tokenizer = QueryTokenizer()
+    rng = random.Random(7)
+    questions = []
+    for topic, terms in TOPICS.items():
+        for template in QUESTION_TEMPLATES:
+            a, b = rng.sample(terms, 2)
+            questions.append(template.format(a=a, b=b, topic=topic))
+    # Terms that are prefixes of indexed bigrams, and one that matches nothing.
+    questions += ["How does a neural network work?", "What is a decision tree?", "Explain quantum chromodynamics"]
+    
+    for question in questions:
+        key_terms, important_terms = tokenizer.tokenize(question)
+        sample = rng.sample(chunks[:-len(extra)], 36) + chunks[-len(extra):]
+        results = {
+            'ids': [[chunk_id for chunk_id, _, _ in sample]],
+            'documents': [[text for _, text, _ in sample]],
+            'metadatas': [[metadata for _, _, metadata in sample]],
+            'distances': [[rng.uniform(0.5, 2.0) for _ in sample]],
+        }
+        expected = substring_filter(results, important_terms, key_terms, 1.5)
+        assert processor.filter_documents(results, important_terms, key_terms) == expected, question
+
+def test_bigrams_split_by_punctuation_or_line_breaks_are_not_indexed():
+    # "the margin" and "margin the" are not substrings, so the index must not claim them.
+    text = "Support vector machines maximize the\nmargin. The kernel maps data."
+    index = KeywordIndex()
+    index.add_chunks(["wrapped"], [text])
+    assert not index.has_term("the margin") and not index.has_term("margin the")
+    assert index.has_term("the kernel")
+    assert not TermMatcher(["the margin"], index).matches("wrapped", text)
@@ -0,0 +1,87 @@
+from concurrent.futures import ThreadPoolExecutor
+from PyPDF2 import PdfWriter
+from benchmarks.fakes import HashEmbeddingFunction
+from core.document_store import DocumentStore, register_document_store, reset_document_stores
+from core.ingest_manifest import IngestManifest
+from utils import pdf_extraction
+from utils.chroma_test import ingest_documents
+from utils.pdf_extraction import iter_extracted
+
+def write_pdf(path, pages: int = 0):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(200, 200)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+def make_folder(tmp_path):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    (folder / "a.txt").write_text("Recursion is a function calling itself.\n")
+    write_pdf(folder / "b_empty.pdf")
+    write_pdf(folder / "c_blank.pdf", pages=3)
+    (folder / "d_broken.pdf").write_bytes(b"not a pdf")
+    (folder / "e.txt").write_text("A for loop repeats a block for each item.\n")
+    return folder
+
+def extracted(folder, workers):
+    files = [(str(folder / name), name) for name in sorted(p.name for p in folder.iterdir())]
+    return [(filename, pages, is_last) for _, filename, pages, is_last in iter_extracted(files, workers=workers, pages_per_task=1)]
+
+def merge_by_file(parts):
+    """Pages per file, or None for a file with a failed part."""
+    merged = {}
+    for filename, pages, _ in parts:
+        previous = merged.setdefault(filename, [])
+        merged[filename] = None if pages is None or previous is None else previous + pages
+    return merged
+
+def test_pool_and_serial_extraction_agree(tmp_path):
+    folder = make_folder(tmp_path)
+    serial = extracted(folder, workers=1)
+    pooled = extracted(folder, workers=2)
+    assert merge_by_file(serial) == merge_by_file(pooled)
+    assert merge_by_file(pooled)["b_empty.pdf"] == []
+    assert merge_by_file(pooled)["d_broken.pdf"] is None
+    # Files arrive in submission order, each ending with its last part.
+    assert [filename for filename, _, is_last in pooled if is_last] == sorted(p.name for p in folder.iterdir())
+
+def test_empty_pdfs_are_recorded_and_skipped_next_run(tmp_path, monkeypatch, capsys):
+    folder = make_folder(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    register_document_store(DocumentStore(embedding_function=HashEmbeddingFunction()))
+    try:
+        ingest_documents(str(folder), workers=2, pages_per_task=1)
+        manifest = IngestManifest.load(IngestManifest.path_for("chroma_db", "test_collection"))
+        assert manifest.get_file(str(folder / "b_empty.pdf"))["chunks"] == {}
+        assert manifest.get_file(str(folder / "c_blank.pdf"))["chunks"] == {}
+        assert manifest.get_file(str(folder / "d_broken.pdf")) is None
+        capsys.readouterr()
+        ingest_documents(str(folder), workers=2, pages_per_task=1)
+        # Only the unreadable file is tried again.
+        assert "Processing 1 of 5 files" in capsys.readouterr().out
+    finally:
+        reset_document_stores()
+
+class CountingPool(ThreadPoolExecutor):
+    """Thread pool standing in for the process pool, recording how many tasks were submitted."""
+    
+    submitted = 0
+    
+    def submit(self, *args, **kwargs):
+        CountingPool.submitted += 1
+        return super().submit(*args, **kwargs)
+
+def test_pool_submits_within_the_window(tmp_path, monkeypatch):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    for i in range(100):
+        (folder / f"{i:03d}.txt").write_text(f"Text file number {i}.\n")
+    files = [(str(folder / name), name) for name in sorted(p.name for p in folder.iterdir())]
+    monkeypatch.setattr(pdf_extraction, "ProcessPoolExecutor", CountingPool)
+    CountingPool.submitted = 0
+    parts = pdf_extraction.iter_extracted(files, workers=2, max_in_flight=4)
+    first = next(parts)
+    assert first[1] == "000.txt"
+    assert CountingPool.submitted <= 5
+    assert [filename for _, filename, _, _ in [first, *parts]] == [filename for _, filename in files]
@@ -0,0 +1,40 @@
+import json
+import os
+import threading
+from core.ingest_manifest import IngestManifest
+from core.keyword_index import KeywordIndex
+from core.persist import atomic_write_json, load_versioned_json
+
+def test_concurrent_threads_write_whole_documents(tmp_path):
+    path = str(tmp_path / "state.json")
+    errors = []
+    
+    def write(worker: int):
+        try:
+            for i in range(200):
+                atomic_write_json(path, {"version": 1, "worker": worker, "items": list(range(i % 50))})
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    data = load_versioned_json(path, 1, "state")
+    assert data is not None and data["worker"] in range(4)
+    # No temporary files are left behind.
+    assert [p.name for p in tmp_path.iterdir()] == ["state.json"]
+    with open(path, encoding="utf-8") as f:
+        json.load(f)
+
+def test_store_files_are_not_shared_between_stores_or_collections(tmp_path):
+    paths = {
+        KeywordIndex.path_for(str(tmp_path / db), collection)
+        for db in ("first_db", "second_db") for collection in ("docs", "notes")
+    }
+    assert len(paths) == 4
+    assert all(path.startswith(str(tmp_path / "first_db") + os.sep) or path.startswith(str(tmp_path / "second_db") + os.sep)
+               for path in paths)
+    assert IngestManifest.path_for(str(tmp_path / "first_db"), "docs") != IngestManifest.path_for(str(tmp_path / "second_db"), "docs")
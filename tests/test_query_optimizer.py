@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+from core.query_optimizer import OptimizerCache, QueryOptimizer
+
+class CountingModel:
+    def __init__(self):
+        self.calls = 0
+    
+    def invoke(self, prompt):
+        self.calls += 1
+        return SimpleNamespace(content=f"rewrite {self.calls} of the follow-up question")
+
+def history(record_id: str, question: str, answer: str):
+    return [{"id": record_id, "question": question, "answer": answer, "timestamp": "2024-01-01T00:00:00"}]
+
+def test_same_record_id_in_another_session_is_not_reused():
+    # Both sessions' first turn is record 0, about different topics.
+    loops = history("0", "What is a for loop?", "A for loop repeats a block for each item.")
+    recursion = history("0", "What is recursion?", "Recursion is a function calling itself.")
+    assert OptimizerCache.make_key("give an example", loops) != OptimizerCache.make_key("give an example", recursion)
+    
+    model = CountingModel()
+    optimizer = QueryOptimizer(model, cache=OptimizerCache())
+    first = optimizer.optimize("give an example of it", loops)
+    second = optimizer.optimize("give an example of it", recursion)
+    assert model.calls == 2
+    assert first != second
+
+def test_same_history_text_hits_across_sessions():
+    model = CountingModel()
+    optimizer = QueryOptimizer(model, cache=OptimizerCache())
+    answer = "A for loop repeats a block for each item. " * 10
+    optimizer.optimize("give an example of it", history("0", "What is a for loop?", answer))
+    # Different id and an answer that differs only past what the prompt shows.
+    optimizer.optimize("Give an example of it?", history("7", "What is a for loop?", answer + " More detail."))
+    assert model.calls == 1
+
+def test_persisted_entries_reload(tmp_path):
+    path = str(tmp_path / "optimizer_cache.json")
+    cache = OptimizerCache(path=path)
+    key = OptimizerCache.make_key("give an example", history("0", "What is a for loop?", "It repeats."))
+    cache.put(key, "for loop example")
+    cache.save()
+    assert OptimizerCache(path=path).get(key) == "for loop example"
@@ -0,0 +1,46 @@
+from core.reranker import MMRReranker
+
+def results_for(candidates):
+    """candidates: (id, source, distance, embedding) in retrieval order."""
+    return {
+        'ids': [[chunk_id for chunk_id, _, _, _ in candidates]],
+        'documents': [[f"text of {chunk_id}" for chunk_id, _, _, _ in candidates]],
+        'metadatas': [[{"source": source} for _, source, _, _ in candidates]],
+        'distances': [[distance for _, _, distance, _ in candidates]],
+        'embeddings': [[embedding for _, _, _, embedding in candidates]],
+    }
+
+CANDIDATES = [
+    ("a", "a.pdf", 0.20, [1.0, 0.0, 0.0]),
+    ("a_dup", "b.pdf", 0.25, [0.99, 0.14, 0.0]),
+    ("c", "c.pdf", 0.30, [0.0, 1.0, 0.0]),
+    ("far", "d.pdf", 0.60, [0.0, 0.0, 1.0]),
+]
+
+def test_mmr_puts_a_diverse_chunk_ahead_of_a_near_duplicate():
+    reranked = MMRReranker(lambda_mult=0.7).rerank(results_for(CANDIDATES))
+    assert reranked['ids'][0] == ["a", "c", "a_dup"]
+    assert reranked['distances'][0] == [0.20, 0.30, 0.25]
+
+def test_lambda_one_keeps_relevance_order():
+    reranked = MMRReranker(lambda_mult=1.0).rerank(results_for(CANDIDATES))
+    assert reranked['ids'][0] == ["a", "a_dup", "c"]
+
+def test_cutoff_is_relative_to_the_best_distance_with_a_minimum_margin():
+    # best 0.20: cutoff = max(0.20 * 1.3, 0.20 + 0.1) = 0.30, so "far" is dropped.
+    assert "far" not in MMRReranker().rerank(results_for(CANDIDATES))['ids'][0]
+    wide = MMRReranker(relative_cutoff=3.0).rerank(results_for(CANDIDATES))
+    assert sorted(wide['ids'][0]) == ["a", "a_dup", "c", "far"]
+    tight = MMRReranker(relative_cutoff=1.0, min_margin=0.06).rerank(results_for(CANDIDATES))
+    assert tight['ids'][0] == ["a", "a_dup"]
+
+def test_max_per_source_and_max_results():
+    candidates = [
+        ("s1", "same.pdf", 0.20, [1.0, 0.0, 0.0]),
+        ("s2", "same.pdf", 0.21, [0.0, 1.0, 0.0]),
+        ("s3", "same.pdf", 0.22, [0.0, 0.0, 1.0]),
+        ("o1", "other.pdf", 0.25, [0.6, 0.8, 0.0]),
+    ]
+    reranked = MMRReranker(max_per_source=2).rerank(results_for(candidates))
+    assert reranked['ids'][0] == ["s1", "s2", "o1"]
+    assert len(MMRReranker(max_results=2, max_per_source=None).rerank(results_for(candidates))['ids'][0]) == 2
@@ -0,0 +1,60 @@
+import uuid
+import chromadb
+import numpy as np
+import pytest
+from benchmarks.fakes import HashEmbeddingFunction
+from core.session_manager import SessionManager, create_memory
+
+class CountingEmbeddingFunction(HashEmbeddingFunction):
+    def __init__(self):
+        super().__init__()
+        self.texts = 0
+    
+    def __call__(self, input):
+        self.texts += len(input)
+        return super().__call__(input)
+
+def new_memory(backend: str, embedding_function):
+    client = chromadb.Client() if backend == "chroma" else None
+    # Small bounds so the turns below are compacted into summaries and journaled as removals.
+    return create_memory(backend, collection_name=f"memory-{uuid.uuid4().hex[:8]}", client=client,
+                         embedding_function=embedding_function, max_turns=4, compact_batch=2, session_id="s")
+
+def history(memory):
+    return [(conv["id"], conv["question"], conv["answer"], conv["metadata"].get("summary", False))
+            for conv in memory.get_all_history()]
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy"])
+@pytest.mark.parametrize("save", [False, True])
+def test_journal_and_snapshot_restore_without_embedding(tmp_path, backend, save):
+    session_file = str(tmp_path / "session.json")
+    manager = SessionManager(session_file=session_file, memory=new_memory(backend, HashEmbeddingFunction()),
+                             snapshot_every=3)
+    for turn in range(7):
+        manager.memory.add_conversation(f"question {turn}", f"answer {turn}")
+    if save:
+        manager.save_session(manager.get_all_conversations())
+    assert any(summary for _, _, _, summary in history(manager.memory))
+    
+    embedding_function = CountingEmbeddingFunction()
+    restored = SessionManager(session_file=session_file, memory=new_memory(backend, embedding_function))
+    restored.restore_memory()
+    assert history(restored.memory) == history(manager.memory)
+    assert embedding_function.texts == 0
+    # The restored embeddings are the stored ones, so searches rank the same.
+    expected = manager.memory.get_relevant_history("question 5", n_results=3)
+    actual = restored.memory.get_relevant_history("question 5", n_results=3)
+    assert [conv["id"] for conv in actual] == [conv["id"] for conv in expected]
+    np.testing.assert_allclose([conv["distance"] for conv in actual], [conv["distance"] for conv in expected], atol=1e-5)
+
+def test_torn_journal_line_is_skipped(tmp_path):
+    session_file = str(tmp_path / "session.json")
+    manager = SessionManager(session_file=session_file, memory=new_memory("numpy", HashEmbeddingFunction()))
+    manager.memory.add_conversation("question 0", "answer 0")
+    manager.memory.add_conversation("question 1", "answer 1")
+    with open(manager.journal.path, "a", encoding="utf-8") as f:
+        f.write('{"id": "torn", "document"')
+    
+    restored = SessionManager(session_file=session_file, memory=new_memory("numpy", HashEmbeddingFunction()))
+    restored.restore_memory()
+    assert history(restored.memory) == history(manager.memory)
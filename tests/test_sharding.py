@@ -0,0 +1,84 @@
+import os
+import chromadb
+import pytest
+from benchmarks.fakes import HashEmbeddingFunction
+from core.document_store import DEFAULT_COLLECTION_NAME, DocumentStore, register_document_store, reset_document_stores
+from core.ingest_manifest import IngestManifest
+from core.keyword_index import KeywordIndex
+from core.sharded_store import ShardConfig, ShardedDocumentStore
+from utils.chroma_test import configure_shards, ingest_documents
+
+COLLECTION = "docs"
+
+def filled_store(db_path: str, collection_name: str = COLLECTION) -> DocumentStore:
+    """An unsharded collection with a few chunks, plus the manifest and index that describe them."""
+    store = register_document_store(DocumentStore(path=db_path, collection_name=collection_name,
+                                                  embedding_function=HashEmbeddingFunction()))
+    store.collection.upsert(ids=["a:0", "b:0"], documents=["first chunk", "second chunk"],
+                            metadatas=[{"source": "a.pdf"}, {"source": "b.pdf"}])
+    IngestManifest(IngestManifest.path_for(db_path, collection_name)).save()
+    index = KeywordIndex(KeywordIndex.path_for(db_path, collection_name))
+    index.add_chunks(["a:0", "b:0"], ["first chunk", "second chunk"])
+    index.save()
+    return store
+
+def collection_names(db_path: str):
+    return {collection.name for collection in chromadb.PersistentClient(path=db_path).list_collections()}
+
+def test_filled_collection_keeps_its_layout_without_reindex(tmp_path):
+    db_path = str(tmp_path / "chroma_db")
+    store = filled_store(db_path)
+    try:
+        assert not configure_shards(2, path=db_path, collection_name=COLLECTION)
+        assert ShardConfig.load(ShardConfig.path_for(db_path)).shard_count(COLLECTION) == 1
+        assert store.collection.count() == 2
+        assert os.path.exists(IngestManifest.path_for(db_path, COLLECTION))
+    finally:
+        reset_document_stores()
+
+def test_reindex_drops_the_old_collection_and_manifest(tmp_path):
+    db_path = str(tmp_path / "chroma_db")
+    filled_store(db_path)
+    try:
+        assert configure_shards(2, path=db_path, collection_name=COLLECTION, reindex=True)
+        assert ShardConfig.load(ShardConfig.path_for(db_path)).shard_count(COLLECTION) == 2
+        assert COLLECTION not in collection_names(db_path)
+        assert not os.path.exists(IngestManifest.path_for(db_path, COLLECTION))
+        assert not os.path.exists(KeywordIndex.path_for(db_path, COLLECTION))
+    finally:
+        reset_document_stores()
+
+def test_empty_collection_is_sharded_directly(tmp_path):
+    db_path = str(tmp_path / "chroma_db")
+    register_document_store(DocumentStore(path=db_path, collection_name=COLLECTION, embedding_function=HashEmbeddingFunction()))
+    try:
+        assert configure_shards(2, path=db_path, collection_name=COLLECTION)
+        assert ShardConfig.load(ShardConfig.path_for(db_path)).shard_count(COLLECTION) == 2
+    finally:
+        reset_document_stores()
+
+@pytest.mark.parametrize("shards", [None, 2])
+def test_missing_folder_drops_nothing(tmp_path, monkeypatch, shards):
+    monkeypatch.chdir(tmp_path)
+    store = filled_store("chroma_db", DEFAULT_COLLECTION_NAME)
+    try:
+        ingest_documents(str(tmp_path / "no_such_folder"), shards=shards, reindex=True)
+        assert store.collection.count() == 2
+        assert os.path.exists(IngestManifest.path_for("chroma_db", DEFAULT_COLLECTION_NAME))
+        assert os.path.exists(KeywordIndex.path_for("chroma_db", DEFAULT_COLLECTION_NAME))
+        assert ShardConfig.load(ShardConfig.path_for("chroma_db")).shard_count(DEFAULT_COLLECTION_NAME) == 1
+    finally:
+        reset_document_stores()
+
+def test_close_releases_the_fan_out_threads(tmp_path):
+    store = ShardedDocumentStore(path=str(tmp_path / "chroma_db"), collection_name=COLLECTION, n_shards=2,
+                                 embedding_function=HashEmbeddingFunction())
+    store.collection.upsert(ids=["a:0", "b:0"], documents=["first chunk", "second chunk"],
+                            metadatas=[{"source": "a.pdf"}, {"source": "b.pdf"}])
+    store.query("chunk", n_results=2)
+    executor = store._executor
+    store.close()
+    assert executor._shutdown
+    # Reopening after close (as reload does) gets a fresh pool.
+    assert len(store.query("chunk", n_results=2)["ids"][0]) == 2
+    store.close()
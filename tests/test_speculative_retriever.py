@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+from core.instrumentation import Tracer
+from core.speculative_retriever import SpeculativeRetriever
+
+def results_for(ids, distances=None):
+    return {
+        'ids': [list(ids)],
+        'documents': [[f"text of {chunk_id}" for chunk_id in ids]],
+        'metadatas': [[{"source": "notes.pdf"} for _ in ids]],
+        'distances': [list(distances) if distances is not None else [0.1 * (i + 1) for i in range(len(ids))]],
+    }
+
+class FakeStore:
+    """Answers probes from a fixed query → ids table and records each call."""
+    
+    def __init__(self, rankings):
+        self.rankings = rankings
+        self.queried = []
+        self.fetched = []
+    
+    def query(self, query, n_results, include=None):
+        self.queried.append(query)
+        ids = self.rankings[query][:n_results]
+        return {'ids': [ids], 'distances': [[0.1 * (i + 1) for i in range(len(ids))]]}
+    
+    def get(self, ids, include=None):
+        self.fetched.extend(ids)
+        return {k: v[0] for k, v in results_for(ids).items() if k != 'distances'}
+
+def make_retriever(rankings, **kwargs):
+    store = FakeStore(rankings)
+    processor = SimpleNamespace(
+        store=store,
+        n_results=5,
+        retrieval_mode="vector",
+        retrieve_documents=lambda query: results_for(store.rankings[query][:5]),
+    )
+    return SpeculativeRetriever(processor, **kwargs), store
+
+def test_pipelined_retrieval_is_traced_as_retrieve():
+    rankings = {
+        "what is backprop": ["a", "b", "c", "d", "e"],
+        "backpropagation algorithm neural networks": ["v", "w", "x", "y", "z"],
+    }
+    retriever, _ = make_retriever(rankings)
+    trace = Tracer(enabled=True).start()
+    
+    def optimize():
+        with trace.span("optimize"):
+            return "backpropagation algorithm neural networks"
+    
+    retriever.retrieve("what is backprop", optimize, trace=trace)
+    retriever.close()
+    assert sorted(span["name"] for span in trace.spans) == ["optimize", "retrieve", "retrieve_probe"]
+
+def test_near_identical_rewrite_reuses_without_probing():
+    rankings = {"what is gradient descent": ["a", "b", "c"]}
+    retriever, store = make_retriever(rankings)
+    optimized, results = retriever.retrieve("what is gradient descent", lambda: "What is gradient descent?")
+    retriever.close()
+    assert optimized == "What is gradient descent?"
+    assert results['ids'][0] == ["a", "b", "c"]
+    assert store.queried == [] and (retriever.reused, retriever.probed) == (1, 0)
+
+def test_probe_overlap_at_the_threshold_reuses_the_speculative_result():
+    # 3 of the top 5 shared: overlap 0.6 meets the default threshold.
+    rankings = {
+        "explain backprop": ["a", "b", "c", "d", "e"],
+        "backpropagation chain rule gradients": ["a", "b", "c", "x", "y"],
+    }
+    retriever, store = make_retriever(rankings)
+    _, results = retriever.retrieve("explain backprop", lambda: "backpropagation chain rule gradients")
+    retriever.close()
+    assert results['ids'][0] == ["a", "b", "c", "d", "e"]
+    assert store.fetched == [] and (retriever.reused, retriever.probed) == (1, 1)
+
+def test_probe_overlap_below_the_threshold_fetches_only_missing_chunks():
+    # 2 of the top 5 shared: overlap 0.4 is below the threshold.
+    rankings = {
+        "explain backprop": ["a", "b", "c", "d", "e"],
+        "backpropagation chain rule gradients": ["x", "a", "y", "b", "z"],
+    }
+    retriever, store = make_retriever(rankings)
+    _, results = retriever.retrieve("explain backprop", lambda: "backpropagation chain rule gradients")
+    retriever.close()
+    assert results['ids'][0] == ["x", "a", "y", "b", "z"]
+    assert results['distances'][0] == [0.1 * (i + 1) for i in range(5)]
+    assert sorted(store.fetched) == ["x", "y", "z"]
+    assert (retriever.reused, retriever.probed) == (0, 1)
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+from benchmarks.fakes import HashEmbeddingFunction
+from core.instrumentation import Tracer
+from core.tutor_service import TutorService
+
+class SlowPipeline:
+    """Stands in for TutorPipeline: streams a few pieces slowly and records how many turns overlap."""
+    
+    def __init__(self, pieces: int = 5, delay: float = 0.02):
+        self.pieces = pieces
+        self.delay = delay
+        self.tracer = Tracer()
+        self.document_store = SimpleNamespace(embedding_function=HashEmbeddingFunction())
+        self.active = 0
+        self.max_active = 0
+        self.dropped_during_turn = False
+        self._lock = threading.Lock()
+    
+    def relevant_history(self, memory, user_question, trace=None):
+        return []
+    
+    def stream_answer(self, memory, user_question, relevant_history=None, pipelined=True, trace=None):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            for i in range(self.pieces):
+                time.sleep(self.delay)
+                yield f"{user_question}-{i} "
+            memory.add_conversation(user_question, "answer")
+            self.dropped_during_turn |= len(memory) == 0
+        finally:
+            with self._lock:
+                self.active -= 1
+    
+    def close(self):
+        pass
+
+def make_service(tmp_path, pipeline):
+    return TutorService(pipeline, session_dir=str(tmp_path / "sessions"), max_workers=4, memory_backend="numpy")
+
+def test_abandoned_stream_holds_the_session_until_its_turn_ends(tmp_path):
+    pipeline = SlowPipeline()
+    service = make_service(tmp_path, pipeline)
+    
+    async def main():
+        stream = service.stream("s", "first")
+        await stream.__anext__()
+        await stream.aclose()
+        # The abandoned turn is still running, so the session is neither idle nor closable.
+        assert await service.close_idle_sessions(0) == []
+        await service.ask("s", "second")
+        session = await service.get_session("s")
+        questions = [c["question"] for c in session.memory.get_all_history()]
+        await service.close()
+        return questions
+    
+    questions = asyncio.run(main())
+    assert pipeline.max_active == 1
+    assert questions == ["first", "second"]
+    assert not pipeline.dropped_during_turn
+
+def test_cancelled_stream_does_not_overlap_the_next_turn(tmp_path):
+    pipeline = SlowPipeline()
+    service = make_service(tmp_path, pipeline)
+    
+    async def main():
+        first = asyncio.ensure_future(service.ask("s", "first"))
+        await asyncio.sleep(pipeline.delay * 1.5)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await service.ask("s", "second")
+        session = await service.get_session("s")
+        turns = session.turns
+        await service.close()
+        return turns
+    
+    assert asyncio.run(main()) == 2
+    assert pipeline.max_active == 1
+
+def test_close_waits_for_abandoned_turns(tmp_path):
+    pipeline = SlowPipeline()
+    service = make_service(tmp_path, pipeline)
+    
+    async def main():
+        stream = service.stream("s", "first")
+        await stream.__anext__()
+        await stream.aclose()
+        await service.close()
+    
+    asyncio.run(main())
+    assert pipeline.active == 0
+    assert not pipeline.dropped_during_turn
+
+def test_session_reopened_during_close_keeps_every_turn(tmp_path):
+    pipeline = SlowPipeline()
+    service = make_service(tmp_path, pipeline)
+    
+    async def main():
+        await service.ask("s", "first")
+        stream = service.stream("s", "second")
+        await stream.__anext__()
+        await stream.aclose()
+        # Close while the abandoned turn still runs, and ask again before the close finishes.
+        closing = asyncio.ensure_future(service.close_session("s"))
+        await asyncio.sleep(0)
+        await service.ask("s", "third")
+        await closing
+        await service.close()
+    
+    asyncio.run(main())
+    assert pipeline.max_active == 1
+    with open(service.session_file("s"), encoding="utf-8") as f:
+        conversations = json.load(f)["conversations"]
+    assert [conv["question"] for conv in conversations] == ["first", "second", "third"]
@@ -1,17 +1,22 @@
-import chromadb
+import argparse
 import os
-import re
-from PyPDF2 import PdfReader
+from core.batch_writer import BatchWriter, ProgressCounter
+from core.chunker import TextChunker
+from core.ingest_manifest import FileUpdate, IngestManifest, file_hash
+from core.keyword_index import KeywordIndex
+from core.lexical_index import LexicalIndex
+from utils.pdf_extraction import is_pdf, iter_extracted, iter_pages, list_files
 
-def clean_extracted_text(text):
+DEFAULT_BATCH_SIZE = 256
+
+def get_document_store():
     """
-    Basic text normalization - just normalize whitespace.
+    The shared document store. Chroma is imported on first use rather than
+    with this module, so spawned extraction workers, which re-import it,
+    start quickly.
     """
-    if not text:
-        return text
-    text = re.sub(r'\s+', ' ', text)
-    
-    return text.strip()
+    from core.document_store import get_document_store as shared_store
+    return shared_store()
 
 def convert_to_markdown(file_path, filename):
     """
@@ -19,94 +24,227 @@ def convert_to_markdown(file_path, filename):
     Returns markdown content as string, or None if conversion fails.
     """
     try:
-        if filename.lower().endswith('.pdf'):
-            reader = PdfReader(file_path)
-            text_content = ""
-            for page_num, page in enumerate(reader.pages, start=1):
-                page_text = page.extract_text()
-                if page_text.strip():
-                    cleaned_text = clean_extracted_text(page_text)
-                    text_content += f"## Page {page_num}\n\n{cleaned_text}\n\n"
-            
-            markdown_content = f"# {filename}\n\n{text_content}"
-            return markdown_content
-        else:
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
-                content = file.read()
-                markdown_content = f"# {filename}\n\n{content}"
-                return markdown_content
+        sections = [f"# {filename}\n\n"]
+        for page_num, text in iter_pages(file_path, filename):
+            sections.append(f"## Page {page_num}\n\n{text}\n\n" if is_pdf(filename) else text)
+        return "".join(sections)
     except Exception as e:
         print(f"Error converting {filename} to markdown: {e}")
         return None
 
-def ingest_markdown(collection, markdown_content, source_filename):
+def queue_chunks(writer, chunks, source_filename):
+    """Queue chunks from a TextChunker on a writer under `{source}_{index}` ids."""
+    for chunk in chunks:
+        metadata = {"source": source_filename, "chunk_index": chunk.index}
+        if chunk.page is not None:
+            metadata["page"] = chunk.page
+        writer.add(f"{source_filename}_{chunk.index}", chunk.text, metadata)
+
+def ingest_markdown(collection, markdown_content, source_filename, writer=None, chunker=None):
     """
     Ingest markdown content into ChromaDB collection.
-    Splits content into chunks and adds them to the collection.
+    Splits content into chunks and queues them on a BatchWriter. When no
+    writer is given, a private one is created and flushed before returning.
     """
     if not markdown_content:
         return
     
-    paragraphs = [chunk.strip() for chunk in markdown_content.split('\n\n') if chunk.strip()]
+    own_writer = writer is None
+    if own_writer:
+        writer = BatchWriter(collection)
     
-    chunks = []
-    max_chunk_size = 300
+    chunker = chunker or TextChunker()
+    queue_chunks(writer, chunker.chunk_pages([(None, markdown_content)]), source_filename)
     
-    for para in paragraphs:
-        if len(para) <= max_chunk_size:
-            chunks.append(para)
-        else:
-            sentences = para.split('. ')
-            current_chunk = ""
-            for sentence in sentences:
-                if len(current_chunk) + len(sentence) + 2 <= max_chunk_size:
-                    current_chunk += sentence + ". " if current_chunk else sentence
-                else:
-                    if current_chunk:
-                        chunks.append(current_chunk.strip())
-                    current_chunk = sentence + ". "
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-    
-    for i, chunk in enumerate(chunks):
-        if len(chunk) < 10:
-            continue
-            
-        collection.add(
-            documents=[chunk],
-            metadatas=[{"source": source_filename, "chunk_index": i}],
-            ids=[f"{source_filename}_{i}"])
-        print(f"Added chunk {i+1} from {source_filename}")
+    if own_writer:
+        writer.flush()
 
-def ingest_documents():
-    """Ingest documents from a folder into ChromaDB."""
-    chroma_client = chromadb.PersistentClient(path="chroma_db")
-    collection = chroma_client.get_or_create_collection(name="test_collection")
+def ingest_documents(folder_path=None, workers=1, batch_size=DEFAULT_BATCH_SIZE, pages_per_task=32, progress_every=500, full=False,
+                     chunk_size=300, chunk_overlap=0, chunk_unit="chars", shards=None, reindex=False):
+    """
+    Ingest documents from a folder into ChromaDB.
     
-    folder_input = input("Enter the folder path: ")
+    An ingest manifest next to the database records each file's size, mtime and
+    content hash plus a hash per chunk. Unchanged files are skipped, only
+    changed chunks are re-embedded, and chunks of removed or shrunk files are
+    deleted.
+    
+    Args:
+        folder_path: Folder to ingest. If None, will prompt for input.
+        workers: Number of extraction processes. 1 extracts in this process.
+        batch_size: Number of chunks written per batch.
+        pages_per_task: PDF pages extracted per pool task when workers > 1.
+        progress_every: Print a progress line every this many chunks.
+        full: Re-extract and re-embed every file even if the manifest says it is unchanged.
+        chunk_size: Target chunk size, in `chunk_unit`s.
+        chunk_overlap: Trailing sentences of up to this size are repeated at the start of the next chunk.
+        chunk_unit: "chars" or "tokens" (approximate, ~4 characters per token).
+        shards: Partition the collection into this many shards by source file. A
+            collection that already holds chunks keeps its layout unless `reindex`
+            is also set.
+        reindex: Drop the collection, the manifest and the side indexes first and
+            ingest from scratch (needed to change the layout of a filled collection).
+    """
+    if folder_path is None:
+        folder_path = input("Enter the folder path: ")
     
-    if not os.path.exists(folder_input):
-        print(f"Error: Folder '{folder_input}' does not exist.")
+    # Checked before anything is dropped, so a mistyped folder cannot clear the collection.
+    if not os.path.isdir(folder_path):
+        print(f"Error: Folder '{folder_path}' does not exist.")
         return
     
-    print(f"Processing files from {folder_input}...")
-    file_count = 0
+    if shards is not None and configure_shards(shards, reindex=reindex):
+        full = True
+    elif reindex:
+        clear_collection(get_document_store())
+        full = True
+    store = get_document_store()
     
-    for filename in os.listdir(folder_input):
-        file_path = os.path.join(folder_input, filename)
-
-        if os.path.isdir(file_path):
+    manifest = IngestManifest.load(IngestManifest.path_for(store.path, store.collection_name))
+    keyword_index = KeywordIndex.load(KeywordIndex.path_for(store.path, store.collection_name))
+    lexical_index = LexicalIndex.load(LexicalIndex.path_for(store.path, store.collection_name))
+    chunker = TextChunker(max_size=chunk_size, overlap=chunk_overlap, unit=chunk_unit)
+    
+    files = list_files(folder_path)
+    present = {os.path.abspath(file_path) for file_path, _ in files}
+    to_extract = []
+    file_state = {}
+    skipped_count = 0
+    for file_path, filename in files:
+        stat = os.stat(file_path)
+        if not full and manifest.is_unchanged(file_path, stat):
+            skipped_count += 1
             continue
+        content_hash = file_hash(file_path)
+        entry = manifest.get_file(file_path)
+        if not full and entry and entry["sha256"] == content_hash:
+            manifest.touch_file(file_path, stat)
+            skipped_count += 1
+            continue
+        to_extract.append((file_path, filename))
+        file_state[file_path] = (stat, content_hash)
+    
+    print(f"Processing {len(to_extract)} of {len(files)} files from {folder_path} with {workers} worker(s)...")
+    file_count = 0
+    current_file = None
+    update = None
+    stream = None
+    
+    batch_size = min(batch_size, store.max_batch_size())
+    progress = ProgressCounter(every=progress_every)
+    with BatchWriter(store.collection, batch_size=batch_size, progress=progress, indexes=[keyword_index, lexical_index]) as writer:
+        removed = [path for path in manifest.files_in_folder(folder_path) if path not in present]
+        for path in removed:
+            writer.delete(manifest.remove_file(path))
         
-        markdown_content = convert_to_markdown(file_path, filename)
-        
-        if markdown_content:
-            ingest_markdown(collection, markdown_content, filename)
-            file_count += 1
+        for file_path, filename, pages, is_last in iter_extracted(to_extract, workers, pages_per_task):
+            if file_path != current_file:
+                current_file = file_path
+                update = None
+                if pages is None:
+                    continue
+                entry = manifest.get_file(file_path)
+                update = FileUpdate(writer, entry["chunks"] if entry else None, force=full)
+                stream = chunker.stream()
+                file_count += 1
+            
+            if update is None:
+                continue
+            if pages is None:
+                # A page range failed; keep the previous manifest entry and chunks.
+                update = None
+                continue
+            
+            for page_num, text in pages:
+                queue_chunks(update, stream.feed(page_num, text), filename)
+            
+            if is_last:
+                queue_chunks(update, stream.finish(), filename)
+                writer.delete(update.stale_ids())
+                stat, content_hash = file_state[file_path]
+                manifest.set_file(file_path, filename, stat, content_hash, update.chunks)
     
-    print(f"\nIngestion complete! Processed {file_count} files.")
+    keyword_index.save()
+    lexical_index.save()
+    manifest.save()
+    print(f"\nIngestion complete! Processed {file_count} files ({skipped_count} unchanged, {len(removed)} removed), "
+          f"{writer.written} chunks written, {writer.deleted} deleted.")
+
+def clear_collection(store):
+    """Delete a store's collections together with its ingest manifest and side indexes, which describe their chunks."""
+    store.drop_collection()
+    for side_file in (IngestManifest, KeywordIndex, LexicalIndex):
+        path = side_file.path_for(store.path, store.collection_name)
+        if os.path.exists(path):
+            os.remove(path)
+    print(f"Dropped '{store.collection_name}' and its ingest manifest and indexes.")
 
-def query_documents(query=None, n_results=10, verbose=True):
+def configure_shards(shards, path=None, collection_name=None, reindex=False):
+    """
+    Record a shard layout for the collection (default store path and
+    collection); returns True if the layout changed. A collection that
+    already holds chunks keeps its layout unless `reindex` is set, in which
+    case it is dropped with clear_collection() so every file is re-ingested
+    into the new shards.
+    """
+    from core.document_store import DEFAULT_COLLECTION_NAME, DEFAULT_DB_PATH, reset_document_stores
+    from core.document_store import get_document_store as shared_store
+    from core.sharded_store import ShardConfig
+    
+    path = path or DEFAULT_DB_PATH
+    collection_name = collection_name or DEFAULT_COLLECTION_NAME
+    config = ShardConfig.load(ShardConfig.path_for(path))
+    current = config.shard_count(collection_name)
+    if current == shards:
+        return False
+    store = shared_store(path, collection_name)
+    stored = store.collection.count()
+    if stored and not reindex:
+        print(f"'{collection_name}' already holds {stored} chunks in {current} shard(s); keeping that layout. "
+              f"Pass --reindex to drop it and re-ingest into {shards} shards.")
+        return False
+    clear_collection(store)
+    config.shards[collection_name] = shards
+    config.save()
+    reset_document_stores()
+    print(f"Partitioning '{collection_name}' into {shards} shards by source.")
+    return True
+
+def rebuild_indexes(batch_size=DEFAULT_BATCH_SIZE):
+    """Rebuild the side indexes from the chunks already stored in the collection."""
+    store = get_document_store()
+    collection = store.collection
+    indexes = [index_cls(index_cls.path_for(store.path, store.collection_name)) for index_cls in (KeywordIndex, LexicalIndex)]
+    
+    total = collection.count()
+    for offset in range(0, total, batch_size):
+        batch = collection.get(limit=batch_size, offset=offset, include=["documents", "metadatas"])
+        for index in indexes:
+            index.add_chunks(batch['ids'], batch['documents'], batch['metadatas'])
+    
+    for index in indexes:
+        index.save()
+    print(f"Rebuilt indexes over {total} chunks.")
+
+def export_index(path, dtype="float32", batch_size=DEFAULT_BATCH_SIZE):
+    """Write the collection, its embeddings and side indexes to a portable snapshot directory."""
+    from core.index_snapshot import export_snapshot
+    
+    manifest = export_snapshot(get_document_store(), path, dtype=dtype, batch_size=batch_size)
+    print(f"Exported {manifest['count']} chunks ({manifest['dim']}-dim {manifest['dtype']}) to {os.path.abspath(path)}.")
+
+def import_index(path, batch_size=DEFAULT_BATCH_SIZE):
+    """Bulk-load a snapshot into the collection using its stored embeddings."""
+    from core.index_snapshot import import_snapshot
+    
+    store = get_document_store()
+    existing = store.collection.count()
+    if existing:
+        print(f"Warning: the collection already holds {existing} chunks; chunks not in the snapshot are kept.")
+    loaded = import_snapshot(path, store, batch_size=batch_size)
+    print(f"Imported {loaded} chunks from {os.path.abspath(path)}.")
+
+def query_documents(query=None, n_results=10, verbose=True, store=None, include=None, sources=None):
     """
     Query the ChromaDB collection.
     
@@ -114,12 +252,14 @@ def query_documents(query=None, n_results=10, verbose=True):
         query: The search query string. If None, will prompt for input.
         n_results: Number of results to return (default 10).
         verbose: If True, print results to console (default True).
+        store: DocumentStore to search. Defaults to the shared process-wide store.
+        include: Result fields to request (default documents, metadatas and distances).
+        sources: Only search chunks from these source files (and, when sharded, only their shards).
     
     Returns:
         Dictionary containing query results with 'documents', 'metadatas', 'distances', and 'ids'.
     """
-    chroma_client = chromadb.PersistentClient(path="chroma_db")
-    collection = chroma_client.get_or_create_collection(name="test_collection")
+    store = store or get_document_store()
     
     if query is None:
         query = input("Enter your query: ")
@@ -129,11 +269,7 @@ def query_documents(query=None, n_results=10, verbose=True):
     if verbose:
         print(f"\nSearching for: {query}")
     
-    results = collection.query(
-        query_texts=[query],
-        n_results=n_results,
-        include=["documents", "metadatas", "distances"]
-    )
+    results = store.query(query, n_results=n_results, include=include, sources=sources)
     
     if verbose:
         print(f"\nFound {len(results['ids'][0])} results:\n")
@@ -150,7 +286,7 @@ def query_documents(query=None, n_results=10, verbose=True):
     
     return results
 
-def main():
+def interactive_menu():
     while True:
         print("\n" + "="*50)
         print("ChromaDB RAG System")
@@ -171,5 +307,59 @@ def main():
         else:
             print("Invalid choice. Please select 1, 2, or 3.")
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest and query the ChromaDB document store.")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    ingest_parser = subparsers.add_parser("ingest", help="Ingest every file in a folder")
+    ingest_parser.add_argument("folder", help="Folder containing the documents")
+    ingest_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Extraction processes (default: CPU count)")
+    ingest_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Chunks written per batch")
+    ingest_parser.add_argument("--pages-per-task", type=int, default=32, help="PDF pages per extraction task")
+    ingest_parser.add_argument("--full", action="store_true", help="Ignore the ingest manifest and re-embed every file")
+    ingest_parser.add_argument("--chunk-size", type=int, default=300, help="Target chunk size (default: 300)")
+    ingest_parser.add_argument("--chunk-overlap", type=int, default=0, help="Overlap between consecutive chunks")
+    ingest_parser.add_argument("--chunk-unit", choices=["chars", "tokens"], default="chars", help="Unit for chunk size and overlap")
+    ingest_parser.add_argument("--shards", type=int, help="Partition the collection into this many shards by source file")
+    ingest_parser.add_argument("--reindex", action="store_true",
+                               help="Drop the collection, manifest and indexes and ingest from scratch (required to re-shard a filled collection)")
+    
+    subparsers.add_parser("reindex", help="Rebuild the keyword and lexical indexes from the stored chunks")
+    
+    query_parser = subparsers.add_parser("query", help="Query the collection")
+    query_parser.add_argument("query", help="Search query")
+    query_parser.add_argument("-n", "--n-results", type=int, default=10, help="Number of results")
+    query_parser.add_argument("--source", action="append", dest="sources", help="Only search this source file (repeatable)")
+    query_parser.add_argument("--snapshot", metavar="DIR", help="Search a snapshot directory (read-only) instead of the collection")
+    
+    export_parser = subparsers.add_parser("export", help="Write the collection to a portable snapshot directory")
+    export_parser.add_argument("path", help="Snapshot directory to create (replaced if it exists)")
+    export_parser.add_argument("--float16", action="store_true", help="Store embeddings as float16 (half the size)")
+    
+    import_parser = subparsers.add_parser("import", help="Bulk-load a snapshot into the collection without re-embedding")
+    import_parser.add_argument("path", help="Snapshot directory")
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == "ingest":
+        ingest_documents(args.folder, workers=args.workers, batch_size=args.batch_size,
+                         pages_per_task=args.pages_per_task, full=args.full, chunk_size=args.chunk_size,
+                         chunk_overlap=args.chunk_overlap, chunk_unit=args.chunk_unit, shards=args.shards,
+                         reindex=args.reindex)
+    elif args.command == "reindex":
+        rebuild_indexes()
+    elif args.command == "query":
+        store = None
+        if args.snapshot:
+            from core.index_snapshot import SnapshotStore
+            store = SnapshotStore(args.snapshot)
+        query_documents(args.query, n_results=args.n_results, store=store, sources=args.sources)
+    elif args.command == "export":
+        export_index(args.path, dtype="float16" if args.float16 else "float32")
+    elif args.command == "import":
+        import_index(args.path)
+    else:
+        interactive_menu()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
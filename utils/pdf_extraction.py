@@ -0,0 +1,145 @@
+import os
+import re
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+from PyPDF2 import PdfReader
+
+Page = Tuple[int, str]
+# (file_path, filename, extracted pages or None on failure, is_last_part_of_file)
+ExtractedPart = Tuple[str, str, Optional[List[Page]], bool]
+
+TEXT_BLOCK_SIZE = 1 << 16
+
+def clean_extracted_text(text):
+    """
+    Basic text normalization - just normalize whitespace.
+    """
+    if not text:
+        return text
+    text = re.sub(r'\s+', ' ', text)
+    
+    return text.strip()
+
+def is_pdf(filename: str) -> bool:
+    return filename.lower().endswith('.pdf')
+
+def count_pages(file_path: str, filename: str) -> Optional[int]:
+    """Number of extraction units in a file: PDF pages, or 1 for plain text. None if the file cannot be read."""
+    if not is_pdf(filename):
+        return 1
+    try:
+        return len(PdfReader(file_path).pages)
+    except Exception as e:
+        print(f"Error reading {filename}: {e}")
+        return None
+
+def iter_pages(file_path: str, filename: str, start_page: int = 0, end_page: Optional[int] = None) -> Iterator[Page]:
+    """
+    Lazily extract (page_number, text) pairs from pages [start_page, end_page).
+    PDF pages are whitespace-normalized and empty pages are skipped. Plain text
+    files are read in paragraph-aligned blocks reported as page 1.
+    """
+    if is_pdf(filename):
+        pages = PdfReader(file_path).pages
+        end_page = len(pages) if end_page is None else min(end_page, len(pages))
+        for page_index in range(start_page, end_page):
+            page_text = pages[page_index].extract_text()
+            if page_text and page_text.strip():
+                yield page_index + 1, clean_extracted_text(page_text)
+    else:
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
+            block: List[str] = []
+            size = 0
+            for line in file:
+                block.append(line)
+                size += len(line)
+                if size >= TEXT_BLOCK_SIZE and not line.strip():
+                    yield 1, "".join(block)
+                    block, size = [], 0
+            if block:
+                yield 1, "".join(block)
+
+def extract_pages(file_path: str, filename: str, start_page: int = 0, end_page: Optional[int] = None) -> Optional[List[Page]]:
+    """Extract a page range eagerly (used by pool workers). Returns None if extraction fails."""
+    try:
+        return list(iter_pages(file_path, filename, start_page, end_page))
+    except Exception as e:
+        print(f"Error extracting {filename}: {e}")
+        return None
+
+def list_files(folder_path: str) -> List[Tuple[str, str]]:
+    """List (file_path, filename) for the regular files in a folder."""
+    files = []
+    for filename in os.listdir(folder_path):
+        file_path = os.path.join(folder_path, filename)
+        if not os.path.isdir(file_path):
+            files.append((file_path, filename))
+    return files
+
+def _resolved(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+def iter_extracted(files: List[Tuple[str, str]], workers: int = 1, pages_per_task: int = 32,
+                   max_in_flight: Optional[int] = None) -> Iterator[ExtractedPart]:
+    """
+    Extract files in order, yielding pages as they become available.
+
+    With workers <= 1, pages are extracted one at a time in this process.
+    With workers > 1, files are split into page ranges of `pages_per_task` and
+    extracted in a process pool. At most `max_in_flight` page counts and
+    ranges are queued at once, and results are yielded in submission order so each file's pages
+    arrive contiguously and in page order.
+    """
+    if workers <= 1:
+        for file_path, filename in files:
+            previous = None
+            try:
+                for page in iter_pages(file_path, filename):
+                    if previous is not None:
+                        yield file_path, filename, [previous], False
+                    previous = page
+            except Exception as e:
+                print(f"Error extracting {filename}: {e}")
+                yield file_path, filename, None, True
+                continue
+            yield file_path, filename, [previous] if previous is not None else [], True
+        return
+    
+    max_in_flight = max_in_flight or workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        remaining = iter(files)
+        counting = deque()
+        pending = deque()
+        
+        def count_more():
+            # Page counts share the window with the page ranges, so a long
+            # file list is never submitted up front.
+            while len(counting) + len(pending) < max_in_flight:
+                file = next(remaining, None)
+                if file is None:
+                    return
+                counting.append((file, pool.submit(count_pages, *file)))
+        
+        count_more()
+        while counting:
+            (file_path, filename), counted = counting.popleft()
+            page_count = counted.result()
+            # An unreadable file is a failure (retried next run); a PDF without
+            # pages is a complete, empty file. Both wait their turn in `pending`.
+            if not page_count:
+                parts = [(_resolved(None if page_count is None else []), True)]
+            else:
+                parts = ((pool.submit(extract_pages, file_path, filename, start, start + pages_per_task),
+                          start + pages_per_task >= page_count) for start in range(0, page_count, pages_per_task))
+            for future, is_last in parts:
+                pending.append((file_path, filename, future, is_last))
+                while pending and len(pending) + len(counting) >= max_in_flight:
+                    file_path_done, filename_done, done, is_last_done = pending.popleft()
+                    yield file_path_done, filename_done, done.result(), is_last_done
+            count_more()
+        while pending:
+            file_path_done, filename_done, done, is_last = pending.popleft()
+            yield file_path_done, filename_done, done.result(), is_last